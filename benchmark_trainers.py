@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import platform
+import multiprocessing
+import colorama
+from colorama import Fore
+
+colorama.init()
+
+from settings.benchmark_settings import *
+
+# Must be set before tensorflow is imported (spawned benchmark processes inherit it)
+if CPU_ONLY: os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+stdin = sys.stdin
+sys.stdin = open(os.devnull, 'w')
+stderr = sys.stderr
+sys.stderr = open(os.devnull, 'w')
+sys.stdin = stdin
+sys.stderr = stderr
+
+import tensorflow as tf
+tf.get_logger().setLevel('ERROR')
+
+from modules.benchmark import create_synthetic_dataset, benchmark_trainer, compare_results, get_model_combinations, get_spreadsheet_model_names
+from modules.models import generator_models_spreadsheet, discriminator_models_spreadsheet, upscaling_generator_models_spreadsheet
+
+# Headless throughput benchmark of trainers on synthetic data
+# Every gan is trained for NUM_OF_EPISODES episodes with each model of spreadsheets and results are saved as json (compared with BASELINE_RESULTS_PATH when set)
+# Usage: python benchmark_trainers.py
+
+if __name__ == '__main__':
+  if not os.path.exists(BENCHMARK_OUTPUT_PATH): os.makedirs(BENCHMARK_OUTPUT_PATH)
+
+  image_shapes = {"dcgan": DCGAN_IMAGE_SHAPE, "wgan": WGAN_IMAGE_SHAPE, "srgan": SRGAN_IMAGE_SHAPE}
+  runs = []
+  for gan_type in BENCHMARKED_GANS:
+    if gan_type == "srgan":
+      combinations = get_model_combinations(SRGAN_GEN_MODELS or get_spreadsheet_model_names(upscaling_generator_models_spreadsheet), SRGAN_DISC_MODELS or get_spreadsheet_model_names(discriminator_models_spreadsheet),
+                                            REFERENCE_SRGAN_GEN_MODEL, REFERENCE_SRGAN_DISC_MODEL, ALL_MODEL_COMBINATIONS)
+    else:
+      combinations = get_model_combinations(GEN_MODELS or get_spreadsheet_model_names(generator_models_spreadsheet), DISC_MODELS or get_spreadsheet_model_names(discriminator_models_spreadsheet),
+                                            REFERENCE_GEN_MODEL, REFERENCE_DISC_MODEL, ALL_MODEL_COMBINATIONS)
+    runs.extend((gan_type, generator, discriminator) for generator, discriminator in combinations)
+
+  dataset_paths = {}
+  for gan_type in set(gan_type for gan_type, _, _ in runs):
+    image_shape = image_shapes[gan_type]
+    dataset_path = os.path.join(SYNTHETIC_DATASETS_PATH, f"{image_shape[0]}x{image_shape[1]}x{image_shape[2]}_{NUM_OF_SYNTHETIC_IMAGES}_{SYNTHETIC_IMAGE_FORMAT}")
+    create_synthetic_dataset(dataset_path, NUM_OF_SYNTHETIC_IMAGES, image_shape, SYNTHETIC_IMAGE_FORMAT, RANDOM_SEED)
+    dataset_paths[gan_type] = dataset_path
+  print(Fore.GREEN + f"Synthetic datasets ready, {len(runs)} benchmark runs" + Fore.RESET)
+
+  results = []
+  for index, (gan_type, generator, discriminator) in enumerate(runs):
+    print(Fore.BLUE + f"[{index + 1}/{len(runs)}] {gan_type}: {generator} / {discriminator}" + Fore.RESET)
+    result = benchmark_trainer(gan_type, generator, discriminator, dataset_paths[gan_type], os.path.join(BENCHMARK_OUTPUT_PATH, "runs", f"{gan_type}__{generator}__{discriminator}"), NUM_OF_EPISODES,
+                               batch_size=SRGAN_BATCH_SIZE if gan_type == "srgan" else DCGAN_BATCH_SIZE, buffered_batches=BUFFERED_BATCHES, num_of_loading_workers=NUM_OF_LOADING_WORKERS,
+                               mixed_precision=MIXED_PRECISION, random_seed=RANDOM_SEED, latent_dim=LATENT_DIM, critic_train_multip=CRITIC_TRAIN_MULTIP,
+                               num_of_upscales=NUM_OF_UPSCALES, discriminator_training_multiplier=DISCRIMINATOR_TRAINING_MULTIPLIER, discriminator_concat_real_fake=DISCRIMINATOR_CONCAT_REAL_FAKE, feature_extractor_layers=FEATURE_EXTRACTOR_LAYERS,
+                               stats_aggregate_window=STATS_AGGREGATE_WINDOW, num_of_threads=NUM_OF_THREADS, timeout=RUN_TIMEOUT)
+    result["image_shape"] = image_shapes[gan_type]
+    results.append(result)
+
+    if result["status"] == "ok":
+      print(Fore.GREEN + f"{result['episodes_per_second']:.3f} episodes/s, {result['images_per_second']:.1f} images/s, data wait {result['data_wait_share'] * 100:.1f}%, peak RSS {result['peak_rss_mb']:.0f} MB" + Fore.RESET)
+    else:
+      print(Fore.RED + f"Failed: {result['error']}" + Fore.RESET)
+
+  suite = {
+    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    "system": {"platform": platform.platform(), "processor": platform.processor(), "cpu_count": multiprocessing.cpu_count(), "python_version": platform.python_version(), "tensorflow_version": tf.__version__},
+    "settings": {"num_of_episodes": NUM_OF_EPISODES, "num_of_synthetic_images": NUM_OF_SYNTHETIC_IMAGES, "synthetic_image_format": SYNTHETIC_IMAGE_FORMAT,
+                 "cpu_only": CPU_ONLY, "mixed_precision": MIXED_PRECISION, "num_of_threads": NUM_OF_THREADS, "discriminator_concat_real_fake": DISCRIMINATOR_CONCAT_REAL_FAKE},
+    "results": results
+  }
+  results_path = os.path.join(BENCHMARK_OUTPUT_PATH, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+  with open(results_path, "w", encoding="utf-8") as f:
+    json.dump(suite, f, indent=2)
+  print(Fore.GREEN + f"Benchmark results saved to {results_path}" + Fore.RESET)
+
+  if BASELINE_RESULTS_PATH:
+    with open(BASELINE_RESULTS_PATH, "r", encoding="utf-8") as f:
+      baseline = json.load(f)
+
+    print(Fore.BLUE + f"Comparison with {BASELINE_RESULTS_PATH}" + Fore.RESET)
+    for gan_type, generator, discriminator, baseline_speed, speed, speed_change, memory_change in compare_results(baseline, suite):
+      print((Fore.GREEN if speed_change >= 0 else Fore.YELLOW) + f"{gan_type}: {generator} / {discriminator} - {baseline_speed:.3f} -> {speed:.3f} episodes/s ({speed_change * 100:+.1f}%), peak RSS {memory_change * 100:+.1f}%" + Fore.RESET)
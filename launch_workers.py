@@ -0,0 +1,44 @@
+import os
+import sys
+import subprocess
+import multiprocessing
+from colorama import Fore
+import colorama
+
+colorama.init()
+
+# Script for starting distributed training with multiple workers on this machine
+# Usage: python launch_workers.py <training script> <number of workers>
+# Example: python launch_workers.py train_srgan.py 4
+
+if __name__ == '__main__':
+  assert len(sys.argv) == 3, Fore.RED + "Usage: python launch_workers.py <training script> <number of workers>" + Fore.RESET
+
+  training_script = sys.argv[1]
+  num_of_workers = int(sys.argv[2])
+  assert os.path.exists(training_script), Fore.RED + f"Training script {training_script} not found" + Fore.RESET
+  assert num_of_workers >= 1, Fore.RED + "Invalid number of workers" + Fore.RESET
+
+  # Split CPU cores between workers so they dont fight for them
+  threads_per_worker = str(max(1, multiprocessing.cpu_count() // num_of_workers))
+
+  workers = []
+  for worker_index in range(num_of_workers):
+    env = dict(os.environ)
+    env["GAN_NUM_OF_WORKERS"] = str(num_of_workers)
+    env["GAN_WORKER_INDEX"] = str(worker_index)
+    env["TF_NUM_INTRAOP_THREADS"] = threads_per_worker
+    env["TF_NUM_INTEROP_THREADS"] = "1"
+
+    # Only chief can be interacted with
+    workers.append(subprocess.Popen([sys.executable, training_script], env=env, stdin=None if worker_index == 0 else subprocess.DEVNULL))
+    print(Fore.BLUE + f"Worker {worker_index} started" + Fore.RESET)
+
+  try:
+    for worker in workers:
+      worker.wait()
+  except KeyboardInterrupt:
+    for worker in workers:
+      worker.wait()
+
+  print(Fore.GREEN + "All workers finished" + Fore.RESET)
@@ -0,0 +1,3 @@
+from .synthetic_dataset import create_synthetic_dataset
+from .trainer_benchmark import benchmark_trainer, compare_results, get_model_combinations, get_spreadsheet_model_names
+from .model_cost import build_spreadsheet_model, format_cost_table, profile_model, RANK_KEYS, SPREADSHEETS
@@ -0,0 +1,201 @@
+import time
+import numpy as np
+import keras.backend as K
+from keras.models import Model
+from keras.layers import Input, InputLayer, Lambda, Dense, Conv2D, Conv2DTranspose, BatchNormalization, Concatenate, Add, Subtract, Multiply, Average, Maximum, Minimum
+from colorama import Fore
+from typing import Union
+
+from ..models import generator_models_spreadsheet, upscaling_generator_models_spreadsheet, discriminator_models_spreadsheet
+
+SPREADSHEETS = {"generator": generator_models_spreadsheet, "upscaling_generator": upscaling_generator_models_spreadsheet, "discriminator": discriminator_models_spreadsheet}
+# Ranking keys of cost table
+RANK_KEYS = ("params", "flops", "inference_activation_bytes", "training_activation_bytes", "latency_ms")
+
+_MERGE_LAYERS = (Add, Subtract, Multiply, Average, Maximum, Minimum)
+
+def _to_list(x) -> list:
+  return list(x) if isinstance(x, (list, tuple)) else [x]
+
+def _shape_size(shape:tuple) -> int:
+  # Size of one sample (batch dimension is skipped)
+  return int(np.prod([dim for dim in shape[1:] if dim is not None]))
+
+def _layer_nodes(model:Model) -> list:
+  # (layer, input shapes, output shapes, input tensors, output tensors) of every call of layer in model in order of model layers
+  nodes = []
+  for layer in model.layers:
+    for node in layer._inbound_nodes:
+      nodes.append((layer, [tuple(shape) for shape in _to_list(node.input_shapes)], [tuple(shape) for shape in _to_list(node.output_shapes)],
+                    _to_list(node.input_tensors), _to_list(node.output_tensors)))
+  return nodes
+
+def _layer_flops(layer, input_shapes:list, output_shapes:list) -> int:
+  """
+  Estimated floating point operations of one sample forward pass of layer (multiply-add counts as 2)
+  Convolutions and dense layers are counted exactly, normalizations, activations and merges by number of values they produce
+  """
+
+  output_size = sum(_shape_size(shape) for shape in output_shapes)
+  if isinstance(layer, InputLayer): return 0
+
+  if isinstance(layer, (Conv2D, Dense)):
+    kernel_size = int(np.prod(K.int_shape(layer.kernel)))
+    if isinstance(layer, Conv2DTranspose):
+      # Every input value is multiplied by kernel slice of all output channels
+      positions = int(np.prod(input_shapes[0][1:-1]))
+    elif isinstance(layer, Conv2D):
+      positions = int(np.prod(output_shapes[0][1:-1]))
+    else:
+      positions = int(np.prod(input_shapes[0][1:-1])) if len(input_shapes[0]) > 2 else 1
+
+    flops = 2 * kernel_size * positions
+    if layer.use_bias: flops += output_size
+    # Power iteration of spectral normalization (two vector-matrix products per call)
+    if hasattr(layer, "u"): flops += 4 * kernel_size
+    return flops
+
+  if isinstance(layer, BatchNormalization): return 2 * output_size
+  if isinstance(layer, _MERGE_LAYERS): return (len(input_shapes) - 1) * output_size
+  if isinstance(layer, Concatenate): return 0
+  return output_size
+
+def _activation_memory(model:Model, nodes:list, bytes_per_value:int) -> tuple:
+  """
+  Peak memory of activations of one sample (in bytes) for inference and training
+  Inference holds only tensors that are still needed by later layers, training keeps every activation for backward pass plus gradients of largest layer
+  """
+
+  tensor_sizes = {}
+  last_uses = {}
+  for index, (_, input_shapes, output_shapes, input_tensors, output_tensors) in enumerate(nodes):
+    for tensor, shape in zip(output_tensors, output_shapes):
+      tensor_sizes[id(tensor)] = _shape_size(shape) * bytes_per_value
+    for tensor in input_tensors:
+      last_uses[id(tensor)] = index
+
+  # Outputs of model are kept to end
+  for tensor in _to_list(model.outputs):
+    last_uses[id(tensor)] = len(nodes)
+
+  live_tensors = set()
+  inference_peak = 0
+  largest_layer = 0
+  for index, (_, _, _, input_tensors, output_tensors) in enumerate(nodes):
+    live_tensors.update(id(tensor) for tensor in output_tensors)
+    inference_peak = max(inference_peak, sum(tensor_sizes.get(tensor, 0) for tensor in live_tensors))
+    largest_layer = max(largest_layer, sum(tensor_sizes.get(id(tensor), 0) for tensor in input_tensors + output_tensors))
+    live_tensors = {tensor for tensor in live_tensors if last_uses.get(tensor, index) > index}
+
+  training_peak = sum(tensor_sizes.values()) + largest_layer
+  return inference_peak, training_peak
+
+def _measure_latency(model:Model, input_shapes:list, batch_size:int, repeats:int, warmup:int) -> float:
+  # Median wall time of one predict call in milliseconds
+  data = [np.random.normal(size=(batch_size, *shape[1:])).astype(np.float32) for shape in input_shapes]
+  data = data if len(data) > 1 else data[0]
+
+  for _ in range(warmup):
+    model.predict_on_batch(data)
+
+  times = []
+  for _ in range(repeats):
+    start_time = time.perf_counter()
+    model.predict_on_batch(data)
+    times.append(time.perf_counter() - start_time)
+  return float(np.median(times) * 1000)
+
+def _measure_layer_latency(layer, input_shapes:list, batch_size:int, repeats:int, warmup:int) -> Union[float, None]:
+  # Layer is called on new inputs (weights are shared) so it can be timed alone
+  try:
+    inputs = [Input(shape=shape[1:]) for shape in input_shapes]
+    outputs = layer(inputs if len(inputs) > 1 else inputs[0])
+    return _measure_latency(Model(inputs, outputs), input_shapes, batch_size, repeats, warmup)
+  except Exception as e:
+    print(Fore.YELLOW + f"Failed to measure latency of layer {layer.name}\n{e}" + Fore.RESET)
+    return None
+
+def profile_model(model:Model, batch_size:int=1, bytes_per_value:int=4, measure_latency:bool=True, latency_repeats:int=20, latency_warmup:int=3) -> dict:
+  """
+  Cost profile of built model - parameters, FLOPs, peak activation memory for inference and training (for batch_size) and measured CPU latency of whole model and of each layer
+  Training FLOPs are estimated as 3x forward pass (backward pass costs about twice the forward one)
+  Layer latencies are reduced by overhead of predict call (measured on identity model) so their sum is comparable with latency of model
+  """
+
+  nodes = _layer_nodes(model)
+  inference_memory, training_memory = _activation_memory(model, nodes, bytes_per_value)
+
+  layers = []
+  layer_calls = []
+  for layer, input_shapes, output_shapes, _, _ in nodes:
+    if isinstance(layer, InputLayer): continue
+    layer_calls.append((layer, input_shapes))
+    layers.append({"name": layer.name, "type": layer.__class__.__name__, "output_shape": output_shapes[0] if len(output_shapes) == 1 else output_shapes,
+                   "params": layer.count_params(), "flops": _layer_flops(layer, input_shapes, output_shapes),
+                   "activation_bytes": sum(_shape_size(shape) for shape in output_shapes) * bytes_per_value * batch_size})
+
+  flops = sum(layer["flops"] for layer in layers)
+  profile = {
+    "input_shape": [tuple(K.int_shape(tensor)) for tensor in _to_list(model.inputs)],
+    "output_shape": [tuple(K.int_shape(tensor)) for tensor in _to_list(model.outputs)],
+    "batch_size": batch_size,
+    "params": model.count_params(),
+    "trainable_params": int(sum(K.count_params(weight) for weight in model.trainable_weights)),
+    "weights_bytes": model.count_params() * bytes_per_value,
+    "flops": flops * batch_size,
+    "training_flops": 3 * flops * batch_size,
+    "inference_activation_bytes": inference_memory * batch_size,
+    "training_activation_bytes": training_memory * batch_size,
+    "latency_ms": None,
+    "layers_latency_ms": None,
+    "layers": layers
+  }
+
+  if measure_latency:
+    # Layers are timed after memory analysis because calling them on new inputs adds nodes to them
+    profile["latency_ms"] = _measure_latency(model, profile["input_shape"], batch_size, latency_repeats, latency_warmup)
+
+    overhead_input = Input(shape=(1,))
+    overhead = _measure_latency(Model(overhead_input, Lambda(lambda x: x)(overhead_input)), [(None, 1)], batch_size, latency_repeats, latency_warmup)
+    for layer_profile, (layer, input_shapes) in zip(layers, layer_calls):
+      latency = _measure_layer_latency(layer, input_shapes, batch_size, latency_repeats, latency_warmup)
+      layer_profile["latency_ms"] = max(latency - overhead, 0.0) if latency is not None else None
+    profile["layers_latency_ms"] = sum(layer["latency_ms"] for layer in layers if layer["latency_ms"] is not None)
+
+  return profile
+
+def build_spreadsheet_model(spreadsheet:str, model_name:str, image_shape:tuple, latent_dim:int=128, num_of_upscales:int=2) -> Model:
+  """
+  Builds model from spreadsheet same way as trainers do (discriminators get classification head)
+  image_shape is shape of generated images for generators, shape of small input images for upscaling generators and shape of input images for discriminators
+  """
+
+  assert spreadsheet in SPREADSHEETS, Fore.RED + f"Unknown model spreadsheet {spreadsheet}" + Fore.RESET
+
+  if spreadsheet == "generator":
+    inp = Input(shape=(latent_dim,))
+    m = getattr(generator_models_spreadsheet, model_name)(inp, image_shape, image_shape[2])
+  elif spreadsheet == "upscaling_generator":
+    inp = Input(shape=image_shape)
+    m = getattr(upscaling_generator_models_spreadsheet, model_name)(inp, image_shape, num_of_upscales)
+  else:
+    inp = Input(shape=image_shape)
+    m = getattr(discriminator_models_spreadsheet, model_name)(inp)
+    m = Dense(1)(m)
+
+  return Model(inp, m, name=model_name)
+
+def format_cost_table(profiles:list, rank_by:str="flops") -> list:
+  # Lines of table of model profiles ranked from cheapest by rank_by
+  assert rank_by in RANK_KEYS, Fore.RED + f"Invalid ranking key {rank_by}" + Fore.RESET
+
+  profiles = sorted(profiles, key=lambda profile: profile[rank_by] if profile[rank_by] is not None else float("inf"))
+  name_width = max([len("Model")] + [len(profile["model"]) for profile in profiles])
+
+  lines = [f"{'Rank':>4}  {'Model':<{name_width}}  {'Params (M)':>10}  {'GFLOPs':>9}  {'Train GFLOPs':>12}  {'Inference MB':>12}  {'Train MB':>10}  {'Latency ms':>10}  {'Layers ms':>10}"]
+  for rank, profile in enumerate(profiles):
+    latency = f"{profile['latency_ms']:.2f}" if profile["latency_ms"] is not None else "-"
+    layers_latency = f"{profile['layers_latency_ms']:.2f}" if profile["layers_latency_ms"] is not None else "-"
+    lines.append(f"{rank + 1:>4}  {profile['model']:<{name_width}}  {profile['params'] / 1e6:>10.3f}  {profile['flops'] / 1e9:>9.3f}  {profile['training_flops'] / 1e9:>12.3f}  "
+                 f"{profile['inference_activation_bytes'] / 2 ** 20:>12.1f}  {profile['training_activation_bytes'] / 2 ** 20:>10.1f}  {latency:>10}  {layers_latency:>10}")
+  return lines
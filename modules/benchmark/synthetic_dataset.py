@@ -0,0 +1,53 @@
+import os
+import json
+import numpy as np
+from cv2 import cv2 as cv
+from colorama import Fore
+
+from ..utils.helpers import get_paths_of_files_from_path
+
+def create_synthetic_dataset(path:str, num_of_images:int, image_shape:tuple, image_format:str="png", random_seed:int=0) -> list:
+  """
+  Creates dataset of random images of image_shape (height, width, channels) for benchmarking without real data
+  Images are smooth color gradients with noise so their encoding and decoding cost is close to real photos (flat noise or single color would not be)
+  Dataset with same parameters already existing in path is reused (its parameters are stored next to dataset folder, trainers load every file in it), returns paths of images
+  """
+
+  assert num_of_images >= 1, Fore.RED + "Invalid number of synthetic images" + Fore.RESET
+  assert len(image_shape) == 3 and image_shape[2] in (1, 3), Fore.RED + "Invalid shape of synthetic images" + Fore.RESET
+  assert image_format in ("png", "jpg"), Fore.RED + f"Unsupported synthetic image format {image_format}" + Fore.RESET
+
+  image_shape = tuple(int(dim) for dim in image_shape)
+  info = {"num_of_images": num_of_images, "image_shape": image_shape, "image_format": image_format, "random_seed": random_seed}
+  info_path = os.path.normpath(path) + "_info.json"
+
+  if os.path.exists(info_path):
+    with open(info_path, "r", encoding="utf-8") as f:
+      existing_info = json.load(f)
+    existing_info["image_shape"] = tuple(existing_info["image_shape"])
+
+    if existing_info == info:
+      image_paths = sorted(file_path for file_path in (get_paths_of_files_from_path(path, only_files=True) or []) if file_path.endswith(f".{image_format}"))
+      if len(image_paths) == num_of_images: return image_paths
+
+  if not os.path.exists(path): os.makedirs(path)
+  for file_path in get_paths_of_files_from_path(path, only_files=True):
+    os.remove(file_path)
+
+  random = np.random.RandomState(random_seed)
+  image_paths = []
+  for index in range(num_of_images):
+    # Low resolution random colors upscaled to full size give smooth gradients
+    base = random.uniform(0, 255, size=(4, 4, image_shape[2])).astype(np.float32)
+    image = cv.resize(base, (image_shape[1], image_shape[0]), interpolation=cv.INTER_CUBIC).reshape(image_shape)
+    image += random.normal(0, 12, size=image_shape)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+
+    image_path = os.path.join(path, f"{index:06d}.{image_format}")
+    if not cv.imwrite(image_path, image): raise Exception(Fore.RED + f"Failed to write synthetic image {image_path}" + Fore.RESET)
+    image_paths.append(image_path)
+
+  with open(info_path, "w", encoding="utf-8") as f:
+    json.dump(info, f, indent=2)
+
+  return image_paths
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import shutil
+import inspect
+import resource
+import traceback
+from multiprocessing import get_context
+from queue import Empty
+from colorama import Fore
+from typing import Union
+
+# Every run is done in its own spawned process so tensorflow state and peak RSS of one run dont affect others
+_mp_context = get_context("spawn")
+
+GAN_TYPES = ("dcgan", "wgan", "srgan")
+
+def get_spreadsheet_model_names(module) -> list:
+  # Only model functions defined in spreadsheet itself (not imported layer helpers)
+  return [name for name, function in inspect.getmembers(module, inspect.isfunction) if function.__module__ == module.__name__ and name.startswith("mod_")]
+
+def get_model_combinations(generators:list, discriminators:list, reference_generator:str, reference_discriminator:str, all_combinations:bool=False) -> list:
+  """
+  Returns (generator, discriminator) pairs to benchmark
+  Without all_combinations every generator is paired with reference discriminator and every discriminator with reference generator
+  """
+
+  if all_combinations:
+    return [(generator, discriminator) for generator in generators for discriminator in discriminators]
+
+  combinations = [(generator, reference_discriminator) for generator in generators]
+  combinations.extend((reference_generator, discriminator) for discriminator in discriminators if (reference_generator, discriminator) not in combinations)
+  return combinations
+
+def _build_trainer(gan_type:str, gen_mod_name:str, disc_mod_name:str, dataset_path:str, output_path:str, settings:dict) -> tuple:
+  from ..gans import DCGAN, WGANGC, SRGAN
+
+  common_settings = {"batch_size": settings["batch_size"], "buffered_batches": settings["buffered_batches"], "num_of_loading_workers": settings["num_of_loading_workers"],
+                     "mixed_precision": settings["mixed_precision"], "random_seed": settings["random_seed"], "check_dataset": False}
+
+  # Returns trainer, train settings of run and number of real images used by one episode
+  if gan_type == "dcgan":
+    trainer = DCGAN(dataset_path, gen_mod_name=gen_mod_name, disc_mod_name=disc_mod_name, latent_dim=settings["latent_dim"], training_progress_save_path=output_path, **common_settings)
+    return trainer, {"discriminator_concat_real_fake": settings["discriminator_concat_real_fake"]}, settings["batch_size"]
+  if gan_type == "wgan":
+    trainer = WGANGC(dataset_path, gen_mod_name=gen_mod_name, critic_mod_name=disc_mod_name, latent_dim=settings["latent_dim"], training_progress_save_path=output_path, **common_settings)
+    return trainer, {"critic_train_multip": settings["critic_train_multip"]}, settings["batch_size"] * settings["critic_train_multip"]
+
+  trainer = SRGAN(dataset_path, num_of_upscales=settings["num_of_upscales"], gen_mod_name=gen_mod_name, disc_mod_name=disc_mod_name, training_progress_save_path=output_path,
+                  feature_extractor_layers=settings["feature_extractor_layers"], **common_settings)
+  return trainer, {"discriminator_training_multiplier": settings["discriminator_training_multiplier"], "discriminator_concat_real_fake": settings["discriminator_concat_real_fake"]}, settings["batch_size"] * (settings["discriminator_training_multiplier"] + 1)
+
+def _benchmark_trainer(gan_type:str, gen_mod_name:str, disc_mod_name:str, dataset_path:str, output_path:str, num_of_episodes:int, settings:dict) -> dict:
+  import tensorflow as tf
+  tf.get_logger().setLevel('ERROR')
+  if settings["num_of_threads"]:
+    tf.config.threading.set_intra_op_parallelism_threads(settings["num_of_threads"])
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+  start_time = time.perf_counter()
+  trainer, train_settings, images_per_episode = _build_trainer(gan_type, gen_mod_name, disc_mod_name, dataset_path, output_path, settings)
+  build_seconds = time.perf_counter() - start_time
+
+  # Progress images, weight saving and debug logging are disabled so only training loop itself is measured
+  start_time = time.perf_counter()
+  trainer.train(num_of_episodes, progress_images_save_interval=None, weights_save_interval=None,
+                gradient_monitor_interval=None, weight_stats_interval=None, step_timing_log_interval=None, profile_trace_episodes=None,
+                stats_aggregate_window=settings["stats_aggregate_window"], **train_settings)
+  train_seconds = time.perf_counter() - start_time
+
+  with open(os.path.join(output_path, "step_timing.json"), "r", encoding="utf-8") as f:
+    step_timing = json.load(f)
+
+  # First step includes tracing of train functions so throughput is computed from remaining steps
+  num_of_steps = step_timing["steps"]
+  episodes_per_step = num_of_episodes / num_of_steps
+  if num_of_steps > 1:
+    measured_episodes = episodes_per_step * (num_of_steps - 1)
+    measured_seconds = step_timing["total_seconds"] - step_timing["first_step_seconds"]
+  else:
+    measured_episodes = episodes_per_step
+    measured_seconds = step_timing["total_seconds"]
+  episodes_per_second = measured_episodes / measured_seconds if measured_seconds > 0 else 0
+
+  return {
+    "tensorflow_version": tf.__version__,
+    "build_seconds": build_seconds,
+    "train_seconds": train_seconds,
+    "first_step_seconds": step_timing["first_step_seconds"],
+    "episodes_per_second": episodes_per_second,
+    "images_per_second": episodes_per_second * images_per_episode,
+    "step_ms": step_timing["window_ms"].get("step", {}),
+    "data_wait_share": step_timing["phases"].get("data_wait", {}).get("share", 0),
+    "phase_shares": {phase: phase_timing["share"] for phase, phase_timing in step_timing["phases"].items()},
+    # Linux reports max RSS in kilobytes
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+  }
+
+def _run_benchmark_process(result_queue, *args):
+  try:
+    result = _benchmark_trainer(*args)
+    result["status"] = "ok"
+  except Exception as e:
+    result = {"status": "failed", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc(),
+              "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+  result_queue.put(result)
+
+def benchmark_trainer(gan_type:str, gen_mod_name:str, disc_mod_name:str, dataset_path:str, output_path:str, num_of_episodes:int,
+                      batch_size:int, buffered_batches:int=20, num_of_loading_workers:int=8, mixed_precision:Union[str, None]=None, random_seed:Union[int, None]=0,
+                      latent_dim:int=128, critic_train_multip:int=5, num_of_upscales:int=2, discriminator_training_multiplier:int=1, discriminator_concat_real_fake:bool=False, feature_extractor_layers:Union[list, None]=None,
+                      stats_aggregate_window:Union[int, None]=100, num_of_threads:Union[int, None]=None, timeout:Union[float, None]=None) -> dict:
+  """
+  Trains one model combination headlessly on dataset for num_of_episodes episodes in separate process and returns its throughput stats
+  (episodes and real images per second without first step, percentiles of step time, share of waiting for data and other phases and peak RSS of process)
+  Failed or timed out run is returned with status and error instead of raising so remaining runs of suite continue
+  """
+
+  assert gan_type in GAN_TYPES, Fore.RED + f"Unknown gan type {gan_type}" + Fore.RESET
+  assert num_of_episodes >= 1, Fore.RED + "Invalid number of benchmark episodes" + Fore.RESET
+
+  # Every run starts from empty training folder
+  if os.path.exists(output_path): shutil.rmtree(output_path, True)
+  os.makedirs(output_path)
+
+  settings = {"batch_size": batch_size, "buffered_batches": buffered_batches, "num_of_loading_workers": num_of_loading_workers, "mixed_precision": mixed_precision, "random_seed": random_seed,
+              "latent_dim": latent_dim, "critic_train_multip": critic_train_multip, "num_of_upscales": num_of_upscales, "discriminator_training_multiplier": discriminator_training_multiplier,
+              "discriminator_concat_real_fake": discriminator_concat_real_fake, "feature_extractor_layers": feature_extractor_layers, "stats_aggregate_window": stats_aggregate_window, "num_of_threads": num_of_threads}
+  run_info = {"gan": gan_type, "generator": gen_mod_name, "discriminator": disc_mod_name, "episodes": num_of_episodes, **settings}
+
+  result_queue = _mp_context.Queue()
+  process = _mp_context.Process(target=_run_benchmark_process, args=(result_queue, gan_type, gen_mod_name, disc_mod_name, dataset_path, output_path, num_of_episodes, settings), daemon=True)
+  process.start()
+
+  start_time = time.time()
+  result = None
+  while result is None:
+    try:
+      result = result_queue.get(timeout=1)
+    except Empty:
+      if not process.is_alive():
+        result = {"status": "failed", "error": f"Benchmark process died with exit code {process.exitcode}"}
+      elif timeout is not None and time.time() - start_time > timeout:
+        process.terminate()
+        result = {"status": "failed", "error": f"Benchmark timed out after {timeout} seconds"}
+
+  # Trainer threads can keep process alive after result is returned
+  process.join(30)
+  if process.is_alive(): process.terminate()
+
+  run_info.update(result)
+  return run_info
+
+def compare_results(baseline:dict, results:dict) -> list:
+  """
+  Compares two saved benchmark suites (before and after change), runs are matched by gan type and models
+  Returns list of (gan, generator, discriminator, baseline episodes/s, episodes/s, relative change of episodes/s, relative change of peak RSS)
+  """
+
+  def key(run): return run["gan"], run["generator"], run["discriminator"]
+  baseline_runs = {key(run): run for run in baseline["results"] if run.get("status") == "ok"}
+
+  comparison = []
+  for run in results["results"]:
+    if run.get("status") != "ok" or key(run) not in baseline_runs: continue
+    baseline_run = baseline_runs[key(run)]
+    speed_change = run["episodes_per_second"] / baseline_run["episodes_per_second"] - 1 if baseline_run["episodes_per_second"] > 0 else 0
+    memory_change = run["peak_rss_mb"] / baseline_run["peak_rss_mb"] - 1 if baseline_run["peak_rss_mb"] > 0 else 0
+    comparison.append((*key(run), baseline_run["episodes_per_second"], run["episodes_per_second"], speed_change, memory_change))
+  return comparison
@@ -7,7 +7,6 @@ from keras.initializers import RandomNormal
 from keras.utils import plot_model
 from keras.engine.network import Network
 import keras.backend as K
-from PIL import Image
 from cv2 import cv2 as cv
 import random
 import time
@@ -20,14 +19,28 @@ import imagesize
 from multiprocessing.pool import ThreadPool
 
 from ..utils.batch_maker import BatchMaker
+from ..utils.image_pool import ImagePool
+from ..utils.checkpoint_writer import CheckpointWriter, optimizer_state_variables
+from ..utils.weight_store import WeightSnapshotStore
+from ..utils.stat_logger import StatLogger
+from ..utils.step_profiler import StepProfiler
+from ..utils.progress_renderer import ProgressImageRenderer, make_image_grid
+from ..utils.progress_video import PROGRESS_VIDEO_FORMATS, make_progress_video
 from ..models import discriminator_models_spreadsheet, generator_models_spreadsheet
 from ..keras_extensions.custom_tensorboard import TensorBoardCustom
-from ..utils.helpers import time_to_format, get_paths_of_files_from_path
+from ..keras_extensions.weight_statistics import WeightStatistics
+from ..keras_extensions.profiler_trigger import ProfilerTrigger
+from ..keras_extensions.mixed_precision import enable_mixed_precision, add_loss_scaling
+from ..keras_extensions.train_step import TrainStep, SharedOptimizerSlots
+from ..keras_extensions.dcgan_train_step import DCGANTrainStep
+from ..keras_extensions.graph_random import GraphRandom
+from ..keras_extensions.gradient_monitor import GradientMonitor
+from ..utils.helpers import time_to_format, get_paths_of_files_from_path, interval_crossed
 
 class DCGAN:
   CONTROL_THRESHOLD = 100_000 # Threshold when after whitch we will be testing training process
   AGREGATE_STAT_INTERVAL = 1_000  # Interval of saving data
-  GRADIENT_CHECK_INTERVAL = 10_000  # Interval of checking norm gradient value of combined model
+  RESET_SEEDS_INTERVAL = 10_000  # Interval of reseting seeds for random generators
   CHECKPOINT_SAVE_INTERVAL = 1_000  # Interval of saving checkpoint
 
   def __init__(self, dataset_path:str,
@@ -35,12 +48,18 @@ class DCGAN:
                latent_dim:int,
                training_progress_save_path:str,
                testing_dataset_path:str=None,
-               generator_optimizer:Optimizer=Adam(0.0002, 0.5), discriminator_optimizer:Optimizer=Adam(0.0002, 0.5),
+               generator_optimizer:Optimizer=Adam(0.0002, 0.5), discriminator_optimizer:Optimizer=Adam(0.0002, 0.5), mixed_precision:Union[str, None]=None,
                discriminator_label_noise:float=None, discriminator_label_noise_decay:float=None, discriminator_label_noise_min:float=0.001,
                batch_size: int = 32, buffered_batches:int=20,
                generator_weights:Union[str, None]=None, discriminator_weights:Union[str, None]=None,
                start_episode:int=0, load_from_checkpoint:bool=False,
-               check_dataset:bool=True, num_of_loading_workers:int=8):
+               check_dataset:bool=True, num_of_loading_workers:int=8,
+               gradient_accumulation_steps:int=1, random_seed:Union[int, None]=None):
+
+    # Enable mixed precision before models are created, float16 needs loss scaling to not underflow gradients
+    if enable_mixed_precision(mixed_precision) and mixed_precision == "float16":
+      add_loss_scaling(generator_optimizer)
+      add_loss_scaling(discriminator_optimizer)
 
     self.disc_mod_name = disc_mod_name
     self.gen_mod_name = gen_mod_name
@@ -52,10 +71,41 @@ class DCGAN:
     self.batch_size = batch_size
     assert self.batch_size > 0, Fore.RED + "Invalid batch size" + Fore.RESET
 
+    # Number of batches whose gradients are accumulated to one update (one episode), optimizers must accumulate for same number of steps
+    self.gradient_accumulation_steps = gradient_accumulation_steps
+    assert self.gradient_accumulation_steps >= 1, Fore.RED + "Invalid number of gradient accumulation steps" + Fore.RESET
+    for optimizer in [generator_optimizer, discriminator_optimizer]:
+      assert getattr(optimizer, "accumulation_steps", 1) == self.gradient_accumulation_steps, Fore.RED + "Optimizers must accumulate gradients for same number of steps as trainer (use KerasAdamAccumulated)" + Fore.RESET
+
     self.discriminator_label_noise = discriminator_label_noise
     self.discriminator_label_noise_decay = discriminator_label_noise_decay
     self.discriminator_label_noise_min = discriminator_label_noise_min
 
+    # Latent noise and labels for training are generated in graph by seeded random generator
+    self.graph_random = GraphRandom(random_seed)
+    # Label noise is applied in graph as random flipping of labels with this probability
+    self.discriminator_label_flip_probability = K.variable(0, dtype="float32", name="discriminator_label_flip_probability")
+
+    # Optimizer states shared by all training models
+    self.generator_optimizer_slots = SharedOptimizerSlots()
+    self.discriminator_optimizer_slots = SharedOptimizerSlots()
+
+    # Pool of previously generated images (created by train function)
+    self.fake_image_pool = None
+    self.persist_fake_image_pool = False
+
+    # Monitor of gradient norms computed in training steps (created by train function)
+    self.gradient_monitor = None
+
+    # Trigger of profiler traces (created by train function)
+    self.profiler_trigger = None
+
+    # Timing of phases of training steps (created by train function)
+    self.step_profiler = None
+
+    # Checkpoints are written on background thread
+    self.checkpoint_writer = CheckpointWriter()
+
     self.progress_image_dim = (16, 9)
 
     if start_episode < 0: start_episode = 0
@@ -65,6 +115,12 @@ class DCGAN:
     self.training_progress_save_path = training_progress_save_path
     self.training_progress_save_path = os.path.join(self.training_progress_save_path, f"{self.gen_mod_name}__{self.disc_mod_name}")
     self.tensorboard = TensorBoardCustom(log_dir=os.path.join(self.training_progress_save_path, "logs"))
+    self.stat_logger = StatLogger(self.tensorboard)
+    self.weight_statistics = WeightStatistics(self.tensorboard)
+    # Deduplicated store of weight snapshots (configured by train function)
+    self.weights_store = WeightSnapshotStore(os.path.join(self.training_progress_save_path, "weights"))
+    # Progress images are composed and written on background thread
+    self.progress_renderer = ProgressImageRenderer(self.tensorboard, os.path.join(self.training_progress_save_path, "progress_images"))
 
     # Create array of input image paths
     self.train_data = get_paths_of_files_from_path(dataset_path, only_files=True)
@@ -98,8 +154,9 @@ class DCGAN:
       self.static_noise = np.random.normal(0.0, 1.0, size=(self.progress_image_dim[0] * self.progress_image_dim[1], self.latent_dim))
     self.kernel_initializer = RandomNormal(stddev=0.02)
 
-    # Load checkpoint
+    # Load checkpoint (training state is restored by train function after optimizer slots are created)
     self.initiated = False
+    self.__training_state_path = None
     loaded_gen_weights_path = None
     loaded_disc_weights_path = None
     if load_from_checkpoint:
@@ -166,15 +223,6 @@ class DCGAN:
     if generator_weights: self.generator.load_weights(generator_weights)
     if discriminator_weights: self.discriminator.load_weights(discriminator_weights)
 
-  # Function for creating gradient generator
-  def gradient_norm_generator(self):
-    grads = K.gradients(self.combined_generator_model.total_loss, self.combined_generator_model.trainable_weights)
-    summed_squares = [K.sum(K.square(g)) for g in grads]
-    norm = K.sqrt(sum(summed_squares))
-    inputs = self.combined_generator_model._feed_inputs + self.combined_generator_model._feed_targets + self.combined_generator_model._feed_sample_weights
-    func = K.function(inputs, [norm])
-    return func
-
   # Check if datasets have consistent shapes
   def validate_dataset(self):
     def check_image(image_path):
@@ -223,29 +271,20 @@ class DCGAN:
             feed_prev_gen_batch:bool=False, feed_old_perc_amount:float=0.2,
             progress_images_save_interval:int=None, save_raw_progress_images:bool=True, weights_save_interval:int=None,
             discriminator_smooth_real_labels:bool=False, discriminator_smooth_fake_labels:bool=False,
-            generator_smooth_labels:bool=False):
-
-    # Function for adding random noise to labels (flipping them)
-    def noising_labels(labels: np.ndarray, noise_ammount:float=0.01):
-      array = np.zeros(labels.shape)
-      for idx in range(labels.shape[0]):
-        if random.random() < noise_ammount:
-          array[idx] = 1 - labels[idx]
-          if array[idx] < 0: array[idx] = -array[idx]
-        else:
-          array[idx] = labels[idx]
-      return labels
-
-    # Function for replacing new generated images with old generated images
-    def replace_random_images(orig_images: np.ndarray, repl_images: deque, perc_ammount:float=0.20):
-      repl_images = np.array(repl_images)
-      for idx in range(orig_images.shape[0]):
-        if random.random() < perc_ammount:
-          orig_images[idx] = repl_images[random.randint(0, repl_images.shape[0] - 1)]
-      return orig_images
+            generator_smooth_labels:bool=False, discriminator_concat_real_fake:bool=False,
+            episodes_per_call:int=1, fake_image_pool_capacity:Union[int, None]=None, persist_fake_image_pool:bool=False,
+            gradient_monitor_interval:Union[int, None]=100, gradient_norm_limits:tuple=(0.2, 100), gradient_norm_action:str="log",
+            weights_store_float16:bool=False, weights_store_keyframe_interval:Union[int, None]=10, weights_keep_last:Union[int, None]=None, weights_keep_every_episodes:Union[int, None]=None,
+            progress_tensorboard_scale:float=1.0, stats_aggregate_window:Union[int, None]=None, stats_full_resolution_episodes:int=0,
+            weight_stats_interval:Union[int, None]=1_000, step_timing_log_interval:Union[int, None]=1_000,
+            profile_trace_episodes:Union[int, None]=10, profile_trace_start_episode:Union[int, None]=None):
 
     # Check arguments and input data
     assert target_episode > 0, Fore.RED + "Invalid number of epochs" + Fore.RESET
+    assert episodes_per_call >= 1, Fore.RED + "Invalid number of episodes per call" + Fore.RESET
+    assert episodes_per_call == 1 or not feed_prev_gen_batch, Fore.RED + "Multiple episodes per call generate fake images in graph so they cant use previous generated images" + Fore.RESET
+    # Real and fake steps share discriminator optimizer so with accumulation they have to be one train call per sub step
+    assert self.gradient_accumulation_steps == 1 or discriminator_concat_real_fake, Fore.RED + "Gradient accumulation needs discriminator_concat_real_fake (separate real and fake steps would split accumulated update of shared optimizer)" + Fore.RESET
     if progress_images_save_interval:
       assert progress_images_save_interval <= target_episode, Fore.RED + "Invalid progress save interval" + Fore.RESET
     if weights_save_interval:
@@ -261,156 +300,247 @@ class DCGAN:
       if not os.path.exists(self.training_progress_save_path): os.makedirs(self.training_progress_save_path)
       np.save(f"{self.training_progress_save_path}/static_noise.npy", self.static_noise)
 
-    # Training variables
-    prev_gen_images = deque(maxlen=3*self.batch_size)
-    get_gradients = self.gradient_norm_generator()
+    assert 0 < progress_tensorboard_scale <= 1, Fore.RED + "Invalid tensorboard progress image scale" + Fore.RESET
+    self.progress_renderer.tensorboard_scale = progress_tensorboard_scale
+
+    # Stats are logged as summaries of aggregate windows after full resolution episodes
+    self.stat_logger = StatLogger(self.tensorboard, stats_aggregate_window, stats_full_resolution_episodes)
+
+    # Weights store with retention and encoding settings of this training
+    self.weights_store = WeightSnapshotStore(os.path.join(self.training_progress_save_path, "weights"), weights_store_float16, weights_store_keyframe_interval,
+                                             keep_last=weights_keep_last, keep_every_episodes=weights_keep_every_episodes)
+
+    # Pool of previously generated images used for replacing part of new generated images
+    self.fake_image_pool = None
+    self.persist_fake_image_pool = persist_fake_image_pool
+    if feed_prev_gen_batch:
+      self.fake_image_pool = ImagePool(fake_image_pool_capacity if fake_image_pool_capacity else 3 * self.batch_size, self.image_shape)
+      if persist_fake_image_pool: self.fake_image_pool.load(os.path.join(self.training_progress_save_path, "checkpoint", "fake_image_pool.npy"))
 
     epochs_time_history = deque(maxlen=self.AGREGATE_STAT_INTERVAL * 50)
 
     # Save starting kernels and biases
     if not self.initiated:
       self.__save_imgs(save_raw_progress_images)
-      self.tensorboard.log_kernels_and_biases(self.generator)
+      if weight_stats_interval is not None: self.weight_statistics.log({"generator": self.generator, "discriminator": self.discriminator}, self.episode_counter)
       self.save_checkpoint()
 
-    print(Fore.GREEN + f"Starting training on episode {self.episode_counter} for {target_episode} episodes" + Fore.RESET)
-    for _ in range(target_episode):
-      ep_start = time.time()
-
-      ### Train Discriminator ###
-      # Select batch of valid images
-      imgs = self.batch_maker.get_batch()
-
-      # Sample noise and generate new images
-      gen_imgs = self.generator.predict(np.random.normal(0.0, 1.0, (self.batch_size, self.latent_dim)))
-
-      # Train discriminator (real as ones and fake as zeros)
-      if discriminator_smooth_real_labels:
-        disc_real_labels = np.random.uniform(0.8, 1.0, size=(self.batch_size, 1))
+    # Gradient norms are computed by training functions so optimizers are watched before they are built (checks start after control threshold)
+    self.gradient_monitor = None
+    if gradient_monitor_interval:
+      self.gradient_monitor = GradientMonitor(self.tensorboard, gradient_norm_limits, gradient_norm_action, check_start_episode=self.CONTROL_THRESHOLD)
+      self.gradient_monitor.watch(self.generator_optimizer, "generator")
+      self.gradient_monitor.watch(self.discriminator.optimizer, "discriminator")
+
+    # Label noise is applied in graph as random flipping of labels
+    K.set_value(self.discriminator_label_flip_probability, self.discriminator_label_noise / 2 if self.discriminator_label_noise else 0)
+
+    # Multiple episodes are trained by one compiled function (all updates of call are unrolled in graph)
+    compiled_train_step = None
+    if episodes_per_call > 1:
+      compiled_train_step = DCGANTrainStep(self.generator, self.discriminator,
+                                           self.generator_optimizer, self.discriminator.optimizer,
+                                           self.combined_generator_model._collected_trainable_weights, self.discriminator._collected_trainable_weights,
+                                           self.latent_dim, self.image_shape, self.batch_size,
+                                           episodes=episodes_per_call, accumulation_steps=self.gradient_accumulation_steps, concat_real_fake=discriminator_concat_real_fake,
+                                           smooth_real_labels=discriminator_smooth_real_labels, smooth_fake_labels=discriminator_smooth_fake_labels, generator_smooth_labels=generator_smooth_labels,
+                                           label_flip_probability=self.discriminator_label_flip_probability if self.discriminator_label_noise is not None else None,
+                                           graph_random=self.graph_random, generator_optimizer_slots=self.generator_optimizer_slots, discriminator_optimizer_slots=self.discriminator_optimizer_slots)
+      compiled_train_step.build()
+    else:
+      ### Create training models with labels and latent noise generated in graph ###
+      # Fake images for discriminator are generated from in graph noise (inference mode same as predict)
+      fake_images_inputs = [] if isinstance(K.learning_phase(), int) else [K.learning_phase()]
+      fake_images_function = K.function(fake_images_inputs, [self.generator(self.graph_random.normal((self.batch_size, self.latent_dim)))])
+      fake_images_function_inputs = [0] if fake_images_inputs else []
+
+      # Labels of discriminator with optional smoothing and random flipping (label noise)
+      disc_real_labels = self.graph_random.labels((self.batch_size, 1), 1.0, (0.8, 1.0) if discriminator_smooth_real_labels else None)
+      disc_fake_labels = self.graph_random.labels((self.batch_size, 1), 0.0, (0.0, 0.2) if discriminator_smooth_fake_labels else None)
+      if self.discriminator_label_noise is not None:
+        disc_real_labels = self.graph_random.flip_labels(disc_real_labels, self.discriminator_label_flip_probability)
+        disc_fake_labels = self.graph_random.flip_labels(disc_fake_labels, self.discriminator_label_flip_probability)
+
+      # Direct training calls of models (skips input validation of train_on_batch), all training models share optimizer states with original models
+      image_input = Input(shape=self.image_shape, name="discriminator_training_image_input")
+      if discriminator_concat_real_fake:
+        discriminator_concat_model = Model(image_input, self.discriminator(image_input), name="discriminator_concat_training_model")
+        discriminator_concat_model.compile(loss="binary_crossentropy", optimizer=self.discriminator.optimizer, target_tensors=[K.concatenate([disc_real_labels, disc_fake_labels], axis=0)])
+        discriminator_concat_train_step = TrainStep(discriminator_concat_model, self.batch_size * 2, self.discriminator_optimizer_slots)
       else:
-        disc_real_labels = np.ones(shape=(self.batch_size, 1))
+        discriminator_real_model = Model(image_input, self.discriminator(image_input), name="discriminator_real_training_model")
+        discriminator_real_model.compile(loss="binary_crossentropy", optimizer=self.discriminator.optimizer, target_tensors=[disc_real_labels])
+        discriminator_real_train_step = TrainStep(discriminator_real_model, self.batch_size, self.discriminator_optimizer_slots)
+
+        discriminator_fake_model = Model(image_input, self.discriminator(image_input), name="discriminator_fake_training_model")
+        discriminator_fake_model.compile(loss="binary_crossentropy", optimizer=self.discriminator.optimizer, target_tensors=[disc_fake_labels])
+        discriminator_fake_train_step = TrainStep(discriminator_fake_model, self.batch_size, self.discriminator_optimizer_slots)
+
+      gen_noise_input = Input(tensor=self.graph_random.normal((self.batch_size, self.latent_dim)), name="generator_training_noise_input")
+      generator_training_model = Model(gen_noise_input, self.combined_generator_model(gen_noise_input), name="generator_training_model")
+      generator_training_model.compile(loss="binary_crossentropy", optimizer=self.generator_optimizer,
+                                       target_tensors=[self.graph_random.labels((self.batch_size, 1), 1.0, (0.8, 1.0) if generator_smooth_labels else None)])
+      generator_train_step = TrainStep(generator_training_model, self.batch_size, self.generator_optimizer_slots)
+
+    # Optimizer slots and random generator streams exist only after all training functions are built
+    if self.__training_state_path is not None:
+      restored_state = CheckpointWriter.restore_variables(self.__training_state_path, self.__training_state_variables())
+      if restored_state: print(Fore.BLUE + f"Restored training state from checkpoint: {', '.join(restored_state)}" + Fore.RESET)
+      self.__training_state_path = None
 
-      if discriminator_smooth_fake_labels:
-        disc_fake_labels = np.random.uniform(0, 0.2, size=(self.batch_size, 1))
-      else:
-        disc_fake_labels = np.zeros(shape=(self.batch_size, 1))
-
-      if feed_prev_gen_batch:
-        if len(prev_gen_images) > 0:
-          tmp_imgs = replace_random_images(gen_imgs, prev_gen_images, feed_old_perc_amount)
-          prev_gen_images += deque(gen_imgs)
-          gen_imgs = tmp_imgs
-        else:
-          prev_gen_images += deque(gen_imgs)
-
-      # Adding random noise to discriminator labels
-      if self.discriminator_label_noise and self.discriminator_label_noise > 0:
-        disc_real_labels = noising_labels(disc_real_labels, self.discriminator_label_noise / 2)
-        disc_fake_labels = noising_labels(disc_fake_labels, self.discriminator_label_noise / 2)
-
-      self.discriminator.trainable = True
-      disc_real_loss = self.discriminator.train_on_batch(imgs, disc_real_labels)
-      disc_fake_loss = self.discriminator.train_on_batch(gen_imgs, disc_fake_labels)
-
-      ### Train Generator ###
-      # Train generator (wants discriminator to recognize fake images as valid)
-      if generator_smooth_labels:
-        gen_labels = np.random.uniform(0.8, 1.0, size=(self.batch_size, 1))
+    print(Fore.GREEN + f"Starting training on episode {self.episode_counter} for {target_episode} episodes" + Fore.RESET)
+    episodes_done = 0
+    self.step_profiler = StepProfiler()
+
+    # Profiler trace of next episodes can be requested during training by creating file profile_trace in training folder or by SIGUSR1 signal
+    self.profiler_trigger = ProfilerTrigger(os.path.join(self.training_progress_save_path, "logs"), os.path.join(self.training_progress_save_path, "profile_trace"), profile_trace_episodes, profile_trace_start_episode) if profile_trace_episodes else None
+    while episodes_done < target_episode:
+      ep_start = time.time()
+      self.step_profiler.start_step()
+      if self.profiler_trigger is not None: self.profiler_trigger.update(self.episode_counter)
+
+      # Multiple episodes are trained in one call, stats, saving and checks are done after each call
+      episodes_in_call = min(episodes_per_call, target_episode - episodes_done)
+      start_episode = self.episode_counter
+
+      if compiled_train_step is not None:
+        real_images = np.stack([self.batch_maker.get_batch() for _ in range(episodes_in_call * self.gradient_accumulation_steps)])
+        self.step_profiler.lap("data_wait")
+        losses = compiled_train_step(real_images)
+        self.step_profiler.lap("compiled_update")
       else:
-        gen_labels = np.ones(shape=(self.batch_size, 1))
-      self.discriminator.trainable = False
-      gan_loss = self.combined_generator_model.train_on_batch(np.random.normal(0.0, 1.0, (self.batch_size, self.latent_dim)), gen_labels)
+        disc_losses = []
+        disc_real_losses = []
+        disc_fake_losses = []
+        gan_losses = []
+
+        ### Train Discriminator ###
+        # With gradient accumulation all sub steps are applied as one update of optimizer
+        for _ in range(self.gradient_accumulation_steps):
+          # Select batch of valid images
+          imgs = self.batch_maker.get_batch()
+          self.step_profiler.lap("data_wait")
+
+          # Generate new images
+          gen_imgs = fake_images_function(fake_images_function_inputs)[0]
+
+          if self.fake_image_pool is not None:
+            gen_imgs = self.fake_image_pool.replace_random(gen_imgs, feed_old_perc_amount)
+
+          # Train discriminator (real as ones and fake as zeros)
+          if discriminator_concat_real_fake:
+            # One update on real and fake images stacked together
+            # Separate real/fake losses are not available in this mode
+            disc_losses.append(discriminator_concat_train_step([np.concatenate((imgs, gen_imgs))], []))
+          else:
+            disc_real_losses.append(discriminator_real_train_step([imgs], []))
+            disc_fake_losses.append(discriminator_fake_train_step([gen_imgs], []))
+          self.step_profiler.lap("discriminator_update")
+
+        ### Train Generator ###
+        # Train generator (wants discriminator to recognize fake images as valid)
+        for _ in range(self.gradient_accumulation_steps):
+          gan_losses.append(generator_train_step([], []))
+        self.step_profiler.lap("generator_update")
+
+        # Real and fake losses are logged only when they are trained separately
+        losses = {"disc_loss": float(np.mean(disc_losses))} if discriminator_concat_real_fake else {"disc_real_loss": float(np.mean(disc_real_losses)), "disc_fake_loss": float(np.mean(disc_fake_losses))}
+        losses["gan_loss"] = float(np.mean(gan_losses))
+
+      self.episode_counter += episodes_in_call
+      episodes_done += episodes_in_call
+
+      # Decay label noise (once for every trained episode)
+      if self.discriminator_label_noise and self.discriminator_label_noise_decay:
+        for _ in range(episodes_in_call):
+          self.discriminator_label_noise = max([self.discriminator_label_noise_min, (self.discriminator_label_noise * self.discriminator_label_noise_decay)])
 
-      self.episode_counter += 1
-      self.tensorboard.step = self.episode_counter
-      self.tensorboard.update_stats(disc_real_loss=disc_real_loss, disc_fake_loss=disc_fake_loss, gan_loss=gan_loss, disc_label_noise=self.discriminator_label_noise if self.discriminator_label_noise else 0)
+          if (self.discriminator_label_noise_min == 0) and (self.discriminator_label_noise != 0) and (self.discriminator_label_noise < 0.001):
+            self.discriminator_label_noise = 0
 
-      # Decay label noise
-      if self.discriminator_label_noise and self.discriminator_label_noise_decay:
-        self.discriminator_label_noise = max([self.discriminator_label_noise_min, (self.discriminator_label_noise * self.discriminator_label_noise_decay)])
+        K.set_value(self.discriminator_label_flip_probability, self.discriminator_label_noise / 2)
+      self.step_profiler.lap("scheduling")
 
-        if (self.discriminator_label_noise_min == 0) and (self.discriminator_label_noise != 0) and (self.discriminator_label_noise < 0.001):
-          self.discriminator_label_noise = 0
+      self.tensorboard.step = self.episode_counter
+      self.stat_logger.append_stats(self.episode_counter, **losses, disc_label_noise=self.discriminator_label_noise if self.discriminator_label_noise else 0)
 
       # Seve stats and print them to console
-      if self.episode_counter % self.AGREGATE_STAT_INTERVAL == 0:
-        self.tensorboard.log_kernels_and_biases(self.generator)
-
+      if interval_crossed(start_episode, self.episode_counter, self.AGREGATE_STAT_INTERVAL):
         # Change color of log according to state of training
-        print(Fore.GREEN + f"{self.episode_counter}/{end_episode}, Remaining: {time_to_format(mean(epochs_time_history) * (end_episode - self.episode_counter))}\t\t[D-R loss: {round(float(disc_real_loss), 5)}, D-F loss: {round(float(disc_fake_loss), 5)}] [G loss: {round(float(gan_loss), 5)}] - Epsilon: {round(self.discriminator_label_noise, 4) if self.discriminator_label_noise else 0}" + Fore.RESET)
+        disc_losses_text = f"D loss: {round(losses['disc_loss'], 5)}" if discriminator_concat_real_fake else f"D-R loss: {round(losses['disc_real_loss'], 5)}, D-F loss: {round(losses['disc_fake_loss'], 5)}"
+        print(Fore.GREEN + f"{self.episode_counter}/{end_episode}, Remaining: {time_to_format(mean(epochs_time_history) * (end_episode - self.episode_counter))}\t\t[{disc_losses_text}] [G loss: {round(losses['gan_loss'], 5)}] - Epsilon: {round(self.discriminator_label_noise, 4) if self.discriminator_label_noise else 0}" + Fore.RESET)
+
+      # Statistics of weights are computed and written on background thread
+      if weight_stats_interval is not None and interval_crossed(start_episode, self.episode_counter, weight_stats_interval):
+        self.weight_statistics.log({"generator": self.generator, "discriminator": self.discriminator}, self.episode_counter)
+      self.step_profiler.lap("logging")
 
       # Save progress
-      if self.training_progress_save_path is not None and progress_images_save_interval is not None and self.episode_counter % progress_images_save_interval == 0:
+      if self.training_progress_save_path is not None and progress_images_save_interval is not None and interval_crossed(start_episode, self.episode_counter, progress_images_save_interval):
         self.__save_imgs(save_raw_progress_images)
+      self.step_profiler.lap("progress_images")
 
       # Save weights of models
-      if weights_save_interval is not None and self.episode_counter % weights_save_interval == 0:
+      if weights_save_interval is not None and interval_crossed(start_episode, self.episode_counter, weights_save_interval):
         self.__save_weights()
 
       # Save checkpoint
-      if self.episode_counter % self.CHECKPOINT_SAVE_INTERVAL == 0:
+      if interval_crossed(start_episode, self.episode_counter, self.CHECKPOINT_SAVE_INTERVAL):
         self.save_checkpoint()
         print(Fore.BLUE + "Checkpoint created" + Fore.RESET)
+      self.step_profiler.lap("checkpointing")
 
-      if self.episode_counter % self.GRADIENT_CHECK_INTERVAL == 0:
-        # Generate evaluation noise and labels
-        eval_noise = np.random.normal(0.0, 1.0, (self.batch_size, self.latent_dim))
-        eval_labels = np.ones(shape=(self.batch_size, 1))
-
-        # Create gradient function and evaluate based on eval noise and labels
-        norm_gradient = get_gradients([eval_noise, eval_labels, np.ones(len(eval_labels))])[0]
-
-        # Check norm gradient
-        if norm_gradient > 100 and self.episode_counter > self.CONTROL_THRESHOLD:
-          print(Fore.RED + f"Current generator norm gradient: {norm_gradient}")
-          print("Gradient too high!" + Fore.RESET)
-          if input("Do you want exit training?\n") == "y": return
-        elif norm_gradient < 0.2 and self.episode_counter > self.CONTROL_THRESHOLD:
-          print(Fore.RED + f"Current generator norm gradient: {norm_gradient}")
-          print("Gradient vanished!" + Fore.RESET)
-          if input("Do you want exit training?\n") == "y": return
-        else:
-          print(Fore.BLUE + f"Current generator norm gradient: {norm_gradient}" + Fore.RESET)
-
-        # Change seed
+      # Reset seeds
+      if interval_crossed(start_episode, self.episode_counter, self.RESET_SEEDS_INTERVAL):
         np.random.seed(None)
         random.seed()
 
-      epochs_time_history.append(time.time() - ep_start)
+      epochs_time_history.append((time.time() - ep_start) / episodes_in_call)
+
+      # Rolling percentiles of phase timings
+      self.step_profiler.end_step()
+      if step_timing_log_interval is not None and interval_crossed(start_episode, self.episode_counter, step_timing_log_interval):
+        self.step_profiler.log(self.tensorboard, self.episode_counter)
+
+      # Gradient norms are read and checked on background thread, requested actions are handled after next calls
+      if self.gradient_monitor is not None:
+        if interval_crossed(start_episode, self.episode_counter, gradient_monitor_interval):
+          self.gradient_monitor.check(self.episode_counter)
+
+        if self.gradient_monitor.checkpoint_requested:
+          self.gradient_monitor.checkpoint_requested = False
+          self.save_checkpoint()
+          print(Fore.BLUE + "Checkpoint created because of gradient norm" + Fore.RESET)
+
+        if self.gradient_monitor.halt_requested:
+          print(Fore.RED + f"Halting training on episode {self.episode_counter} because of gradient norm" + Fore.RESET)
+          break
 
     # Shutdown helper threads
     print(Fore.GREEN + "Training Complete - Waiting for other threads to finish" + Fore.RESET)
+    if self.profiler_trigger is not None: self.profiler_trigger.close(self.episode_counter)
     if self.testing_batchmaker: self.testing_batchmaker.__terminate = True
     self.batch_maker.terminate()
+    if self.gradient_monitor is not None: self.gradient_monitor.terminate()
     self.save_checkpoint()
     self.__save_weights()
     self.batch_maker.join()
     if self.testing_batchmaker: self.testing_batchmaker.join()
+    if self.gradient_monitor is not None: self.gradient_monitor.join()
+    self.progress_renderer.flush()
+    self.weight_statistics.flush()
+    self.stat_logger.flush()
+    self.flush_checkpoint()
+    self.step_profiler.save(os.path.join(self.training_progress_save_path, "step_timing.json"))
     print(Fore.GREEN + "All threads finished" + Fore.RESET)
 
   # Function for saving progress images
   def __save_imgs(self, save_raw_progress_images:bool=True):
-    if not os.path.exists(self.training_progress_save_path + "/progress_images"): os.makedirs(self.training_progress_save_path + "/progress_images")
     gen_imgs = self.generator.predict(self.static_noise)
+    grid_dim = self.progress_image_dim
 
-    # Rescale images 0 to 255
-    gen_imgs = (0.5 * gen_imgs + 0.5) * 255
-
-    final_image = np.zeros(shape=(self.image_shape[0] * self.progress_image_dim[1], self.image_shape[1] * self.progress_image_dim[0], self.image_channels)).astype(np.float32)
-
-    cnt = 0
-    for i in range(self.progress_image_dim[1]):
-      for j in range(self.progress_image_dim[0]):
-        if self.image_channels == 3:
-          final_image[self.image_shape[0] * i:self.image_shape[0] * (i + 1), self.image_shape[1] * j:self.image_shape[1] * (j + 1), :] = gen_imgs[cnt]
-        else:
-          final_image[self.image_shape[0] * i:self.image_shape[0] * (i + 1), self.image_shape[1] * j:self.image_shape[1] * (j + 1), 0] = gen_imgs[cnt, :, :, 0]
-        cnt += 1
-    final_image = cv.cvtColor(final_image, cv.COLOR_RGB2BGR)
-
-    if save_raw_progress_images:
-      cv.imwrite(f"{self.training_progress_save_path}/progress_images/{self.episode_counter}.png", final_image)
-    self.tensorboard.write_image(np.reshape(cv.cvtColor(final_image, cv.COLOR_BGR2RGB) / 255, (-1, final_image.shape[0], final_image.shape[1], final_image.shape[2])).astype(np.float32))
+    # Images are rescaled from -1 to 1 range to 0 to 255 and placed to grid by renderer
+    self.progress_renderer.render(self.episode_counter, lambda: make_image_grid((0.5 * gen_imgs + 0.5) * 255, grid_dim), save_raw_progress_images)
 
   def save_models_structure_images(self):
     save_path = self.training_progress_save_path + "/model_structures"
@@ -430,6 +560,7 @@ class DCGAN:
         self.episode_counter = int(data["episode"])
         if data["disc_label_noise"]:
           self.discriminator_label_noise = float(data["disc_label_noise"])
+        if "state_path" in data.keys(): self.__training_state_path = data["state_path"]
         self.initiated = True
         return data["gen_path"], data["disc_path"]
       return None, None
@@ -440,42 +571,41 @@ class DCGAN:
 
     gen_path = f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5"
     disc_path = f"{checkpoint_base_path}/discriminator_{self.disc_mod_name}.h5"
-
-    if os.path.exists(gen_path): os.rename(gen_path, f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock")
-    if os.path.exists(disc_path): os.rename(disc_path, f"{checkpoint_base_path}/discriminator_{self.disc_mod_name}.h5.lock")
-
-    self.generator.save_weights(gen_path)
-    self.discriminator.save_weights(disc_path)
-
-    if os.path.exists(f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock")
-    if os.path.exists(f"{checkpoint_base_path}/discriminator_{self.disc_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/discriminator_{self.disc_mod_name}.h5.lock")
+    state_path = f"{checkpoint_base_path}/training_state.h5"
 
     data = {
       "episode": self.episode_counter,
       "gen_path": gen_path,
       "disc_path": disc_path,
+      "state_path": state_path,
       "disc_label_noise": self.discriminator_label_noise
     }
 
-    with open(os.path.join(checkpoint_base_path, "checkpoint_data.json"), "w", encoding='utf-8') as f:
-      json.dump(data, f)
-
-  def __save_weights(self):
-    save_dir = self.training_progress_save_path + "/weights/" + str(self.episode_counter)
-    if not os.path.exists(save_dir): os.makedirs(save_dir)
-    self.generator.save_weights(f"{save_dir}/generator_{self.gen_mod_name}.h5")
-    self.discriminator.save_weights(f"{save_dir}/discriminator_{self.disc_mod_name}.h5")
-
-  def make_progress_gif(self, frame_duration:int=16):
-    if not os.path.exists(self.training_progress_save_path): os.makedirs(self.training_progress_save_path)
-    if not os.path.exists(self.training_progress_save_path + "/progress_images"): return
+    # Weights are snapshotted now and written on background thread (flush_checkpoint waits for them)
+    arrays = {f"{checkpoint_base_path}/fake_image_pool.npy": self.fake_image_pool.get_images()} if self.fake_image_pool is not None and self.persist_fake_image_pool else None
+    self.checkpoint_writer.save(models={gen_path: self.generator, disc_path: self.discriminator}, arrays=arrays,
+                                variables={state_path: self.__training_state_variables()},
+                                json_data={os.path.join(checkpoint_base_path, "checkpoint_data.json"): data})
+
+  # Named groups of variables saved as training state (optimizer slots, label noise and positions of random generator streams)
+  def __training_state_variables(self) -> dict:
+    return {
+      "combined_generator_model_optimizer": optimizer_state_variables(self.combined_generator_model.optimizer),
+      "discriminator_optimizer": optimizer_state_variables(self.discriminator.optimizer),
+      "discriminator_label_flip_probability": [self.discriminator_label_flip_probability],
+      "graph_random_counters": self.graph_random.counters
+    }
 
-    frames = []
-    img_file_names = os.listdir(self.training_progress_save_path + "/progress_images")
+  # Wait until all requested checkpoints are written to disk
+  def flush_checkpoint(self):
+    self.checkpoint_writer.flush()
 
-    for im_file in img_file_names:
-      if os.path.isfile(self.training_progress_save_path + "/progress_images/" + im_file):
-        frames.append(Image.open(self.training_progress_save_path + "/progress_images/" + im_file))
+  # Weights are copied to host memory and written to weights store on checkpoint writer thread
+  def __save_weights(self):
+    self.weights_store.save(self.episode_counter, {"generator": self.generator, "discriminator": self.discriminator}, self.checkpoint_writer)
 
-    if len(frames) > 2:
-      frames[0].save(f"{self.training_progress_save_path}/progress_gif.gif", format="GIF", append_images=frames[1:], save_all=True, optimize=False, duration=frame_duration, loop=0)
\ No newline at end of file
+  # Encode progress images to gif or mp4 ordered by episode (frames are streamed so memory usage doesnt grow with number of frames)
+  def make_progress_video(self, frame_duration:int=16, video_format:str="gif", frame_stride:int=1, scale:float=1.0):
+    assert video_format in PROGRESS_VIDEO_FORMATS, Fore.RED + f"Invalid progress video format, avaible formats: {PROGRESS_VIDEO_FORMATS}" + Fore.RESET
+    self.progress_renderer.flush()
+    make_progress_video(os.path.join(self.training_progress_save_path, "progress_images"), os.path.join(self.training_progress_save_path, f"progress_video.{video_format}"), frame_duration, frame_stride, scale)
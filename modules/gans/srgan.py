@@ -9,7 +9,6 @@ from keras.engine.network import Network
 from keras.initializers import RandomNormal
 from keras.utils import plot_model
 from statistics import mean
-from PIL import Image
 import numpy as np
 from cv2 import cv2 as cv
 from collections import deque
@@ -21,9 +20,24 @@ from multiprocessing.pool import ThreadPool
 
 from ..models import upscaling_generator_models_spreadsheet, discriminator_models_spreadsheet
 from ..keras_extensions.custom_tensorboard import TensorBoardCustom
+from ..keras_extensions.weight_statistics import WeightStatistics
+from ..keras_extensions.profiler_trigger import ProfilerTrigger
 from ..keras_extensions.custom_lrscheduler import LearningRateScheduler
+from ..keras_extensions.mixed_precision import enable_mixed_precision, add_loss_scaling
+from ..keras_extensions.train_step import TrainStep, SharedOptimizerSlots
+from ..keras_extensions.graph_random import GraphRandom
+from ..keras_extensions.gradient_monitor import GradientMonitor
 from ..utils.batch_maker import BatchMaker, AugmentationSettings
+from ..utils.image_pool import ImagePool
+from ..utils.checkpoint_writer import CheckpointWriter, optimizer_state_variables
+from ..utils.weight_store import WeightSnapshotStore
+from ..utils.progress_renderer import ProgressImageRenderer
+from ..utils.progress_video import PROGRESS_VIDEO_FORMATS, make_progress_video
 from ..utils.stat_logger import StatLogger
+from ..utils.step_profiler import StepProfiler
+from ..utils.feature_cache import FeatureCache
+from ..utils.feature_producer import FeatureProducer
+from ..utils.distributed import WorkerGroup
 from ..utils.helpers import time_to_format, get_paths_of_files_from_path, count_upscaling_start_size
 from ..keras_extensions.feature_extractor import create_feature_extractor, preprocess_vgg
 from ..utils.metrics import PSNR, PSNR_Y, SSIM
@@ -37,10 +51,11 @@ class SRGAN:
                gen_mod_name:str, disc_mod_name:str,
                training_progress_save_path:str,
                dataset_augmentation_settings:Union[AugmentationSettings, None]=None,
-               generator_optimizer:Optimizer=Adam(0.0001, 0.9), discriminator_optimizer:Optimizer=Adam(0.0001, 0.9),
+               generator_optimizer:Optimizer=Adam(0.0001, 0.9), discriminator_optimizer:Optimizer=Adam(0.0001, 0.9), mixed_precision:Union[str, None]=None,
                gen_loss="mae", disc_loss="binary_crossentropy", feature_loss="mae",
                gen_loss_weight:float=1.0, disc_loss_weight:float=0.003, feature_loss_weights:Union[list, float, None]=None,
-               feature_extractor_layers: Union[list, None]=None,
+               feature_extractor_layers: Union[list, None]=None, feature_cache_path:Union[str, None]=None, feature_cache_float16:bool=False,
+               use_feature_producer:bool=False, feature_producer_threads:Union[int, None]=None,
                generator_lr_decay_interval:Union[int, None]=None, discriminator_lr_decay_interval:Union[int, None]=None,
                generator_lr_decay_factor:Union[float, None]=None, discriminator_lr_decay_factor:Union[float, None]=None,
                generator_min_lr:Union[float, None]=None, discriminator_min_lr:Union[float, None]=None,
@@ -48,7 +63,13 @@ class SRGAN:
                batch_size:int=4, buffered_batches:int=20,
                generator_weights:Union[str, None]=None, discriminator_weights:Union[str, None]=None,
                load_from_checkpoint:bool=False,
-               custom_hr_test_images_paths:Union[list, None]=None, check_dataset:bool=True, num_of_loading_workers:int=8):
+               custom_hr_test_images_paths:Union[list, None]=None, num_of_random_test_images:int=1, check_dataset:bool=True, num_of_loading_workers:int=8,
+               worker_group:Union[WorkerGroup, None]=None, gradient_accumulation_steps:int=1, random_seed:Union[int, None]=None):
+
+    # Enable mixed precision before models are created, float16 needs loss scaling to not underflow gradients
+    if enable_mixed_precision(mixed_precision) and mixed_precision == "float16":
+      add_loss_scaling(generator_optimizer)
+      add_loss_scaling(discriminator_optimizer)
 
     # Save params to inner variables
     self.__disc_mod_name = disc_mod_name
@@ -64,8 +85,46 @@ class SRGAN:
     self.__batch_size = batch_size
     assert self.__batch_size > 0, Fore.RED + "Invalid batch size" + Fore.RESET
 
+    # Number of batches whose gradients are accumulated to one update (one episode), optimizers must accumulate for same number of steps
+    self.__gradient_accumulation_steps = gradient_accumulation_steps
+    assert self.__gradient_accumulation_steps >= 1, Fore.RED + "Invalid number of gradient accumulation steps" + Fore.RESET
+    for optimizer in [generator_optimizer, discriminator_optimizer]:
+      assert getattr(optimizer, "accumulation_steps", 1) == self.__gradient_accumulation_steps, Fore.RED + "Optimizers must accumulate gradients for same number of steps as trainer (use KerasAdamAccumulated)" + Fore.RESET
+
     self.__episode_counter = 0
 
+    # Only chief worker writes logs, progress images and checkpoints
+    self.__worker_group = worker_group
+    self.__is_chief = self.__worker_group is None or self.__worker_group.is_chief
+
+    # Labels for training are generated in graph by seeded random generator (each worker has its own stream)
+    self.__graph_random = GraphRandom(random_seed + self.__worker_group.worker_index if random_seed is not None and self.__worker_group else random_seed)
+    # Label noise and label smoothing are set from train function so compiled models dont have to change
+    self.__discriminator_label_noise_variable = K.variable(0, dtype="float32", name="discriminator_label_noise")
+    self.__generator_label_smoothing_variable = K.variable(0, dtype="float32", name="generator_label_smoothing")
+    self.__discriminator_optimizer_slots = SharedOptimizerSlots()
+    self.__discriminator_train_steps = None
+
+    # Pool of previously generated images (created by train function)
+    self.__fake_image_pool = None
+    self.__persist_fake_image_pool = False
+    self.__feed_old_perc_amount = 0
+
+    # Monitor of gradient norms computed in training steps (created by train function)
+    self.__gradient_monitor = None
+
+    # Trigger of profiler traces (created by train function)
+    self.__profiler_trigger = None
+
+    # Timing of phases of training steps (reset by train function)
+    self.__step_profiler = StepProfiler()
+
+    # Checkpoints are written on background thread
+    self.__checkpoint_writer = CheckpointWriter() if self.__is_chief else None
+    # State variables of generator optimizer for each model using it (pretrain generator and combined model have their own slots), set by train function
+    self.__generator_optimizer_state = []
+    self.__combined_generator_optimizer_state = []
+
     # Insert empty lists if feature extractor settings are empty
     if feature_extractor_layers is None:
       feature_extractor_layers = []
@@ -99,8 +158,14 @@ class SRGAN:
     # Initialize training data folder and logging
     self.__training_progress_save_path = training_progress_save_path
     self.__training_progress_save_path = os.path.join(self.__training_progress_save_path, f"{self.__gen_mod_name}__{self.__disc_mod_name}__{self.__start_image_shape}_to_{self.__target_image_shape}")
-    self.__tensorboard = TensorBoardCustom(log_dir=os.path.join(self.__training_progress_save_path, "logs"))
-    self.__stat_logger = StatLogger(self.__tensorboard)
+    # Writers exist only on chief (every tensorboard writer creates its own event file in logs folder)
+    self.__tensorboard = TensorBoardCustom(log_dir=os.path.join(self.__training_progress_save_path, "logs")) if self.__is_chief else None
+    self.__stat_logger = StatLogger(self.__tensorboard) if self.__is_chief else None
+    self.__weight_statistics = WeightStatistics(self.__tensorboard) if self.__is_chief else None
+    # Deduplicated store of weight snapshots (configured by train function)
+    self.__weights_store = WeightSnapshotStore(os.path.join(self.__training_progress_save_path, "weights"))
+    # Progress images are composed and written on background thread
+    self.__progress_renderer = ProgressImageRenderer(self.__tensorboard, os.path.join(self.__training_progress_save_path, "progress_images")) if self.__is_chief else None
 
     # Define static vars
     self.kernel_initializer = RandomNormal(stddev=0.02)
@@ -113,11 +178,39 @@ class SRGAN:
           self.__custom_loading_failed = True
           self.__progress_test_images_paths[idx] = random.choice(self.__train_data)
     else:
-      self.__progress_test_images_paths = [random.choice(self.__train_data)]
+      assert num_of_random_test_images >= 1, Fore.RED + "Invalid number of random test images" + Fore.RESET
+      self.__progress_test_images_paths = random.sample(self.__train_data, min(num_of_random_test_images, len(self.__train_data)))
+
+    # Test images decoded and resized once to batch of small (input) images and original images in target shape (RGB, uint8), persisted with checkpoint
+    self.__progress_test_batch = None
+
+    # Load precomputed VGG features of training images
+    # Features are static per image only when geometric augmentation is off
+    self.__feature_cache = None
+    if feature_cache_path and feature_extractor_layers:
+      if dataset_augmentation_settings is not None:
+        print(Fore.YELLOW + "Feature cache cant be used with dataset augmentation, computing features on the fly" + Fore.RESET)
+      else:
+        self.__feature_cache = FeatureCache(feature_cache_path, feature_extractor_layers, feature_cache_float16)
+        if not self.__feature_cache.matches_dataset(self.__train_data): raise Exception("Feature cache doesnt match training dataset, precompute it again")
+
+    # Each worker trains on its own part of dataset
+    if self.__worker_group:
+      self.__train_data = self.__worker_group.shard(self.__train_data)
+
+    # Translation of image indexes from batchmaker to indexes in feature cache
+    if self.__feature_cache:
+      self.__feature_cache_indexes = self.__feature_cache.get_indexes(self.__train_data)
 
     # Create batchmaker and start it
     self.__batch_maker = BatchMaker(self.__train_data, self.__batch_size, buffered_batches=buffered_batches, secondary_size=self.__start_image_shape, num_of_loading_workers=num_of_loading_workers, augmentation_settings=dataset_augmentation_settings)
 
+    # Create process computing VGG features of batches for GAN training ahead of trainer (when features cant be cached)
+    self.__feature_producer = None
+    if use_feature_producer and feature_extractor_layers and self.__feature_cache is None:
+      self.__feature_producer = FeatureProducer(self.__train_data, self.__batch_size, self.__target_image_shape, feature_extractor_layers, secondary_size=self.__start_image_shape,
+                                                buffered_batches=buffered_batches, num_of_loading_workers=num_of_loading_workers, augmentation_settings=dataset_augmentation_settings, num_of_threads=feature_producer_threads)
+
     # Create LR Schedulers for both "Optimizer"
     self.__gen_lr_scheduler = LearningRateScheduler(start_lr=float(K.get_value(generator_optimizer.lr)), lr_decay_factor=generator_lr_decay_factor, lr_decay_interval=generator_lr_decay_interval, min_lr=generator_min_lr)
     self.__disc_lr_scheduler = LearningRateScheduler(start_lr=float(K.get_value(discriminator_optimizer.lr)), lr_decay_factor=discriminator_lr_decay_factor, lr_decay_interval=discriminator_lr_decay_interval, min_lr=discriminator_min_lr)
@@ -160,9 +253,12 @@ class SRGAN:
     # Combine models
     # Train generator to fool discriminator
     self.__combined_generator_model = Model(inputs=small_image_input_generator, outputs=[gen_images, validity] + [*generated_features], name="srgan")
+    # Valid labels are ones or with smoothing uniform in range (0.8, 1.0)
+    valid_labels = 1.0 - self.__generator_label_smoothing_variable * self.__graph_random.uniform((self.__batch_size, 1), 0.0, 0.2)
     self.__combined_generator_model.compile(loss=[gen_loss, disc_loss] + ([feature_loss] * len(generated_features)),
                                             loss_weights=[gen_loss_weight, disc_loss_weight] + feature_loss_weights,
-                                            optimizer=generator_optimizer, metrics={"generator": [PSNR_Y, PSNR, SSIM]})
+                                            optimizer=generator_optimizer, metrics={"generator": [PSNR_Y, PSNR, SSIM]},
+                                            target_tensors=[None, valid_labels] + ([None] * len(generated_features)))
 
     # Print all summaries
     print("\nDiscriminator Summary:")
@@ -170,14 +266,20 @@ class SRGAN:
     print("\nGenerator Summary:")
     self.__generator.summary()
 
-    # Load checkpoint
+    # Load checkpoint (training state is restored by train function after optimizer slots are created)
     self.__initiated = False
+    self.__training_state_path = None
     if load_from_checkpoint: self.__load_checkpoint()
 
     # Load weights from param and override checkpoint weights
     if generator_weights: self.__generator.load_weights(generator_weights)
     if discriminator_weights: self.__discriminator.load_weights(discriminator_weights)
 
+    # Start all workers from state of chief
+    if self.__worker_group:
+      self.__episode_counter = self.__worker_group.broadcast(self.__episode_counter)
+      self.__worker_group.broadcast_models([self.__generator, self.__discriminator])
+
     # Set LR
     self.__gen_lr_scheduler.set_lr(self.__combined_generator_model, self.__episode_counter)
     self.__disc_lr_scheduler.set_lr(self.__discriminator, self.__episode_counter)
@@ -186,6 +288,10 @@ class SRGAN:
   def episode_counter(self):
     return self.__episode_counter
 
+  @property
+  def is_chief(self):
+    return self.__is_chief
+
   # Check if datasets have consistent shapes
   def __validate_dataset(self):
     def check_image(image_path):
@@ -228,58 +334,97 @@ class SRGAN:
 
   def __train_generator(self):
     large_images, small_images = self.__batch_maker.get_batch()
+    self.__step_profiler.lap("data_wait")
     gen_loss, psnr_y, psnr, ssim = self.__generator.train_on_batch(small_images, large_images)
+    self.__step_profiler.lap("generator_update")
     return float(gen_loss), float(psnr), float(psnr_y), float(ssim)
 
-  def __train_discriminator(self, discriminator_smooth_real_labels:bool=False, discriminator_smooth_fake_labels:bool=False):
-    if discriminator_smooth_real_labels:
-      disc_real_labels = np.random.uniform(0.7, 1.2, size=(self.__batch_size, 1))
-    else:
-      disc_real_labels = np.ones(shape=(self.__batch_size, 1))
-
-    if discriminator_smooth_fake_labels:
-      disc_fake_labels = np.random.uniform(0, 0.2, size=(self.__batch_size, 1))
-    else:
-      disc_fake_labels = np.zeros(shape=(self.__batch_size, 1))
+  # Create training models of discriminator with labels generated in graph (all share optimizer state of discriminator)
+  def __create_discriminator_train_steps(self, discriminator_smooth_real_labels:bool=False, discriminator_smooth_fake_labels:bool=False, concat_real_fake:bool=False):
+    disc_real_labels = self.__graph_random.labels((self.__batch_size, 1), 1.0, (0.7, 1.2) if discriminator_smooth_real_labels else None)
+    disc_fake_labels = self.__graph_random.labels((self.__batch_size, 1), 0.0, (0.0, 0.2) if discriminator_smooth_fake_labels else None)
 
     # Adding random noise to discriminator labels
-    if self.__discriminator_label_noise and self.__discriminator_label_noise > 0:
-      disc_real_labels += (np.random.uniform(size=(self.__batch_size, 1)) * (self.__discriminator_label_noise / 2))
-      disc_fake_labels += (np.random.uniform(size=(self.__batch_size, 1)) * (self.__discriminator_label_noise / 2))
+    if self.__discriminator_label_noise is not None:
+      disc_real_labels = self.__graph_random.shift_labels(disc_real_labels, self.__discriminator_label_noise_variable)
+      disc_fake_labels = self.__graph_random.shift_labels(disc_fake_labels, self.__discriminator_label_noise_variable)
+
+    image_input = Input(shape=self.__target_image_shape, name="discriminator_training_image_input")
+    if concat_real_fake:
+      concat_model = Model(image_input, self.__discriminator(image_input), name="discriminator_concat_training_model")
+      concat_model.compile(loss=self.__discriminator.loss, optimizer=self.__discriminator.optimizer, target_tensors=[K.concatenate([disc_real_labels, disc_fake_labels], axis=0)])
+      return [TrainStep(concat_model, self.__batch_size * 2, self.__discriminator_optimizer_slots)]
+
+    real_model = Model(image_input, self.__discriminator(image_input), name="discriminator_real_training_model")
+    real_model.compile(loss=self.__discriminator.loss, optimizer=self.__discriminator.optimizer, target_tensors=[disc_real_labels])
 
+    fake_model = Model(image_input, self.__discriminator(image_input), name="discriminator_fake_training_model")
+    fake_model.compile(loss=self.__discriminator.loss, optimizer=self.__discriminator.optimizer, target_tensors=[disc_fake_labels])
+    return [TrainStep(real_model, self.__batch_size, self.__discriminator_optimizer_slots), TrainStep(fake_model, self.__batch_size, self.__discriminator_optimizer_slots)]
+
+  def __train_discriminator(self):
     large_images, small_images = self.__batch_maker.get_batch()
+    self.__step_profiler.lap("data_wait")
+
+    gen_images = self.__generator.predict(small_images)
+    if self.__fake_image_pool is not None:
+      gen_images = self.__fake_image_pool.replace_random(gen_images, self.__feed_old_perc_amount)
 
-    disc_real_loss = self.__discriminator.train_on_batch(large_images, disc_real_labels)
-    disc_fake_loss = self.__discriminator.train_on_batch(self.__generator.predict(small_images), disc_fake_labels)
+    if len(self.__discriminator_train_steps) == 1:
+      # One update on real and fake images stacked together
+      # Separate real/fake losses are not available in this mode
+      disc_loss = self.__discriminator_train_steps[0]([np.concatenate((large_images, gen_images))], [])
+      self.__step_profiler.lap("discriminator_update")
+      return float(disc_loss), None, None
+
+    disc_real_loss = self.__discriminator_train_steps[0]([large_images], [])
+    disc_fake_loss = self.__discriminator_train_steps[1]([gen_images], [])
+    self.__step_profiler.lap("discriminator_update")
 
     return float((disc_real_loss + disc_fake_loss) * 0.5), float(disc_fake_loss), float(disc_real_loss)
 
-  def __train_gan(self, generator_smooth_labels:bool=False):
-    large_images, small_images = self.__batch_maker.get_batch()
-    if generator_smooth_labels:
-      valid_labels = np.random.uniform(0.8, 1.0, size=(self.__batch_size, 1))
+  def __train_gan(self):
+    # Waiting for feature producer is counted as computation of VGG targets
+    if self.__feature_cache:
+      large_images, small_images, data_indexes = self.__batch_maker.get_batch_with_indexes()
+      self.__step_profiler.lap("data_wait")
+      predicted_features = self.__feature_cache.get_features(self.__feature_cache_indexes[data_indexes])
+    elif self.__feature_producer:
+      large_images, small_images, predicted_features = self.__feature_producer.get_batch()
     else:
-      valid_labels = np.ones(shape=(self.__batch_size, 1))
-    predicted_features = self.__vgg.predict(preprocess_vgg(large_images))
+      large_images, small_images = self.__batch_maker.get_batch()
+      self.__step_profiler.lap("data_wait")
+      predicted_features = self.__vgg.predict(preprocess_vgg(large_images))
+    self.__step_profiler.lap("vgg_targets")
 
-    gan_metrics = self.__combined_generator_model.train_on_batch(small_images, [large_images, valid_labels] + predicted_features)
+    gan_metrics = self.__combined_generator_model.train_on_batch(small_images, [large_images] + predicted_features)
+    self.__step_profiler.lap("generator_update")
 
     return float(gan_metrics[0]), [round(float(x), 5) for x in gan_metrics[1:-3]], float(gan_metrics[-2]), float(gan_metrics[-3]), float(gan_metrics[-1])
 
   def train(self, target_episode:int, pretrain_episodes:Union[int, None]=None, discriminator_training_multiplier:int=1,
             progress_images_save_interval:Union[int, None]=None, save_raw_progress_images:bool=True, weights_save_interval:Union[int, None]=None,
             discriminator_smooth_real_labels:bool=False, discriminator_smooth_fake_labels:bool=False,
-            generator_smooth_labels:bool=False):
+            generator_smooth_labels:bool=False, discriminator_concat_real_fake:bool=False,
+            feed_prev_gen_batch:bool=False, feed_old_perc_amount:float=0.2, fake_image_pool_capacity:Union[int, None]=None, persist_fake_image_pool:bool=False,
+            gradient_monitor_interval:Union[int, None]=100, gradient_norm_limits:tuple=(None, 100), gradient_norm_action:str="log",
+            weights_store_float16:bool=False, weights_store_keyframe_interval:Union[int, None]=10, weights_keep_last:Union[int, None]=None, weights_keep_every_episodes:Union[int, None]=None,
+            progress_tensorboard_scale:float=1.0, stats_aggregate_window:Union[int, None]=None, stats_full_resolution_episodes:int=0,
+            weight_stats_interval:Union[int, None]=None, step_timing_log_interval:Union[int, None]=1_000,
+            profile_trace_episodes:Union[int, None]=10, profile_trace_start_episode:Union[int, None]=None):
 
     # Check arguments and input data
     assert target_episode > 0, Fore.RED + "Invalid number of episodes" + Fore.RESET
     assert discriminator_training_multiplier > 0, Fore.RED + "Invalid discriminator training multiplier" + Fore.RESET
+    # Real and fake steps share discriminator optimizer so with accumulation they have to be one train call per sub step
+    assert self.__gradient_accumulation_steps == 1 or discriminator_concat_real_fake, Fore.RED + "Gradient accumulation needs discriminator_concat_real_fake (separate real and fake steps would split accumulated update of shared optimizer)" + Fore.RESET
     if pretrain_episodes:
       assert pretrain_episodes <= target_episode, Fore.RED + "Pretrain episodes must be <= target episode" + Fore.RESET
     if progress_images_save_interval:
       assert progress_images_save_interval <= target_episode, Fore.RED + "Invalid progress save interval" + Fore.RESET
     if weights_save_interval:
       assert weights_save_interval <= target_episode, Fore.RED + "Invalid weights save interval" + Fore.RESET
+    assert not (self.__worker_group and gradient_norm_action == "halt"), Fore.RED + "Training cant be halted by gradient norm in distributed training" + Fore.RESET
 
     if not os.path.exists(self.__training_progress_save_path): os.makedirs(self.__training_progress_save_path)
 
@@ -294,30 +439,84 @@ class SRGAN:
       self.__save_img(save_raw_progress_images)
       self.save_checkpoint()
 
+    # Gradient norms are computed by training functions so optimizers are watched before they are built (only chief logs them)
+    self.__gradient_monitor = None
+    if gradient_monitor_interval:
+      self.__gradient_monitor = GradientMonitor(self.__tensorboard, gradient_norm_limits, gradient_norm_action)
+      self.__gradient_monitor.watch(self.__combined_generator_model.optimizer, "generator")
+      self.__gradient_monitor.watch(self.__discriminator.optimizer, "discriminator")
+
+    # Labels settings are applied in graph
+    K.set_value(self.__generator_label_smoothing_variable, 1.0 if generator_smooth_labels else 0.0)
+    K.set_value(self.__discriminator_label_noise_variable, self.__discriminator_label_noise / 2 if self.__discriminator_label_noise else 0.0)
+    self.__discriminator_train_steps = self.__create_discriminator_train_steps(discriminator_smooth_real_labels, discriminator_smooth_fake_labels, discriminator_concat_real_fake)
+
+    assert 0 < progress_tensorboard_scale <= 1, Fore.RED + "Invalid tensorboard progress image scale" + Fore.RESET
+    if self.__is_chief:
+      self.__progress_renderer.tensorboard_scale = progress_tensorboard_scale
+
+      # Stats are logged as summaries of aggregate windows after full resolution episodes
+      self.__stat_logger = StatLogger(self.__tensorboard, stats_aggregate_window, stats_full_resolution_episodes)
+
+    # Weights store with retention and encoding settings of this training
+    self.__weights_store = WeightSnapshotStore(os.path.join(self.__training_progress_save_path, "weights"), weights_store_float16, weights_store_keyframe_interval,
+                                               keep_last=weights_keep_last, keep_every_episodes=weights_keep_every_episodes)
+
+    # Pool of previously generated images used for replacing part of new generated images
+    self.__fake_image_pool = None
+    self.__persist_fake_image_pool = persist_fake_image_pool
+    self.__feed_old_perc_amount = feed_old_perc_amount
+    if feed_prev_gen_batch:
+      self.__fake_image_pool = ImagePool(fake_image_pool_capacity if fake_image_pool_capacity else 3 * self.__batch_size, self.__target_image_shape)
+      if persist_fake_image_pool: self.__fake_image_pool.load(os.path.join(self.__training_progress_save_path, "checkpoint", "fake_image_pool.npy"))
+
+    # Train functions of generator are built ahead so their optimizer slots can be saved and restored
+    if pretrain_episodes and self.__episode_counter < pretrain_episodes:
+      self.__generator._make_train_function()
+      self.__generator_optimizer_state = optimizer_state_variables(self.__generator.optimizer)
+    self.__combined_generator_model._make_train_function()
+    self.__combined_generator_optimizer_state = optimizer_state_variables(self.__combined_generator_model.optimizer)
+
+    # Optimizer slots and random generator streams exist only after all training functions are built
+    if self.__training_state_path is not None:
+      restored_state = CheckpointWriter.restore_variables(self.__training_state_path, self.__training_state_variables())
+      if restored_state: print(Fore.BLUE + f"Restored training state from checkpoint: {', '.join(restored_state)}" + Fore.RESET)
+      self.__training_state_path = None
+
     print(Fore.GREEN + f"Starting training on episode {self.__episode_counter} for {target_episode} episode" + Fore.RESET)
     print(Fore.MAGENTA + "Preview training stats in tensorboard: http://localhost:6006" + Fore.RESET)
+    self.__step_profiler = StepProfiler()
+
+    # Profiler trace of next episodes can be requested during training by creating file profile_trace in training folder or by SIGUSR1 signal
+    self.__profiler_trigger = ProfilerTrigger(os.path.join(self.__training_progress_save_path, "logs"), os.path.join(self.__training_progress_save_path, "profile_trace"), profile_trace_episodes, profile_trace_start_episode) if profile_trace_episodes and self.__is_chief else None
     for _ in range(episodes_to_go):
       ep_start = time.time()
+      self.__step_profiler.start_step()
+      if self.__profiler_trigger is not None: self.__profiler_trigger.update(self.__episode_counter)
 
       ### Train Discriminator ###
       # Train discriminator (real as ones and fake as zeros)
-      disc_stats = deque(maxlen=discriminator_training_multiplier)
-
-      for _ in range(discriminator_training_multiplier):
-        disc_loss, real_loss, fake_loss = self.__train_discriminator(discriminator_smooth_real_labels, discriminator_smooth_fake_labels)
-        disc_stats.append([disc_loss, real_loss, fake_loss])
+      # With gradient accumulation every discriminator training is made of multiple sub steps applied as one update of optimizer
+      disc_train_stats = [self.__train_discriminator() for _ in range(discriminator_training_multiplier * self.__gradient_accumulation_steps)]
 
-      # Calculate mean of losses of discriminator from all trainings and calculate disc loss
-      disc_stats = np.mean(disc_stats, 0)
+      # Calculate mean of losses of discriminator from all trainings (real and fake losses are logged only when they are trained separately)
+      disc_stats = {"disc_loss": float(np.mean([stats[0] for stats in disc_train_stats]))}
+      if not discriminator_concat_real_fake:
+        disc_stats["disc_real_loss"] = float(np.mean([stats[2] for stats in disc_train_stats]))
+        disc_stats["disc_fake_loss"] = float(np.mean([stats[1] for stats in disc_train_stats]))
 
-      if pretrain_episodes and self.__episode_counter < pretrain_episodes:
+      pretraining = pretrain_episodes and self.__episode_counter < pretrain_episodes
+      if pretraining:
         ### Pretrain Generator ###
-        gen_loss, psnr, psnr_y, ssim = self.__train_generator()
+        gen_stats = [self.__train_generator() for _ in range(self.__gradient_accumulation_steps)]
+        gen_loss, psnr, psnr_y, ssim = [float(x) for x in np.mean(gen_stats, 0)]
         partial_gan_losses = None
       else:
         ### Train GAN ###
         # Train GAN (wants discriminator to recognize fake images as valid)
-        gen_loss, partial_gan_losses, psnr, psnr_y, ssim = self.__train_gan(generator_smooth_labels)
+        gan_stats = [self.__train_gan() for _ in range(self.__gradient_accumulation_steps)]
+        gen_loss, psnr, psnr_y, ssim = [float(x) for x in np.mean([[stats[0], stats[2], stats[3], stats[4]] for stats in gan_stats], 0)]
+        partial_gan_losses = [round(float(x), 5) for x in np.mean([stats[1] for stats in gan_stats], 0)]
 
       # Set LR based on episode count and schedule
       # new_gen_lr = self.gen_lr_scheduler.set_lr(self.generator)
@@ -325,34 +524,54 @@ class SRGAN:
         print(Fore.MAGENTA + f"New LR for generator is {self.__gen_lr_scheduler.current_lr}" + Fore.RESET)
       if self.__disc_lr_scheduler.set_lr(self.__discriminator, self.__episode_counter):
         print(Fore.MAGENTA + f"New LR for discriminator is {self.__disc_lr_scheduler.current_lr}" + Fore.RESET)
+      self.__step_profiler.lap("scheduling")
 
       # Append stats to stat logger
-      self.__stat_logger.append_stats(self.__episode_counter, disc_loss=disc_stats[0], disc_real_loss=disc_stats[2], disc_fake_loss=disc_stats[1], gen_loss=gen_loss, psnr=psnr, psnr_y=psnr_y, ssim=ssim, disc_label_noise=self.__discriminator_label_noise if self.__discriminator_label_noise else 0, gen_lr=self.__gen_lr_scheduler.current_lr, disc_lr=self.__disc_lr_scheduler.current_lr)
+      if self.__is_chief: self.__stat_logger.append_stats(self.__episode_counter, **disc_stats, gen_loss=gen_loss, psnr=psnr, psnr_y=psnr_y, ssim=ssim, disc_label_noise=self.__discriminator_label_noise if self.__discriminator_label_noise else 0, gen_lr=self.__gen_lr_scheduler.current_lr, disc_lr=self.__disc_lr_scheduler.current_lr)
 
       self.__episode_counter += 1
-      self.__tensorboard.step = self.__episode_counter
+      if self.__is_chief: self.__tensorboard.step = self.__episode_counter
+      self.__step_profiler.lap("logging")
+
+      # Average weights between workers
+      if self.__worker_group and self.__episode_counter % self.__worker_group.sync_interval == 0:
+        # Generator optimizer is shared by pretrain and combined train function, only slots of the one in use are averaged
+        self.__worker_group.average_models([self.__generator, self.__discriminator], [self.__discriminator.optimizer],
+                                           self.__generator_optimizer_state if pretraining else self.__combined_generator_optimizer_state)
+      self.__step_profiler.lap("worker_sync")
 
       # Save stats and print them to console
       if self.__episode_counter % self.SHOW_STATS_INTERVAL == 0:
-        print(Fore.GREEN + f"{self.__episode_counter}/{target_episode}, Remaining: {(time_to_format(mean(epochs_time_history) * (target_episode - self.__episode_counter))) if epochs_time_history else 'Unable to calculate'}\t\tDiscriminator: [loss: {round(disc_stats[0], 5)}, real_loss: {round(float(disc_stats[2]), 5)}, fake_loss: {round(float(disc_stats[1]), 5)}, label_noise: {round(self.__discriminator_label_noise * 100, 2) if self.__discriminator_label_noise else 0}%] Generator: [loss: {round(gen_loss, 5)}, partial_losses: {partial_gan_losses}, psnr: {round(psnr, 3)}dB, psnr_y: {round(psnr_y, 3)}dB, ssim: {round(ssim, 5)}]\n"
+        disc_losses = ", ".join(f"{name[len('disc_'):]}: {round(value, 5)}" for name, value in disc_stats.items())
+        print(Fore.GREEN + f"{self.__episode_counter}/{target_episode}, Remaining: {(time_to_format(mean(epochs_time_history) * (target_episode - self.__episode_counter))) if epochs_time_history else 'Unable to calculate'}\t\tDiscriminator: [{disc_losses}, label_noise: {round(self.__discriminator_label_noise * 100, 2) if self.__discriminator_label_noise else 0}%] Generator: [loss: {round(gen_loss, 5)}, partial_losses: {partial_gan_losses}, psnr: {round(psnr, 3)}dB, psnr_y: {round(psnr_y, 3)}dB, ssim: {round(ssim, 5)}]\n"
                            f"Generator LR: {self.__gen_lr_scheduler.current_lr}, Discriminator LR: {self.__disc_lr_scheduler.current_lr}" + Fore.RESET)
+      self.__step_profiler.lap("logging")
 
       # Decay label noise
       if self.__discriminator_label_noise and self.__discriminator_label_noise_decay:
         self.__discriminator_label_noise = max([self.__discriminator_label_noise_min, (self.__discriminator_label_noise * self.__discriminator_label_noise_decay)])
+        K.set_value(self.__discriminator_label_noise_variable, self.__discriminator_label_noise / 2)
+      self.__step_profiler.lap("scheduling")
+
+      # Statistics of weights are computed and written on background thread
+      if weight_stats_interval is not None and self.__is_chief and self.__episode_counter % weight_stats_interval == 0:
+        self.__weight_statistics.log({"generator": self.__generator, "discriminator": self.__discriminator}, self.__episode_counter)
+      self.__step_profiler.lap("logging")
 
       # Save progress
       if progress_images_save_interval is not None and self.__episode_counter % progress_images_save_interval == 0:
         self.__save_img(save_raw_progress_images)
+      self.__step_profiler.lap("progress_images")
 
       # Save weights of models
       if weights_save_interval is not None and self.__episode_counter % weights_save_interval == 0:
         self.__save_weights()
 
       # Save checkpoint
-      if self.__episode_counter % self.CHECKPOINT_SAVE_INTERVAL == 0:
+      if self.__episode_counter % self.CHECKPOINT_SAVE_INTERVAL == 0 and self.__is_chief:
         self.save_checkpoint()
         print(Fore.BLUE + "Checkpoint created" + Fore.RESET)
+      self.__step_profiler.lap("checkpointing")
 
       # Reset seeds
       if self.__episode_counter % self.RESET_SEEDS_INTERVAL == 0:
@@ -361,62 +580,107 @@ class SRGAN:
 
       epochs_time_history.append(time.time() - ep_start)
 
+      # Rolling percentiles of phase timings
+      self.__step_profiler.end_step()
+      if step_timing_log_interval is not None and self.__is_chief and self.__episode_counter % step_timing_log_interval == 0:
+        self.__step_profiler.log(self.__tensorboard, self.__episode_counter)
+
+      # Gradient norms are read and checked on background thread, requested actions are handled after next episodes
+      if self.__gradient_monitor is not None:
+        if self.__episode_counter % gradient_monitor_interval == 0:
+          self.__gradient_monitor.check(self.__episode_counter)
+
+        if self.__gradient_monitor.checkpoint_requested:
+          self.__gradient_monitor.checkpoint_requested = False
+          self.save_checkpoint()
+          if self.__is_chief: print(Fore.BLUE + "Checkpoint created because of gradient norm" + Fore.RESET)
+
+        if self.__gradient_monitor.halt_requested:
+          print(Fore.RED + f"Halting training on episode {self.__episode_counter} because of gradient norm" + Fore.RESET)
+          break
+
     # Shutdown helper threads
     print(Fore.GREEN + "Training Complete - Waiting for other threads to finish" + Fore.RESET)
-    self.__stat_logger.terminate()
+    if self.__profiler_trigger is not None: self.__profiler_trigger.close(self.__episode_counter)
     self.__batch_maker.terminate()
+    if self.__gradient_monitor is not None: self.__gradient_monitor.terminate()
+    if self.__feature_producer: self.__feature_producer.terminate()
     self.save_checkpoint()
     self.__save_weights()
     self.__batch_maker.join()
-    self.__stat_logger.join()
+    if self.__feature_producer: self.__feature_producer.join()
+    if self.__worker_group: self.__worker_group.close()
+    if self.__gradient_monitor is not None: self.__gradient_monitor.join()
+    if self.__is_chief:
+      self.__progress_renderer.flush()
+      self.__weight_statistics.flush()
+      self.__stat_logger.flush()
+    self.flush_checkpoint()
+    if self.__is_chief: self.__step_profiler.save(os.path.join(self.__training_progress_save_path, "step_timing.json"))
     print(Fore.GREEN + "All threads finished" + Fore.RESET)
 
-  def __save_img(self, save_raw_progress_images:bool=True, tensorflow_description:str="progress"):
-    if not os.path.exists(self.__training_progress_save_path + "/progress_images"): os.makedirs(self.__training_progress_save_path + "/progress_images")
-
-    final_image = np.zeros(shape=(self.__target_image_shape[0] * len(self.__progress_test_images_paths), self.__target_image_shape[1] * 3, self.__target_image_shape[2])).astype(np.float32)
-
+  # Load test images to cached batch, missing images are replaced by random training images
+  def __build_progress_test_batch(self):
+    small_images = []
+    original_images = []
     for idx, test_image_path in enumerate(self.__progress_test_images_paths):
       if not os.path.exists(test_image_path):
         print(Fore.YELLOW + f"Failed to locate test image: {test_image_path}, replacing it with new one!" + Fore.RESET)
         self.__progress_test_images_paths[idx] = random.choice(self.__train_data)
-        self.save_checkpoint()
+        test_image_path = self.__progress_test_images_paths[idx]
 
       # Load image for upscale and resize it to starting (small) image size
       original_unscaled_image = cv.imread(test_image_path)
-      # print(f"[DEBUG] {original_unscaled_image.shape}, {self.target_image_shape}")
       if original_unscaled_image.shape != self.__target_image_shape:
-        original_image = cv.resize(original_unscaled_image, dsize=(self.__start_image_shape[1], self.__start_image_shape[0]), interpolation=(cv.INTER_AREA if (original_unscaled_image.shape[0] > self.__start_image_shape[0] and original_unscaled_image.shape[1] > self.__start_image_shape[1]) else cv.INTER_CUBIC))
+        original_image = cv.resize(original_unscaled_image, dsize=(self.__target_image_shape[1], self.__target_image_shape[0]), interpolation=(cv.INTER_AREA if (original_unscaled_image.shape[0] > self.__target_image_shape[0] and original_unscaled_image.shape[1] > self.__target_image_shape[1]) else cv.INTER_CUBIC))
       else:
         original_image = original_unscaled_image
       small_image = cv.resize(original_image, dsize=(self.__start_image_shape[1], self.__start_image_shape[0]), interpolation=(cv.INTER_AREA if (original_image.shape[0] > self.__start_image_shape[0] and original_image.shape[1] > self.__start_image_shape[1]) else cv.INTER_CUBIC))
 
-      # Conver image to RGB colors and upscale it
-      gen_img = self.__generator.predict(np.array([cv.cvtColor(small_image, cv.COLOR_BGR2RGB) / 127.5 - 1.0]))[0]
+      small_images.append(cv.cvtColor(small_image, cv.COLOR_BGR2RGB))
+      original_images.append(cv.cvtColor(original_image, cv.COLOR_BGR2RGB))
+
+    self.__progress_test_batch = (np.array(small_images, dtype=np.uint8), np.array(original_images, dtype=np.uint8))
 
-      # Rescale images 0 to 255
-      gen_img = (0.5 * gen_img + 0.5) * 255
-      gen_img = cv.cvtColor(gen_img, cv.COLOR_RGB2BGR)
+  # Load cached test batch saved with checkpoint (only when it has expected number and shapes of images)
+  def __load_progress_test_batch(self, checkpoint_base_path:str):
+    small_images_path = os.path.join(checkpoint_base_path, "progress_test_small_images.npy")
+    original_images_path = os.path.join(checkpoint_base_path, "progress_test_original_images.npy")
+    if not os.path.exists(small_images_path) or not os.path.exists(original_images_path): return
+
+    small_images = np.load(small_images_path)
+    original_images = np.load(original_images_path)
+    if small_images.shape != (len(self.__progress_test_images_paths), *self.__start_image_shape) or original_images.shape != (len(self.__progress_test_images_paths), *self.__target_image_shape):
+      print(Fore.YELLOW + "Saved progress test images dont match current training setup, loading them again" + Fore.RESET)
+      return
+    self.__progress_test_batch = (small_images, original_images)
+
+  def __save_img(self, save_raw_progress_images:bool=True, tensorflow_description:str="progress"):
+    if not self.__is_chief: return
+    if self.__progress_test_batch is None: self.__build_progress_test_batch()
 
-      # Place side by side image resized by opencv, original (large) image and upscaled by gan
-      final_image[idx * gen_img.shape[1]:(idx + 1) * gen_img.shape[1], 0:gen_img.shape[0], :] = cv.resize(small_image, dsize=(self.__target_image_shape[1], self.__target_image_shape[0]), interpolation=(cv.INTER_AREA if (small_image.shape[0] > self.__target_image_shape[0] and small_image.shape[1] > self.__target_image_shape[1]) else cv.INTER_CUBIC))
-      final_image[idx * gen_img.shape[1]:(idx + 1) * gen_img.shape[1], gen_img.shape[0]:gen_img.shape[0] * 2, :] = original_image
-      final_image[idx * gen_img.shape[1]:(idx + 1) * gen_img.shape[1], gen_img.shape[0] * 2:gen_img.shape[0] * 3, :] = gen_img
+    # Whole test batch is upscaled in one forward pass and rescaled to 0 to 255 range
+    small_images, original_images = self.__progress_test_batch
+    gen_imgs = (0.5 * self.__generator.predict(small_images.astype(np.float32) / 127.5 - 1.0, batch_size=small_images.shape[0]) + 0.5) * 255
 
-    # Save image to folder and to tensorboard
-    if save_raw_progress_images:
-      cv.imwrite(f"{self.__training_progress_save_path}/progress_images/{self.__episode_counter}.png", final_image)
-    self.__tensorboard.write_image(np.reshape(cv.cvtColor(final_image, cv.COLOR_BGR2RGB) / 255, (-1, final_image.shape[0], final_image.shape[1], final_image.shape[2])).astype(np.float32), description=tensorflow_description)
+    # Renderer places side by side image resized by opencv, original (large) image and upscaled by gan
+    target_image_shape = self.__target_image_shape
+    def compose():
+      return np.concatenate([np.concatenate([cv.resize(small_image, dsize=(target_image_shape[1], target_image_shape[0]), interpolation=cv.INTER_CUBIC).astype(np.float32),
+                                             original_image.astype(np.float32), gen_img.astype(np.float32)], axis=1) for small_image, original_image, gen_img in zip(small_images, original_images, gen_imgs)], axis=0)
+
+    self.__progress_renderer.render(self.__episode_counter, compose, save_raw_progress_images, tensorflow_description)
 
   # Save weights of generator and discriminator model
   def __save_weights(self):
-    save_dir = self.__training_progress_save_path + "/weights/" + str(self.__episode_counter)
-    if not os.path.exists(save_dir): os.makedirs(save_dir)
-    self.__generator.save_weights(f"{save_dir}/generator_{self.__gen_mod_name}.h5")
-    self.__discriminator.save_weights(f"{save_dir}/discriminator_{self.__disc_mod_name}.h5")
+    if not self.__is_chief: return
+    self.__weights_store.save(self.__episode_counter, {"generator": self.__generator, "discriminator": self.__discriminator}, self.__checkpoint_writer)
 
-  # Load weights to models from given episode
+  # Load weights to models from given episode (snapshots from weights store, h5 files of older trainings as fallback)
   def load_gen_weights_from_episode(self, episode:int):
+    self.flush_checkpoint()
+    if self.__weights_store.load(episode, "generator", self.__generator): return
+
     weights_dir = self.__training_progress_save_path + "/weights/" + str(episode)
     if not os.path.exists(weights_dir): return
 
@@ -425,6 +689,9 @@ class SRGAN:
       self.__generator.load_weights(gen_weights_path)
 
   def load_disc_weights_from_episode(self, episode:int):
+    self.flush_checkpoint()
+    if self.__weights_store.load(episode, "discriminator", self.__discriminator): return
+
     weights_dir = self.__training_progress_save_path + "/weights/" + str(episode)
     if not os.path.exists(weights_dir): return
 
@@ -470,51 +737,60 @@ class SRGAN:
         if "disc_label_noise" in data.keys():
           self.__discriminator_label_noise = float(data["disc_label_noise"])
 
+        if "state_path" in data.keys(): self.__training_state_path = data["state_path"]
+
         if not self.__custom_test_images or self.__custom_loading_failed:
           self.__progress_test_images_paths = data["test_image"]
+
+        # Cached test batch is used only when it was made from current test images
+        if data.get("test_image") == self.__progress_test_images_paths: self.__load_progress_test_batch(checkpoint_base_path)
         self.__initiated = True
 
   # Save progress of training
   def save_checkpoint(self):
+    if not self.__is_chief: return
     checkpoint_base_path = os.path.join(self.__training_progress_save_path, "checkpoint")
     if not os.path.exists(checkpoint_base_path): os.makedirs(checkpoint_base_path)
 
     gen_path = f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5"
     disc_path = f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5"
-
-    if os.path.exists(f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5.lock")
-    if os.path.exists(f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5.lock")
-
-    if os.path.exists(gen_path): os.rename(gen_path, f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5.lock")
-    if os.path.exists(disc_path): os.rename(disc_path, f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5.lock")
-
-    self.__generator.save_weights(gen_path)
-    self.__discriminator.save_weights(disc_path)
-
-    if os.path.exists(f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/generator_{self.__gen_mod_name}.h5.lock")
-    if os.path.exists(f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/discriminator_{self.__disc_mod_name}.h5.lock")
+    state_path = f"{checkpoint_base_path}/training_state.h5"
 
     data = {
       "episode": self.__episode_counter,
       "gen_path": gen_path,
       "disc_path": disc_path,
+      "state_path": state_path,
       "disc_label_noise": self.__discriminator_label_noise,
       "test_image": self.__progress_test_images_paths,
     }
 
-    with open(os.path.join(checkpoint_base_path, "checkpoint_data.json"), "w", encoding='utf-8') as f:
-      json.dump(data, f)
-
-  def make_progress_gif(self, frame_duration:int=16):
-    if not os.path.exists(self.__training_progress_save_path): os.makedirs(self.__training_progress_save_path)
-    if not os.path.exists(self.__training_progress_save_path + "/progress_images"): return
-
-    frames = []
-    img_file_names = os.listdir(self.__training_progress_save_path + "/progress_images")
+    # Weights are snapshotted now and written on background thread (flush_checkpoint waits for them)
+    arrays = {f"{checkpoint_base_path}/fake_image_pool.npy": self.__fake_image_pool.get_images()} if self.__fake_image_pool is not None and self.__persist_fake_image_pool else {}
+    if self.__progress_test_batch is not None:
+      arrays[f"{checkpoint_base_path}/progress_test_small_images.npy"] = self.__progress_test_batch[0]
+      arrays[f"{checkpoint_base_path}/progress_test_original_images.npy"] = self.__progress_test_batch[1]
+    self.__checkpoint_writer.save(models={gen_path: self.__generator, disc_path: self.__discriminator}, arrays=arrays,
+                                  variables={state_path: self.__training_state_variables()},
+                                  json_data={os.path.join(checkpoint_base_path, "checkpoint_data.json"): data})
+
+  # Named groups of variables saved as training state (optimizer slots, label noise and positions of random generator streams)
+  def __training_state_variables(self) -> dict:
+    return {
+      "generator_optimizer": self.__generator_optimizer_state,
+      "combined_generator_model_optimizer": self.__combined_generator_optimizer_state,
+      "discriminator_optimizer": optimizer_state_variables(self.__discriminator.optimizer),
+      "discriminator_label_noise": [self.__discriminator_label_noise_variable],
+      "graph_random_counters": self.__graph_random.counters
+    }
 
-    for im_file in img_file_names:
-      if os.path.isfile(self.__training_progress_save_path + "/progress_images/" + im_file):
-        frames.append(Image.open(self.__training_progress_save_path + "/progress_images/" + im_file))
+  # Wait until all requested checkpoints are written to disk
+  def flush_checkpoint(self):
+    if self.__checkpoint_writer is not None: self.__checkpoint_writer.flush()
 
-    if len(frames) > 2:
-      frames[0].save(f"{self.__training_progress_save_path}/progress_gif.gif", format="GIF", append_images=frames[1:], save_all=True, optimize=False, duration=frame_duration, loop=0)
\ No newline at end of file
+  # Encode progress images to gif or mp4 ordered by episode (frames are streamed so memory usage doesnt grow with number of frames)
+  def make_progress_video(self, frame_duration:int=16, video_format:str="gif", frame_stride:int=1, scale:float=1.0):
+    assert video_format in PROGRESS_VIDEO_FORMATS, Fore.RED + f"Invalid progress video format, avaible formats: {PROGRESS_VIDEO_FORMATS}" + Fore.RESET
+    if not self.__is_chief: return
+    self.__progress_renderer.flush()
+    make_progress_video(os.path.join(self.__training_progress_save_path, "progress_images"), os.path.join(self.__training_progress_save_path, f"progress_video.{video_format}"), frame_duration, frame_stride, scale)
@@ -8,7 +8,6 @@ from keras.initializers import RandomNormal
 from keras.utils import plot_model
 from keras.layers import Layer
 import keras.backend as K
-from PIL import Image
 from cv2 import cv2 as cv
 import random
 import time
@@ -21,20 +20,35 @@ import imagesize
 from multiprocessing.pool import ThreadPool
 
 from ..utils.batch_maker import BatchMaker
+from ..utils.image_pool import ImagePool
+from ..utils.checkpoint_writer import CheckpointWriter, optimizer_state_variables
+from ..utils.weight_store import WeightSnapshotStore
+from ..utils.stat_logger import StatLogger
+from ..utils.step_profiler import StepProfiler
+from ..utils.progress_renderer import ProgressImageRenderer, make_image_grid
+from ..utils.progress_video import PROGRESS_VIDEO_FORMATS, make_progress_video
 from ..models import discriminator_models_spreadsheet, generator_models_spreadsheet
 from ..keras_extensions.custom_tensorboard import TensorBoardCustom
-from ..utils.helpers import time_to_format, get_paths_of_files_from_path
+from ..keras_extensions.weight_statistics import WeightStatistics
+from ..keras_extensions.profiler_trigger import ProfilerTrigger
+from ..utils.helpers import time_to_format, get_paths_of_files_from_path, interval_crossed
 from ..keras_extensions.custom_losses import wasserstein_loss, gradient_penalty_loss
+from ..utils.distributed import WorkerGroup
+from ..keras_extensions.mixed_precision import enable_mixed_precision, add_loss_scaling
+from ..keras_extensions.train_step import TrainStep, SharedOptimizerSlots
+from ..keras_extensions.graph_random import GraphRandom
+from ..keras_extensions.wgan_gp_train_step import WGANGPTrainStep
+from ..keras_extensions.gradient_monitor import GradientMonitor
 
 # Weighted average function
 class RandomWeightedAverage(Layer):
-  def __init__(self, batch_size:int):
+  def __init__(self, graph_random:GraphRandom):
     super().__init__()
-    self.batch_size = batch_size
+    self.graph_random = graph_random
 
   # Provides a (random) weighted average between real and generated image samples
   def call(self, inputs, **kwargs):
-    weights = K.random_uniform((self.batch_size, 1, 1, 1))
+    weights = self.graph_random.uniform((K.shape(inputs[0])[0], 1, 1, 1))
     return (weights * inputs[0]) + ((1 - weights) * inputs[1])
 
   def compute_output_shape(self, input_shape):
@@ -49,12 +63,18 @@ class WGANGC:
                gen_mod_name:str, critic_mod_name:str,
                latent_dim:int,
                training_progress_save_path:str,
-               generator_optimizer:Optimizer=RMSprop(0.00005), critic_optimizer:Optimizer=RMSprop(0.00005),
+               generator_optimizer:Optimizer=RMSprop(0.00005), critic_optimizer:Optimizer=RMSprop(0.00005), mixed_precision:Union[str, None]=None,
                batch_size:int=32, buffered_batches:int=20,
                generator_weights:Union[str, None]=None, critic_weights:Union[str, None]=None,
                critic_gradient_penalty_weight:float=10,
                start_episode:int=0, load_from_checkpoint:bool=False,
-               check_dataset:bool=True, num_of_loading_workers:int=8):
+               check_dataset:bool=True, num_of_loading_workers:int=8,
+               worker_group:Union[WorkerGroup, None]=None, gradient_accumulation_steps:int=1, random_seed:Union[int, None]=None):
+
+    # Enable mixed precision before models are created, float16 needs loss scaling to not underflow gradients
+    if enable_mixed_precision(mixed_precision) and mixed_precision == "float16":
+      add_loss_scaling(generator_optimizer)
+      add_loss_scaling(critic_optimizer)
 
     self.critic_mod_name = critic_mod_name
     self.gen_mod_name = gen_mod_name
@@ -64,15 +84,57 @@ class WGANGC:
     self.batch_size = batch_size
     assert self.batch_size > 0, Fore.RED + "Invalid batch size" + Fore.RESET
 
+    self.critic_gradient_penalty_weight = critic_gradient_penalty_weight
+
+    # Latent noise and interpolation weights are generated in graph by seeded random generator (each worker has its own stream)
+    self.graph_random = GraphRandom(random_seed + worker_group.worker_index if random_seed is not None and worker_group else random_seed)
+
+    # Optimizer states shared by all train functions of models
+    self.generator_optimizer_slots = SharedOptimizerSlots()
+    self.critic_optimizer_slots = SharedOptimizerSlots()
+
+    # Pool of previously generated images (created by train function)
+    self.fake_image_pool = None
+    self.persist_fake_image_pool = False
+
+    # Monitor of gradient norms computed in training steps (created by train function)
+    self.gradient_monitor = None
+
+    # Trigger of profiler traces (created by train function)
+    self.profiler_trigger = None
+
+    # Timing of phases of training steps (created by train function)
+    self.step_profiler = None
+
+    # Number of batches whose gradients are accumulated to one update (one episode), optimizers must accumulate for same number of steps
+    self.gradient_accumulation_steps = gradient_accumulation_steps
+    assert self.gradient_accumulation_steps >= 1, Fore.RED + "Invalid number of gradient accumulation steps" + Fore.RESET
+    for optimizer in [generator_optimizer, critic_optimizer]:
+      assert getattr(optimizer, "accumulation_steps", 1) == self.gradient_accumulation_steps, Fore.RED + "Optimizers must accumulate gradients for same number of steps as trainer (use KerasAdamAccumulated or KerasRMSpropAccumulated)" + Fore.RESET
+
     self.progress_image_dim = (16, 9)
 
     if start_episode < 0: start_episode = 0
     self.episode_counter = start_episode
 
+    # Only chief worker writes logs, progress images and checkpoints
+    self.worker_group = worker_group
+    self.is_chief = self.worker_group is None or self.worker_group.is_chief
+
+    # Checkpoints are written on background thread
+    self.checkpoint_writer = CheckpointWriter() if self.is_chief else None
+
     # Initialize training data folder and logging
     self.training_progress_save_path = training_progress_save_path
     self.training_progress_save_path = os.path.join(self.training_progress_save_path, f"{self.gen_mod_name}__{self.critic_mod_name}__{self.latent_dim}")
-    self.tensorboard = TensorBoardCustom(log_dir=os.path.join(self.training_progress_save_path, "logs"))
+    # Writers exist only on chief (every tensorboard writer creates its own event file in logs folder)
+    self.tensorboard = TensorBoardCustom(log_dir=os.path.join(self.training_progress_save_path, "logs")) if self.is_chief else None
+    self.stat_logger = StatLogger(self.tensorboard) if self.is_chief else None
+    self.weight_statistics = WeightStatistics(self.tensorboard) if self.is_chief else None
+    # Deduplicated store of weight snapshots (configured by train function)
+    self.weights_store = WeightSnapshotStore(os.path.join(self.training_progress_save_path, "weights"))
+    # Progress images are composed and written on background thread
+    self.progress_renderer = ProgressImageRenderer(self.tensorboard, os.path.join(self.training_progress_save_path, "progress_images")) if self.is_chief else None
 
     # Create array of input image paths
     self.train_data = get_paths_of_files_from_path(dataset_path, only_files=True)
@@ -112,7 +174,7 @@ class WGANGC:
     ### Create combined generator ###
     #################################
     # Create model inputs
-    gen_latent_input = Input(shape=(self.latent_dim,), name="combined_generator_latent_input")
+    gen_latent_input = Input(tensor=self.graph_random.normal((self.batch_size, self.latent_dim)), name="combined_generator_latent_input")
 
     # Create frozen version of critic
     self.critic.trainable = False
@@ -126,14 +188,14 @@ class WGANGC:
     self.combined_generator_model = Model(inputs=[gen_latent_input],
                                           outputs=[critic_gen_output],
                                           name="combined_generator_model")
-    self.combined_generator_model.compile(optimizer=generator_optimizer, loss=wasserstein_loss)
+    self.combined_generator_model.compile(optimizer=generator_optimizer, loss=wasserstein_loss, target_tensors=[K.constant(-1, shape=(self.batch_size, 1))])
 
     ##############################
     ### Create combined critic ###
     ##############################
     # Create model inputs
     real_image_input = Input(shape=self.image_shape, name="combined_critic_real_image_input")
-    critic_latent_input = Input(shape=(self.latent_dim,), name="combined_critic_latent_input")
+    critic_latent_input = Input(tensor=self.graph_random.normal((self.batch_size, self.latent_dim)), name="combined_critic_latent_input")
 
     # Create frozen version of generator
     self.critic.trainable = True
@@ -152,7 +214,7 @@ class WGANGC:
     valid_out = self.critic(real_image_input)
 
     # Create weighted input to critic for gradient penalty loss
-    averaged_samples = RandomWeightedAverage(self.batch_size)(inputs=[real_image_input, generated_images_for_critic])
+    averaged_samples = RandomWeightedAverage(self.graph_random)(inputs=[real_image_input, generated_images_for_critic])
     validity_interpolated = self.critic(averaged_samples)
 
     # Create partial gradient penalty loss function
@@ -168,7 +230,8 @@ class WGANGC:
                                        loss=[wasserstein_loss,
                                              wasserstein_loss,
                                              partial_gp_loss],
-                                       loss_weights=[1, 1, critic_gradient_penalty_weight])
+                                       loss_weights=[1, 1, critic_gradient_penalty_weight],
+                                       target_tensors=[K.constant(-1, shape=(self.batch_size, 1)), K.constant(1, shape=(self.batch_size, 1)), K.constant(0, shape=(self.batch_size, 1))])
 
     # Summary of combined models
     print("\nGenerator Summary:")
@@ -176,21 +239,47 @@ class WGANGC:
     print("\nCritic Summary:")
     self.critic.summary()
 
-    # Load checkpoint
+    # Load checkpoint (training state is restored by train function after optimizer slots are created)
     self.initiated = False
+    self.__training_state_path = None
     if load_from_checkpoint: self.load_checkpoint()
 
     # Load weights and override checkpoint loaded weights
     if critic_weights: self.critic.load_weights(critic_weights)
     if generator_weights: self.generator.load_weights(generator_weights)
 
+    # Start all workers from state of chief
+    if self.worker_group:
+      self.episode_counter = self.worker_group.broadcast(self.episode_counter)
+      self.worker_group.broadcast_models([self.generator, self.critic])
+
+      # Each worker trains on its own part of dataset
+      self.train_data = self.worker_group.shard(self.train_data)
+
     # Create batchmaker and start it
     self.batch_maker = BatchMaker(self.train_data, self.batch_size, buffered_batches=buffered_batches, num_of_loading_workers=num_of_loading_workers)
 
-    # Create some proprietary objects
-    self.fake_labels = np.ones((self.batch_size, 1), dtype=np.float32)
-    self.valid_labels = -np.ones((self.batch_size, 1), dtype=np.float32)
-    self.gradient_labels = np.zeros((self.batch_size, 1), dtype=np.float32)
+  # Create version of combined critic that takes fake images as input instead of generating them (shares optimizer state with combined critic)
+  def __build_pooled_critic_model(self):
+    real_image_input = Input(shape=self.image_shape, name="pooled_critic_real_image_input")
+    fake_image_input = Input(shape=self.image_shape, name="pooled_critic_fake_image_input")
+
+    averaged_samples = RandomWeightedAverage(self.graph_random)(inputs=[real_image_input, fake_image_input])
+    partial_gp_loss = partial(gradient_penalty_loss, averaged_samples=averaged_samples)
+    partial_gp_loss.__name__ = 'gradient_penalty'
+
+    model = Model(inputs=[real_image_input, fake_image_input],
+                  outputs=[self.critic(real_image_input),
+                           self.critic(fake_image_input),
+                           self.critic(averaged_samples)],
+                  name="pooled_critic_model")
+    model.compile(optimizer=self.combined_critic_model.optimizer,
+                  loss=[wasserstein_loss,
+                        wasserstein_loss,
+                        partial_gp_loss],
+                  loss_weights=[1, 1, self.critic_gradient_penalty_weight],
+                  target_tensors=[K.constant(-1, shape=(self.batch_size, 1)), K.constant(1, shape=(self.batch_size, 1)), K.constant(0, shape=(self.batch_size, 1))])
+    return model
 
   # Check if datasets have consistent shapes
   def validate_dataset(self):
@@ -232,7 +321,14 @@ class WGANGC:
 
   def train(self, target_episode:int,
             progress_images_save_interval:int=None, save_raw_progress_images:bool=True, weights_save_interval:int=None,
-            critic_train_multip:int=5):
+            critic_train_multip:int=5, use_compiled_train_step:bool=False, episodes_per_call:int=1,
+            penalty_type:str="wgan-gp", penalty_interval:int=1, penalty_subsample:float=1.0,
+            feed_prev_gen_batch:bool=False, feed_old_perc_amount:float=0.2, fake_image_pool_capacity:Union[int, None]=None, persist_fake_image_pool:bool=False,
+            gradient_monitor_interval:Union[int, None]=100, gradient_norm_limits:tuple=(None, 100), gradient_norm_action:str="log",
+            weights_store_float16:bool=False, weights_store_keyframe_interval:Union[int, None]=10, weights_keep_last:Union[int, None]=None, weights_keep_every_episodes:Union[int, None]=None,
+            progress_tensorboard_scale:float=1.0, stats_aggregate_window:Union[int, None]=None, stats_full_resolution_episodes:int=0,
+            weight_stats_interval:Union[int, None]=None, step_timing_log_interval:Union[int, None]=1_000,
+            profile_trace_episodes:Union[int, None]=10, profile_trace_start_episode:Union[int, None]=None):
 
     # Check arguments and input data
     assert target_episode > 0, Fore.RED + "Invalid number of episodes" + Fore.RESET
@@ -241,6 +337,13 @@ class WGANGC:
     if weights_save_interval:
       assert weights_save_interval <= target_episode, Fore.RED + "Invalid weights save interval" + Fore.RESET
     assert critic_train_multip >= 1, Fore.RED + "Invalid critic training multiplier" + Fore.RESET
+    # Penalty is part of compiled loss of combined critic model so it can be changed only in compiled train step
+    if penalty_type != "wgan-gp" or penalty_interval != 1 or penalty_subsample != 1:
+      assert use_compiled_train_step, Fore.RED + "Penalty settings can be changed only with compiled train step" + Fore.RESET
+    assert episodes_per_call >= 1, Fore.RED + "Invalid number of episodes per call" + Fore.RESET
+    assert episodes_per_call == 1 or use_compiled_train_step, Fore.RED + "Multiple episodes per call can be trained only with compiled train step" + Fore.RESET
+    assert not (use_compiled_train_step and feed_prev_gen_batch), Fore.RED + "Compiled train step generates fake images in graph so it cant use previous generated images" + Fore.RESET
+    assert not (self.worker_group and gradient_norm_action == "halt"), Fore.RED + "Training cant be halted by gradient norm in distributed training" + Fore.RESET
 
     # Calculate epochs to go
     end_episode = target_episode
@@ -248,7 +351,7 @@ class WGANGC:
     assert target_episode > 0, Fore.CYAN + "Training is already finished" + Fore.RESET
 
     # Save noise for progress consistency
-    if progress_images_save_interval is not None:
+    if progress_images_save_interval is not None and self.is_chief:
       if not os.path.exists(self.training_progress_save_path): os.makedirs(self.training_progress_save_path)
       np.save(f"{self.training_progress_save_path}/static_noise.npy", self.static_noise)
 
@@ -259,84 +362,199 @@ class WGANGC:
       self.__save_imgs(save_raw_progress_images)
       self.save_checkpoint()
 
-    print(Fore.GREEN + f"Starting training on episode {self.episode_counter} for {target_episode} episodes" + Fore.RESET)
-    for _ in range(target_episode):
-      ep_start = time.time()
-
-      ### Train Critic ###
-      critic_loss = 0
-      for _ in range(critic_train_multip):
-        # Load image batch and generate new latent noise
-        image_batch = self.batch_maker.get_batch()
-        critic_noise_batch = np.random.normal(0, 1, (self.batch_size, self.latent_dim))
-
-        critic_loss += float(self.combined_critic_model.train_on_batch([image_batch, critic_noise_batch], [self.valid_labels, self.fake_labels, self.gradient_labels])[0])
-      critic_loss /= critic_train_multip
+    # Gradient norms are computed by training functions so optimizers are watched before they are built (only chief logs them)
+    self.gradient_monitor = None
+    if gradient_monitor_interval:
+      self.gradient_monitor = GradientMonitor(self.tensorboard, gradient_norm_limits, gradient_norm_action)
+      self.gradient_monitor.watch(self.combined_generator_model.optimizer, "generator")
+      self.gradient_monitor.watch(self.combined_critic_model.optimizer, "critic")
+
+    # Whole episode (critic and generator updates) or multiple episodes as one compiled function
+    compiled_train_step = None
+    critic_train_step = None
+    generator_train_step = None
+    if use_compiled_train_step:
+      compiled_train_step = WGANGPTrainStep(self.generator, self.critic,
+                                            self.combined_generator_model.optimizer, self.combined_critic_model.optimizer,
+                                            self.combined_generator_model._collected_trainable_weights, self.combined_critic_model._collected_trainable_weights,
+                                            self.latent_dim, self.image_shape,
+                                            critic_steps=critic_train_multip * self.gradient_accumulation_steps, generator_steps=self.gradient_accumulation_steps,
+                                            episodes=episodes_per_call, gradient_penalty_weight=self.critic_gradient_penalty_weight,
+                                            penalty_type=penalty_type, penalty_interval=penalty_interval, penalty_subsample=penalty_subsample,
+                                            graph_random=self.graph_random, generator_optimizer_slots=self.generator_optimizer_slots, critic_optimizer_slots=self.critic_optimizer_slots)
+    else:
+      # Direct training calls of models (skips input validation of train_on_batch), noise and labels are generated in graph so only real images are fed
+      critic_train_step = TrainStep(self.combined_critic_model if not feed_prev_gen_batch else self.__build_pooled_critic_model(), self.batch_size, self.critic_optimizer_slots)
+      generator_train_step = TrainStep(self.combined_generator_model, self.batch_size, self.generator_optimizer_slots)
+
+    assert 0 < progress_tensorboard_scale <= 1, Fore.RED + "Invalid tensorboard progress image scale" + Fore.RESET
+    if self.is_chief:
+      self.progress_renderer.tensorboard_scale = progress_tensorboard_scale
+
+      # Stats are logged as summaries of aggregate windows after full resolution episodes
+      self.stat_logger = StatLogger(self.tensorboard, stats_aggregate_window, stats_full_resolution_episodes)
+
+    # Weights store with retention and encoding settings of this training
+    self.weights_store = WeightSnapshotStore(os.path.join(self.training_progress_save_path, "weights"), weights_store_float16, weights_store_keyframe_interval,
+                                             keep_last=weights_keep_last, keep_every_episodes=weights_keep_every_episodes)
+
+    # Pool of previously generated images used for replacing part of new generated images (fake images are then fed to critic)
+    self.fake_image_pool = None
+    self.persist_fake_image_pool = persist_fake_image_pool
+    if feed_prev_gen_batch:
+      self.fake_image_pool = ImagePool(fake_image_pool_capacity if fake_image_pool_capacity else 3 * self.batch_size, self.image_shape)
+      if persist_fake_image_pool: self.fake_image_pool.load(os.path.join(self.training_progress_save_path, "checkpoint", "fake_image_pool.npy"))
+
+      # Fake images are generated in training mode same as in combined critic model
+      fake_images_inputs = [] if isinstance(K.learning_phase(), int) else [K.learning_phase()]
+      fake_images_function = K.function(fake_images_inputs, [self.generator(self.graph_random.normal((self.batch_size, self.latent_dim)))])
+      fake_images_function_inputs = [1] if fake_images_inputs else []
+
+    # Optimizer slots and random generator streams exist only after all training functions are built
+    if self.__training_state_path is not None:
+      if compiled_train_step is not None: compiled_train_step.build()
+      restored_state = CheckpointWriter.restore_variables(self.__training_state_path, self.__training_state_variables())
+      if restored_state: print(Fore.BLUE + f"Restored training state from checkpoint: {', '.join(restored_state)}" + Fore.RESET)
+      self.__training_state_path = None
 
-      ### Train Generator ###
-      # Generate new latent noise
-      gen_loss = self.combined_generator_model.train_on_batch(np.random.normal(0.0, 1.0, (self.batch_size, self.latent_dim)), self.valid_labels)
+    print(Fore.GREEN + f"Starting training on episode {self.episode_counter} for {target_episode} episodes" + Fore.RESET)
+    episodes_done = 0
+    self.step_profiler = StepProfiler()
 
-      self.episode_counter += 1
-      self.tensorboard.step = self.episode_counter
-      self.tensorboard.update_stats(critic_loss=critic_loss, gen_loss=gen_loss)
+    # Profiler trace of next episodes can be requested during training by creating file profile_trace in training folder or by SIGUSR1 signal
+    self.profiler_trigger = ProfilerTrigger(os.path.join(self.training_progress_save_path, "logs"), os.path.join(self.training_progress_save_path, "profile_trace"), profile_trace_episodes, profile_trace_start_episode) if profile_trace_episodes and self.is_chief else None
+    while episodes_done < target_episode:
+      ep_start = time.time()
+      self.step_profiler.start_step()
+      if self.profiler_trigger is not None: self.profiler_trigger.update(self.episode_counter)
+
+      critic_steps = critic_train_multip * self.gradient_accumulation_steps
+
+      # Multiple episodes are trained in one call, stats, saving and checks are done after each call
+      episodes_in_call = min(episodes_per_call, target_episode - episodes_done)
+      start_episode = self.episode_counter
+
+      penalty_time_saved = None
+      if compiled_train_step is not None:
+        real_image_batches = [self.batch_maker.get_batch() for _ in range(critic_steps * episodes_in_call)]
+        self.step_profiler.lap("data_wait")
+        # Critic and generator updates of all episodes are one call of compiled function
+        critic_loss, gen_loss = compiled_train_step(real_image_batches)
+        self.step_profiler.lap("compiled_update")
+        penalty_time_saved = compiled_train_step.time_saved
+      else:
+        ### Train Critic ###
+        # With gradient accumulation every critic step is made of multiple sub steps applied as one update of optimizer
+        critic_loss = 0
+        for _ in range(critic_steps):
+          real_images = self.batch_maker.get_batch()
+          self.step_profiler.lap("data_wait")
+
+          if self.fake_image_pool is not None:
+            fake_images = self.fake_image_pool.replace_random(fake_images_function(fake_images_function_inputs)[0], feed_old_perc_amount)
+            critic_loss += float(critic_train_step([real_images, fake_images], [])[0])
+          else:
+            critic_loss += float(critic_train_step([real_images], [])[0])
+          self.step_profiler.lap("discriminator_update")
+        critic_loss /= critic_steps
+
+        ### Train Generator ###
+        gen_loss = 0
+        for _ in range(self.gradient_accumulation_steps):
+          gen_loss += float(generator_train_step([], []))
+        gen_loss /= self.gradient_accumulation_steps
+        self.step_profiler.lap("generator_update")
+
+      self.episode_counter += episodes_in_call
+      episodes_done += episodes_in_call
+
+      if self.is_chief:
+        self.tensorboard.step = self.episode_counter
+        if penalty_time_saved is not None: self.stat_logger.append_stats(self.episode_counter, critic_loss=critic_loss, gen_loss=gen_loss, penalty_time_saved=penalty_time_saved)
+        else: self.stat_logger.append_stats(self.episode_counter, critic_loss=critic_loss, gen_loss=gen_loss)
+
+      # Average weights between workers
+      if self.worker_group and interval_crossed(start_episode, self.episode_counter, self.worker_group.sync_interval):
+        self.worker_group.average_models([self.generator, self.critic], [self.combined_generator_model.optimizer, self.combined_critic_model.optimizer])
+      self.step_profiler.lap("worker_sync")
 
       # Show stats
-      if self.episode_counter % self.AGREGATE_STAT_INTERVAL == 0:
+      if interval_crossed(start_episode, self.episode_counter, self.AGREGATE_STAT_INTERVAL):
         # Save stats
         print(Fore.GREEN + f"{self.episode_counter}/{end_episode}, Remaining: {time_to_format(mean(epochs_time_history) * (end_episode - self.episode_counter))}\t\t[Critic loss: {round(float(critic_loss), 5)}] [Gen loss: {round(float(gen_loss), 5)}]" + Fore.RESET)
 
+      # Statistics of weights are computed and written on background thread
+      if weight_stats_interval is not None and self.is_chief and interval_crossed(start_episode, self.episode_counter, weight_stats_interval):
+        self.weight_statistics.log({"generator": self.generator, "critic": self.critic}, self.episode_counter)
+      self.step_profiler.lap("logging")
+
       # Save progress
-      if self.training_progress_save_path is not None and progress_images_save_interval is not None and self.episode_counter % progress_images_save_interval == 0:
+      if self.training_progress_save_path is not None and progress_images_save_interval is not None and interval_crossed(start_episode, self.episode_counter, progress_images_save_interval):
         self.__save_imgs(save_raw_progress_images)
+      self.step_profiler.lap("progress_images")
 
       # Save weights of models
-      if weights_save_interval is not None and self.episode_counter % weights_save_interval == 0:
+      if weights_save_interval is not None and interval_crossed(start_episode, self.episode_counter, weights_save_interval):
         self.__save_weights()
 
       # Save checkpoint
-      if self.episode_counter % self.CHECKPOINT_SAVE_INTERVAL == 0:
+      if interval_crossed(start_episode, self.episode_counter, self.CHECKPOINT_SAVE_INTERVAL) and self.is_chief:
         self.save_checkpoint()
         print(Fore.BLUE + "Checkpoint created" + Fore.RESET)
+      self.step_profiler.lap("checkpointing")
 
       # Reset seeds
-      if self.episode_counter % self.RESET_SEEDS_INTERVAL == 0:
+      if interval_crossed(start_episode, self.episode_counter, self.RESET_SEEDS_INTERVAL):
         np.random.seed(None)
         random.seed()
 
-      epochs_time_history.append(time.time() - ep_start)
+      epochs_time_history.append((time.time() - ep_start) / episodes_in_call)
+
+      # Rolling percentiles of phase timings
+      self.step_profiler.end_step()
+      if step_timing_log_interval is not None and self.is_chief and interval_crossed(start_episode, self.episode_counter, step_timing_log_interval):
+        self.step_profiler.log(self.tensorboard, self.episode_counter)
+
+      # Gradient norms are read and checked on background thread, requested actions are handled after next calls
+      if self.gradient_monitor is not None:
+        if interval_crossed(start_episode, self.episode_counter, gradient_monitor_interval):
+          self.gradient_monitor.check(self.episode_counter)
+
+        if self.gradient_monitor.checkpoint_requested:
+          self.gradient_monitor.checkpoint_requested = False
+          self.save_checkpoint()
+          if self.is_chief: print(Fore.BLUE + "Checkpoint created because of gradient norm" + Fore.RESET)
+
+        if self.gradient_monitor.halt_requested:
+          print(Fore.RED + f"Halting training on episode {self.episode_counter} because of gradient norm" + Fore.RESET)
+          break
 
     # Shutdown helper threads
     print(Fore.GREEN + "Training Complete - Waiting for other threads to finish" + Fore.RESET)
+    if self.profiler_trigger is not None: self.profiler_trigger.close(self.episode_counter)
     self.batch_maker.terminate()
+    if self.gradient_monitor is not None: self.gradient_monitor.terminate()
     self.save_checkpoint()
     self.__save_weights()
     self.batch_maker.join()
+    if self.gradient_monitor is not None: self.gradient_monitor.join()
+    if self.is_chief:
+      self.progress_renderer.flush()
+      self.weight_statistics.flush()
+      self.stat_logger.flush()
+    self.flush_checkpoint()
+    if self.worker_group: self.worker_group.close()
+    if self.is_chief: self.step_profiler.save(os.path.join(self.training_progress_save_path, "step_timing.json"))
     print(Fore.GREEN + "All threads finished" + Fore.RESET)
 
   # Function for saving progress images
   def __save_imgs(self, save_raw_progress_images:bool=True):
-    if not os.path.exists(self.training_progress_save_path + "/progress_images"): os.makedirs(self.training_progress_save_path + "/progress_images")
+    if not self.is_chief: return
     gen_imgs = self.generator.predict(self.static_noise)
+    grid_dim = self.progress_image_dim
 
-    # Rescale images 0 to 255
-    gen_imgs = (0.5 * gen_imgs + 0.5) * 255
-
-    final_image = np.zeros(shape=(self.image_shape[0] * self.progress_image_dim[1], self.image_shape[1] * self.progress_image_dim[0], self.image_channels)).astype(np.float32)
-
-    cnt = 0
-    for i in range(self.progress_image_dim[1]):
-      for j in range(self.progress_image_dim[0]):
-        if self.image_channels == 3:
-          final_image[self.image_shape[0] * i:self.image_shape[0] * (i + 1), self.image_shape[1] * j:self.image_shape[1] * (j + 1), :] = gen_imgs[cnt]
-        else:
-          final_image[self.image_shape[0] * i:self.image_shape[0] * (i + 1), self.image_shape[1] * j:self.image_shape[1] * (j + 1), 0] = gen_imgs[cnt, :, :, 0]
-        cnt += 1
-    final_image = cv.cvtColor(final_image, cv.COLOR_RGB2BGR)
-
-    if save_raw_progress_images:
-      cv.imwrite(f"{self.training_progress_save_path}/progress_images/{self.episode_counter}.png", final_image)
-    self.tensorboard.write_image(np.reshape(cv.cvtColor(final_image, cv.COLOR_BGR2RGB) / 255, (-1, final_image.shape[0], final_image.shape[1], final_image.shape[2])).astype(np.float32))
+    # Images are rescaled from -1 to 1 range to 0 to 255 and placed to grid by renderer
+    self.progress_renderer.render(self.episode_counter, lambda: make_image_grid((0.5 * gen_imgs + 0.5) * 255, grid_dim), save_raw_progress_images)
 
   def save_models_structure_images(self, save_path:str=None):
     if save_path is None: save_path = self.training_progress_save_path + "/model_structures"
@@ -366,49 +584,51 @@ class WGANGC:
         except:
           print(Fore.YELLOW + "Failed to load critic weights from checkpoint" + Fore.RESET)
 
+        if "state_path" in data.keys(): self.__training_state_path = data["state_path"]
         self.initiated = True
 
   def save_checkpoint(self):
+    if not self.is_chief: return
     checkpoint_base_path = os.path.join(self.training_progress_save_path, "checkpoint")
     if not os.path.exists(checkpoint_base_path): os.makedirs(checkpoint_base_path)
 
     gen_path = f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5"
     critic_path = f"{checkpoint_base_path}/discriminator_{self.critic_mod_name}.h5"
-
-    if os.path.exists(gen_path): os.rename(gen_path, f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock")
-    if os.path.exists(critic_path): os.rename(critic_path, f"{checkpoint_base_path}/discriminator_{self.critic_mod_name}.h5.lock")
-
-    self.generator.save_weights(gen_path)
-    self.critic.save_weights(critic_path)
-
-    if os.path.exists(f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/generator_{self.gen_mod_name}.h5.lock")
-    if os.path.exists(f"{checkpoint_base_path}/discriminator_{self.critic_mod_name}.h5.lock"): os.remove(f"{checkpoint_base_path}/discriminator_{self.critic_mod_name}.h5.lock")
+    state_path = f"{checkpoint_base_path}/training_state.h5"
 
     data = {
       "episode": self.episode_counter,
       "gen_path": gen_path,
-      "critic_path": critic_path
+      "critic_path": critic_path,
+      "state_path": state_path
     }
 
-    with open(os.path.join(checkpoint_base_path, "checkpoint_data.json"), "w", encoding='utf-8') as f:
-      json.dump(data, f)
-
-  def __save_weights(self):
-    save_dir = self.training_progress_save_path + "/weights/" + str(self.episode_counter)
-    if not os.path.exists(save_dir): os.makedirs(save_dir)
-    self.generator.save_weights(f"{save_dir}/generator_{self.gen_mod_name}.h5")
-    self.critic.save_weights(f"{save_dir}/critic_{self.critic_mod_name}.h5")
-
-  def make_progress_gif(self, frame_duration:int=16):
-    if not os.path.exists(self.training_progress_save_path): os.makedirs(self.training_progress_save_path)
-    if not os.path.exists(self.training_progress_save_path + "/progress_images"): return
-
-    frames = []
-    img_file_names = os.listdir(self.training_progress_save_path + "/progress_images")
+    # Weights are snapshotted now and written on background thread (flush_checkpoint waits for them)
+    arrays = {f"{checkpoint_base_path}/fake_image_pool.npy": self.fake_image_pool.get_images()} if self.fake_image_pool is not None and self.persist_fake_image_pool else None
+    self.checkpoint_writer.save(models={gen_path: self.generator, critic_path: self.critic}, arrays=arrays,
+                                variables={state_path: self.__training_state_variables()},
+                                json_data={os.path.join(checkpoint_base_path, "checkpoint_data.json"): data})
+
+  # Named groups of variables saved as training state (optimizer slots and positions of random generator streams)
+  def __training_state_variables(self) -> dict:
+    return {
+      "combined_generator_model_optimizer": optimizer_state_variables(self.combined_generator_model.optimizer),
+      "combined_critic_model_optimizer": optimizer_state_variables(self.combined_critic_model.optimizer),
+      "graph_random_counters": self.graph_random.counters
+    }
 
-    for im_file in img_file_names:
-      if os.path.isfile(self.training_progress_save_path + "/progress_images/" + im_file):
-        frames.append(Image.open(self.training_progress_save_path + "/progress_images/" + im_file))
+  # Wait until all requested checkpoints are written to disk
+  def flush_checkpoint(self):
+    if self.checkpoint_writer is not None: self.checkpoint_writer.flush()
 
-    if len(frames) > 2:
-      frames[0].save(f"{self.training_progress_save_path}/progress_gif.gif", format="GIF", append_images=frames[1:], save_all=True, optimize=False, duration=frame_duration, loop=0)
\ No newline at end of file
+  # Weights are copied to host memory and written to weights store on checkpoint writer thread
+  def __save_weights(self):
+    if not self.is_chief: return
+    self.weights_store.save(self.episode_counter, {"generator": self.generator, "critic": self.critic}, self.checkpoint_writer)
+
+  # Encode progress images to gif or mp4 ordered by episode (frames are streamed so memory usage doesnt grow with number of frames)
+  def make_progress_video(self, frame_duration:int=16, video_format:str="gif", frame_stride:int=1, scale:float=1.0):
+    assert video_format in PROGRESS_VIDEO_FORMATS, Fore.RED + f"Invalid progress video format, avaible formats: {PROGRESS_VIDEO_FORMATS}" + Fore.RESET
+    if not self.is_chief: return
+    self.progress_renderer.flush()
+    make_progress_video(os.path.join(self.training_progress_save_path, "progress_images"), os.path.join(self.training_progress_save_path, f"progress_video.{video_format}"), frame_duration, frame_stride, scale)
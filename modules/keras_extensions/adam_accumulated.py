@@ -5,9 +5,11 @@ from tensorflow.python.ops import math_ops
 from tensorflow.python.ops import state_ops
 from tensorflow.python.ops import control_flow_ops
 from tensorflow.python.keras import backend_config
+from keras.optimizers import Adam
+import keras.backend as K
 
 
-__all__ = ['AdamAccumulated']
+__all__ = ['AdamAccumulated', 'KerasAdamAccumulated']
 
 
 class AdamAccumulated(OptimizerV2):
@@ -173,4 +175,85 @@ class AdamAccumulated(OptimizerV2):
             'epsilon': self.epsilon,
             'amsgrad': self.amsgrad,
         })
-        return config
\ No newline at end of file
+        return config
+
+
+class KerasAdamAccumulated(Adam):
+    """Adam optimizer with gradient accumulation for standalone Keras models.
+
+    Same update rule as `AdamAccumulated`, but usable in `keras.Model.compile`
+    (standalone Keras can't use tf.keras `OptimizerV2`). Gradients from
+    `accumulation_steps` consecutive batches are averaged and applied as one
+    update, `iterations` counts batches, not updates.
+    """
+
+    def __init__(self, accumulation_steps=1, learning_rate=0.001, beta_1=0.9, beta_2=0.999,
+                 amsgrad=False, **kwargs):
+        super(KerasAdamAccumulated, self).__init__(learning_rate=learning_rate, beta_1=beta_1, beta_2=beta_2,
+                                                   amsgrad=amsgrad, **kwargs)
+        assert accumulation_steps >= 1, "Invalid number of accumulation steps"
+        self.accumulation_steps = accumulation_steps
+
+    @K.symbolic
+    def get_updates(self, loss, params):
+        grads = self.get_gradients(loss, params)
+        self.updates = [K.update_add(self.iterations, 1)]
+
+        update_cond = K.equal((self.iterations + 1) % self.accumulation_steps, 0)
+        first_sub_step = K.equal(self.iterations % self.accumulation_steps, 0)
+        local_step = self.iterations // self.accumulation_steps
+
+        lr = self.learning_rate
+        if self.initial_decay > 0:
+            lr = lr * (1. / (1. + self.decay * K.cast(local_step,
+                                                      K.dtype(self.decay))))
+
+        t = K.cast(local_step, K.floatx()) + 1
+        lr_t = lr * (K.sqrt(1. - K.pow(self.beta_2, t)) /
+                     (1. - K.pow(self.beta_1, t)))
+
+        ms = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='m_' + str(i))
+              for (i, p) in enumerate(params)]
+        vs = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='v_' + str(i))
+              for (i, p) in enumerate(params)]
+        gs = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='g_' + str(i))
+              for (i, p) in enumerate(params)]
+
+        if self.amsgrad:
+            vhats = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='vhat_' + str(i))
+                     for (i, p) in enumerate(params)]
+        else:
+            vhats = [K.zeros(1, name='vhat_' + str(i))
+                     for i in range(len(params))]
+        self.weights = [self.iterations] + ms + vs + vhats + gs
+
+        for p, g, m, v, vhat, ga in zip(params, grads, ms, vs, vhats, gs):
+            # Sum gradients of sub steps, accumulator starts from zero on first sub step
+            ga_t = K.switch(first_sub_step, g, ga + g)
+            g_t = ga_t / self.accumulation_steps
+
+            m_t = K.switch(update_cond, (self.beta_1 * m) + (1. - self.beta_1) * g_t, m)
+            v_t = K.switch(update_cond, (self.beta_2 * v) + (1. - self.beta_2) * K.square(g_t), v)
+            if self.amsgrad:
+                vhat_t = K.switch(update_cond, K.maximum(vhat, v_t), vhat)
+                p_t = p - lr_t * m_t / (K.sqrt(vhat_t) + self.epsilon)
+                self.updates.append(K.update(vhat, vhat_t))
+            else:
+                p_t = p - lr_t * m_t / (K.sqrt(v_t) + self.epsilon)
+
+            self.updates.append(K.update(ga, ga_t))
+            self.updates.append(K.update(m, m_t))
+            self.updates.append(K.update(v, v_t))
+            new_p = K.switch(update_cond, p_t, p)
+
+            # Apply constraints.
+            if getattr(p, 'constraint', None) is not None:
+                new_p = p.constraint(new_p)
+
+            self.updates.append(K.update(p, new_p))
+        return self.updates
+
+    def get_config(self):
+        config = {'accumulation_steps': self.accumulation_steps}
+        base_config = super(KerasAdamAccumulated, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
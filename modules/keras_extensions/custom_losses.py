@@ -5,9 +5,16 @@ def wasserstein_loss(y_true, y_pred):
   return K.mean(y_true * y_pred)
 
 def gradient_penalty_loss(_, y_pred, averaged_samples):
-  gradients = K.gradients(y_pred, averaged_samples)[0]
+  # Penalty is computed in float32 and epsilon keeps gradient of sqrt finite when gradients are zero (important for mixed precision)
+  gradients = K.cast(K.gradients(y_pred, averaged_samples)[0], "float32")
   gradients_sqr = K.square(gradients)
   gradients_sqr_sum = K.sum(gradients_sqr, axis=np.arange(1, len(gradients_sqr.shape)))
-  gradient_l2_norm = K.sqrt(gradients_sqr_sum)
+  gradient_l2_norm = K.sqrt(gradients_sqr_sum + K.epsilon())
   gradient_penalty = K.square(1 - gradient_l2_norm)
-  return K.mean(gradient_penalty)
\ No newline at end of file
+  return K.mean(gradient_penalty)
+
+def r1_penalty_loss(_, y_pred, real_samples):
+  # Squared gradient norm of critic on real samples, halved so weight is gamma from R1 paper
+  gradients = K.cast(K.gradients(y_pred, real_samples)[0], "float32")
+  gradients_sqr_sum = K.sum(K.square(gradients), axis=np.arange(1, len(gradients.shape)))
+  return 0.5 * K.mean(gradients_sqr_sum)
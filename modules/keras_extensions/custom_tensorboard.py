@@ -4,19 +4,33 @@ from keras.callbacks import Callback
 import keras.backend as K
 import numpy as np
 import os
+import time
+import atexit
+from queue import Queue, Empty
+from threading import Thread
+from colorama import Fore
 
 # Based on ModifiedTensorBoard from Sendex (https://pythonprogramming.net)
 # https://pythonprogramming.net/reinforcement-learning-self-driving-autonomous-cars-carla-python/ (original code)
 
+# All writes are queued and done by one background thread, log file is flushed after flush_size records or flush_interval seconds (not after every write)
+# Queue is bounded so callers wait only when writer falls behind, queued records are always written before interpreter exits
 class TensorBoardCustom(Callback):
-  def __init__(self, log_dir):
+  def __init__(self, log_dir, max_queue_size:int=1000, flush_size:int=200, flush_interval:float=5.0):
     super().__init__()
     self.step = 0
     self.__log_dir = log_dir
     self.__writer = None
+    self.__flush_size = flush_size
+    self.__flush_interval = flush_interval
 
     if not os.path.exists(self.__log_dir): os.makedirs(self.__log_dir)
 
+    self.__queue = Queue(maxsize=max_queue_size)
+    self.__writer_thread = Thread(target=self.__run, daemon=True)
+    self.__writer_thread.start()
+    atexit.register(self.flush)
+
   def __del__(self):
     try:
       if self.__writer:
@@ -31,36 +45,65 @@ class TensorBoardCustom(Callback):
     if not self.__writer:
       self.__writer = tf.summary.create_file_writer(self.__log_dir)
 
-  def log_kernels_and_biases(self, model:keras.Model):
-    self.init_writer_check()
+  # Block until all queued records are written and flushed to log file
+  def flush(self):
+    self.__queue.put(("flush",))
+    self.__queue.join()
 
-    with self.__writer.as_default():
-      for layer in model.layers:
-        for weight in layer.weights:
-          weight_name = weight.name.replace(':', '_')
-          weight = K.get_value(weight)
-          tf.summary.histogram(weight_name, weight, step=self.step)
-    self.__writer.flush()
+  def log_kernels_and_biases(self, model:keras.Model):
+    # Values are copied now so histograms show weights from time of call
+    weights = [weight for layer in model.layers for weight in layer.weights]
+    values = K.batch_get_value(weights)
+    self.write_histograms([(weight.name.replace(':', '_'), value) for weight, value in zip(weights, values)])
 
   def update_stats(self, **stats):
     self._write_logs(stats, self.step)
 
   # More or less the same writer as in Keras' Tensorboard callback
-  # Physically writes to the log files
+  # Queues scalars for writing to log files
   def _write_logs(self, logs, index):
-    self.init_writer_check()
+    logs = {name: value for name, value in logs.items() if name not in ['batch', 'size']}
+    if logs: self.__queue.put(("scalars", index, logs))
 
-    with self.__writer.as_default():
-      for name, value in logs.items():
-        if name in ['batch', 'size']:
-          continue
+  # Queue histograms of (name, values) pairs
+  def write_histograms(self, histograms:list, step:int=None):
+    self.__queue.put(("histograms", self.step if step is None else step, histograms))
+
+  def write_image(self, image:np.ndarray, description:str="progress", step:int=None):
+    self.__queue.put(("image", self.step if step is None else step, (description, image)))
 
-        tf.summary.scalar(name, value, step=index)
-    self.__writer.flush()
+  def __write_record(self, record_type:str, index:int, data):
+    with self.__writer.as_default():
+      if record_type == "scalars":
+        for name, value in data.items():
+          tf.summary.scalar(name, value, step=index)
+      elif record_type == "histograms":
+        for name, value in data:
+          tf.summary.histogram(name, value, step=index)
+      elif record_type == "image":
+        tf.summary.image(data[0], data[1], step=index)
 
-  def write_image(self, image:np.ndarray, description:str="progress"):
+  def __run(self):
     self.init_writer_check()
 
-    with self.__writer.as_default():
-      tf.summary.image(description, image, step=self.step)
-    self.__writer.flush()
\ No newline at end of file
+    unflushed_records = 0
+    last_flush_time = time.time()
+    while True:
+      try:
+        record = self.__queue.get(timeout=self.__flush_interval)
+      except Empty:
+        record = None
+
+      try:
+        if record is not None and record[0] != "flush":
+          self.__write_record(*record)
+          unflushed_records += 1
+
+        if (record is not None and record[0] == "flush") or unflushed_records >= self.__flush_size or (unflushed_records > 0 and time.time() - last_flush_time >= self.__flush_interval):
+          self.__writer.flush()
+          unflushed_records = 0
+          last_flush_time = time.time()
+      except Exception as e:
+        print(Fore.RED + f"Failed to write tensorboard logs\n{e}" + Fore.RESET)
+      finally:
+        if record is not None: self.__queue.task_done()
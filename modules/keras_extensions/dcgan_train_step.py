@@ -0,0 +1,128 @@
+import numpy as np
+import tensorflow as tf
+import keras.backend as K
+from keras.models import Model
+from keras.optimizers import Optimizer
+from colorama import Fore
+from typing import Union
+
+from .train_step import SharedOptimizerSlots
+from .graph_random import GraphRandom
+
+class DCGANTrainStep:
+  """
+  One compiled function for multiple DCGAN episodes (discriminator updates followed by generator updates in every episode)
+  Real image batches of all episodes are fed as one stacked array (episodes * accumulation_steps, batch, ...), latent noise and labels are sampled on device
+  Updates are unrolled and chained with control dependencies so every step sees weights updated by previous one
+  Fake images for discriminator are generated in inference mode same as by predict
+  """
+
+  def __init__(self, generator:Model, discriminator:Model,
+               generator_optimizer:Optimizer, discriminator_optimizer:Optimizer,
+               generator_params:list, discriminator_params:list,
+               latent_dim:int, image_shape:tuple, batch_size:int, episodes:int=1, accumulation_steps:int=1, concat_real_fake:bool=False,
+               smooth_real_labels:bool=False, smooth_fake_labels:bool=False, generator_smooth_labels:bool=False, label_flip_probability=None,
+               graph_random:GraphRandom=None, generator_optimizer_slots:SharedOptimizerSlots=None, discriminator_optimizer_slots:SharedOptimizerSlots=None):
+    assert episodes >= 1 and accumulation_steps >= 1, Fore.RED + "Invalid number of steps" + Fore.RESET
+    assert accumulation_steps == 1 or concat_real_fake, Fore.RED + "Gradient accumulation needs concatenated real and fake discriminator step" + Fore.RESET
+
+    self.__generator = generator
+    self.__discriminator = discriminator
+    self.__generator_optimizer = generator_optimizer
+    self.__discriminator_optimizer = discriminator_optimizer
+    self.__generator_params = generator_params
+    self.__discriminator_params = discriminator_params
+    self.__episodes = episodes
+    self.__accumulation_steps = accumulation_steps
+    self.__concat_real_fake = concat_real_fake
+    self.__batch_size = batch_size
+    self.__graph_random = graph_random if graph_random is not None else GraphRandom()
+
+    self.__real_images_input = K.placeholder(shape=(None, batch_size, *image_shape), dtype="float32", name="dcgan_real_images")
+    self.__learning_phase = [] if isinstance(K.learning_phase(), int) else [1]
+
+    # Random streams of every sub step are created once and shared by functions for lower number of episodes (last call of training),
+    # so number of random generator counters (saved in checkpoint) doesnt depend on which functions were built
+    steps = episodes * accumulation_steps
+    self.__discriminator_noise = [self.__graph_random.normal((batch_size, latent_dim)) for _ in range(steps)]
+    self.__real_labels = [self.__labels(1.0, (0.8, 1.0) if smooth_real_labels else None, label_flip_probability) for _ in range(steps)]
+    self.__fake_labels = [self.__labels(0.0, (0.0, 0.2) if smooth_fake_labels else None, label_flip_probability) for _ in range(steps)]
+    self.__generator_noise = [self.__graph_random.normal((batch_size, latent_dim)) for _ in range(steps)]
+    self.__generator_labels = [self.__labels(1.0, (0.8, 1.0) if generator_smooth_labels else None) for _ in range(steps)]
+
+    # Slot variables of optimizers created by first step are reused by following steps and functions
+    self.__discriminator_slots = discriminator_optimizer_slots if discriminator_optimizer_slots is not None else SharedOptimizerSlots()
+    self.__generator_slots = generator_optimizer_slots if generator_optimizer_slots is not None else SharedOptimizerSlots()
+
+    # Functions are built lazily for each number of episodes in call
+    self.__functions = {}
+    self.__output_names = ["disc_loss"] if concat_real_fake else ["disc_real_loss", "disc_fake_loss"]
+    self.__output_names.append("gan_loss")
+
+  def __labels(self, value:float, smooth_range:Union[tuple, None], flip_probability=None):
+    labels = self.__graph_random.labels((self.__batch_size, 1), value, smooth_range)
+    if flip_probability is not None: labels = self.__graph_random.flip_labels(labels, flip_probability)
+    return labels
+
+  def __discriminator_update(self, images, labels, updates:list) -> tuple:
+    with tf.control_dependencies(updates):
+      loss = K.mean(K.binary_crossentropy(labels, self.__discriminator(images)))
+      for reg_loss in self.__discriminator.get_losses_for(None): loss += reg_loss
+
+      with self.__discriminator_slots:
+        step_updates = self.__discriminator_optimizer.get_updates(loss=loss, params=self.__discriminator_params)
+      return loss, step_updates + self.__discriminator.get_updates_for(images)
+
+  def __build_function(self, episodes:int):
+    updates = []
+    losses = {name: [] for name in self.__output_names}
+    for episode in range(episodes):
+      steps = range(episode * self.__accumulation_steps, (episode + 1) * self.__accumulation_steps)
+
+      # With gradient accumulation all sub steps are applied as one update of optimizer
+      for idx in steps:
+        with tf.control_dependencies(updates):
+          real_images = self.__real_images_input[idx]
+          with K.learning_phase_scope(0):
+            fake_images = self.__generator(self.__discriminator_noise[idx])
+
+        if self.__concat_real_fake:
+          # One update on real and fake images stacked together
+          loss, updates = self.__discriminator_update(K.concatenate([real_images, fake_images], axis=0), K.concatenate([self.__real_labels[idx], self.__fake_labels[idx]], axis=0), updates)
+          losses["disc_loss"].append(loss)
+        else:
+          loss, updates = self.__discriminator_update(real_images, self.__real_labels[idx], updates)
+          losses["disc_real_loss"].append(loss)
+          loss, updates = self.__discriminator_update(fake_images, self.__fake_labels[idx], updates)
+          losses["disc_fake_loss"].append(loss)
+
+      # Generator wants discriminator to recognize fake images as valid, updates of discriminator layers from this call are not applied
+      for idx in steps:
+        with tf.control_dependencies(updates):
+          noise = self.__generator_noise[idx]
+          loss = K.mean(K.binary_crossentropy(self.__generator_labels[idx], self.__discriminator(self.__generator(noise))))
+          for reg_loss in self.__generator.get_losses_for(None): loss += reg_loss
+
+          with self.__generator_slots:
+            step_updates = self.__generator_optimizer.get_updates(loss=loss, params=self.__generator_params)
+          updates = step_updates + self.__generator.get_updates_for(noise)
+          losses["gan_loss"].append(loss)
+
+    inputs = [self.__real_images_input]
+    if self.__learning_phase: inputs.append(K.learning_phase())
+
+    return K.function(inputs, [K.mean(K.stack(losses[name])) for name in self.__output_names], updates=updates)
+
+  # Build function for full number of episodes ahead of training (creates optimizer slots so their state can be restored before first call)
+  def build(self):
+    if self.__episodes not in self.__functions: self.__functions[self.__episodes] = self.__build_function(self.__episodes)
+
+  # Train on stacked real image batches (episodes * accumulation_steps batches), returns losses averaged over steps ({name: loss})
+  def __call__(self, real_images:np.ndarray) -> dict:
+    assert real_images.shape[0] % self.__accumulation_steps == 0 and 0 < real_images.shape[0] // self.__accumulation_steps <= self.__episodes, Fore.RED + "Invalid number of image batches" + Fore.RESET
+
+    episodes = real_images.shape[0] // self.__accumulation_steps
+    if episodes not in self.__functions: self.__functions[episodes] = self.__build_function(episodes)
+
+    outputs = self.__functions[episodes]([real_images] + self.__learning_phase)
+    return {name: float(value) for name, value in zip(self.__output_names, outputs)}
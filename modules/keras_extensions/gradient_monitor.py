@@ -0,0 +1,127 @@
+import tensorflow as tf
+import keras.backend as K
+from keras.optimizers import Optimizer
+from threading import Thread
+from queue import Queue, Full
+from colorama import Fore
+from typing import Union
+
+from .custom_tensorboard import TensorBoardCustom
+
+GRADIENT_NORM_ACTIONS = ["log", "checkpoint", "halt"]
+
+class GradientMonitor(Thread):
+  """
+  Global and per layer gradient norms of optimizers computed inside training steps (from gradients that are computed for update anyway)
+  Watched optimizer stores norms of its last update to variables, values are read, logged and checked on background thread so training loop is never blocked
+  When global norm leaves norm limits action is taken - log prints warning, checkpoint and halt set request flags that are handled by training loop
+  """
+
+  def __init__(self, tensorboard:Union[TensorBoardCustom, None], norm_limits:tuple=(0.2, 100), action:str="log", check_start_episode:int=0, per_layer:bool=True):
+    super(GradientMonitor, self).__init__()
+    self.daemon = True
+
+    assert action in GRADIENT_NORM_ACTIONS, Fore.RED + f"Invalid gradient norm action, avaible actions: {GRADIENT_NORM_ACTIONS}" + Fore.RESET
+    assert len(norm_limits) == 2, Fore.RED + "Gradient norm limits must be (min, max) pair" + Fore.RESET
+
+    self.__tensorboard = tensorboard
+    self.__norm_limits = norm_limits
+    self.__action = action
+    self.__check_start_episode = check_start_episode
+    self.__per_layer = per_layer
+
+    # Name of optimizer -> (global norm variable, {layer name: layer norm variable})
+    self.__norm_variables = {}
+    # Requested episodes, None stops thread
+    self.__queue = Queue(maxsize=1)
+
+    self.checkpoint_requested = False
+    self.halt_requested = False
+
+    self.start()
+
+  def terminate(self):
+    self.__queue.put(None)
+
+  # Add norm computation to all training functions that will be built from this optimizer
+  # Optimizer is wrapped only once, monitors of later trainings read norm variables of first one
+  def watch(self, optimizer:Optimizer, name:str):
+    assert name not in self.__norm_variables, Fore.RED + f"Optimizer {name} is already watched" + Fore.RESET
+
+    if hasattr(optimizer, "_gradient_norm_variables"):
+      self.__norm_variables[name] = optimizer._gradient_norm_variables
+      return
+
+    # Negative value marks norm that was not computed yet
+    global_norm = K.variable(-1, dtype="float32", name=f"{name}_gradient_norm")
+    layer_norms = {}
+    per_layer = self.__per_layer
+    self.__norm_variables[name] = optimizer._gradient_norm_variables = (global_norm, layer_norms)
+
+    original_get_gradients = optimizer.get_gradients
+    original_get_updates = optimizer.get_updates
+    last_gradients = {}
+
+    def get_gradients(loss, params):
+      grads = original_get_gradients(loss, params)
+      last_gradients["value"] = grads
+      return grads
+
+    def get_updates(loss, params):
+      updates = original_get_updates(loss=loss, params=params)
+      squared_sums = [K.sum(K.square(K.cast(g, "float32"))) for g in last_gradients.pop("value")]
+      updates = updates + [K.update(global_norm, K.sqrt(tf.add_n(squared_sums)))]
+
+      if per_layer:
+        # Weights are grouped to layers by name scope of variable (conv2d_1/kernel:0 -> conv2d_1)
+        layer_squared_sums = {}
+        for param, squared_sum in zip(params, squared_sums):
+          layer_squared_sums.setdefault(param.name.split(":")[0].rsplit("/", 1)[0], []).append(squared_sum)
+
+        for layer_name, sums in layer_squared_sums.items():
+          if layer_name not in layer_norms: layer_norms[layer_name] = K.variable(-1, dtype="float32", name=f"{name}_gradient_norm_{layer_name.replace('/', '_')}")
+          updates.append(K.update(layer_norms[layer_name], K.sqrt(tf.add_n(sums))))
+      return updates
+
+    optimizer.get_gradients = get_gradients
+    optimizer.get_updates = get_updates
+
+  # Request reading of norms after given episode, never blocks (request made while previous one is still waiting is skipped)
+  def check(self, episode:int):
+    try:
+      self.__queue.put_nowait(episode)
+    except Full:
+      pass
+
+  def __check_norm(self, name:str, norm:float, episode:int):
+    if episode < self.__check_start_episode: return
+
+    min_norm, max_norm = self.__norm_limits
+    if max_norm is not None and norm > max_norm: message = "too high"
+    elif min_norm is not None and norm < min_norm: message = "vanished"
+    else: return
+
+    print(Fore.RED + f"Gradient of {name} {message}! Current norm: {norm} (episode {episode})" + Fore.RESET)
+    if self.__action == "checkpoint": self.checkpoint_requested = True
+    elif self.__action == "halt": self.halt_requested = True
+
+  def __process_request(self, episode:int):
+    stats = {}
+    for name, (global_norm, layer_norms) in list(self.__norm_variables.items()):
+      layer_items = list(layer_norms.items())
+      values = K.batch_get_value([global_norm] + [variable for _, variable in layer_items])
+      if values[0] < 0: continue
+
+      stats[f"{name}_grad_norm"] = float(values[0])
+      for (layer_name, _), value in zip(layer_items, values[1:]):
+        if value >= 0: stats[f"{name}_layer_grad_norm/{layer_name}"] = float(value)
+
+      self.__check_norm(name, float(values[0]), episode)
+
+    if self.__tensorboard is not None and stats: self.__tensorboard._write_logs(stats, episode)
+
+  def run(self) -> None:
+    while True:
+      episode = self.__queue.get()
+      if episode is None: break
+      self.__process_request(episode)
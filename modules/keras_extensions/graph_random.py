@@ -0,0 +1,42 @@
+import numpy as np
+import tensorflow as tf
+import keras.backend as K
+from typing import Union
+
+class GraphRandom:
+  """
+  Seeded stateless random tensors (latent noise, labels) generated directly in training graph
+  Every created tensor has its own stream and counter variable that is advanced each time tensor is evaluated,
+  so values differ between training steps but whole run is reproducible for same seed
+  """
+
+  def __init__(self, seed:Union[int, None]=None):
+    self.seed = int(seed) if seed is not None else int(np.random.randint(0, 2 ** 31 - 1))
+    self.counters = []
+
+  def __next_seed(self):
+    stream_index = len(self.counters)
+    counter = K.variable(0, dtype="int64", name=f"graph_random_counter_{stream_index}")
+    self.counters.append(counter)
+
+    # Counter is incremented when tensor is evaluated so each evaluation gets new seed
+    return tf.stack([tf.constant(self.seed * 2 ** 16 + stream_index, dtype=tf.int64), K.update_add(counter, 1)])
+
+  def normal(self, shape, mean:float=0.0, stddev:float=1.0):
+    return tf.random.stateless_normal(shape, seed=self.__next_seed(), mean=mean, stddev=stddev, dtype=tf.float32)
+
+  def uniform(self, shape, minval:float=0.0, maxval:float=1.0):
+    return tf.random.stateless_uniform(shape, seed=self.__next_seed(), minval=minval, maxval=maxval, dtype=tf.float32)
+
+  # Labels with constant value or uniformly sampled from smooth range
+  def labels(self, shape, value:float, smooth_range:Union[tuple, None]=None):
+    if smooth_range is None: return K.constant(value, dtype="float32", shape=shape)
+    return self.uniform(shape, smooth_range[0], smooth_range[1])
+
+  # Flip labels (label -> |1 - label|) with given probability (float or scalar variable)
+  def flip_labels(self, labels, probability):
+    return tf.where(self.uniform(K.shape(labels)) < probability, K.abs(1 - labels), labels)
+
+  # Add uniform noise from range (0, amount) to labels (amount can be float or scalar variable)
+  def shift_labels(self, labels, amount):
+    return labels + self.uniform(K.shape(labels)) * amount
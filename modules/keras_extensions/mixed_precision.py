@@ -0,0 +1,77 @@
+import tensorflow as tf
+import keras.backend as K
+from keras.optimizers import Optimizer
+from colorama import Fore
+from typing import Union
+
+from tensorflow.core.protobuf import rewriter_config_pb2
+from tensorflow.python.framework.test_util import IsMklEnabled
+
+MIXED_PRECISION_MODES = ["float16", "bfloat16"]
+# Grappler rewrite option of each mode
+MIXED_PRECISION_REWRITE_OPTIONS = {"float16": "auto_mixed_precision", "bfloat16": "auto_mixed_precision_mkl"}
+
+def enable_mixed_precision(mode:Union[str, None]):
+  """
+  Enable tensorflow graph rewrite that runs compute heavy ops (conv, matmul) in lower precision
+  Variables stay float32 so they act as master weights, numerically sensitive ops (sum, mean, exp, log, softmax) are kept in float32 by the rewrite
+  float16 is intended for GPUs with tensor cores and needs loss scaling, bfloat16 for CPUs with AVX512_BF16/AMX support (oneDNN build of tensorflow)
+  """
+  if mode is None: return False
+  assert mode in MIXED_PRECISION_MODES, Fore.RED + f"Invalid mixed precision mode, avaible modes: {MIXED_PRECISION_MODES}" + Fore.RESET
+
+  # set_experimental_options silently ignores options unknown to installed tensorflow, so rewrite must be checked in grappler config itself
+  # (bfloat16 rewrite "auto_mixed_precision_mkl" exists only since tensorflow 2.3 and works only in oneDNN builds)
+  option = MIXED_PRECISION_REWRITE_OPTIONS[mode]
+  if option not in rewriter_config_pb2.RewriterConfig.DESCRIPTOR.fields_by_name:
+    raise Exception(Fore.RED + f"Installed tensorflow {tf.__version__} doesnt support {mode} mixed precision rewrite ({option})" + Fore.RESET)
+  if mode == "bfloat16" and not IsMklEnabled():
+    raise Exception(Fore.RED + "bfloat16 mixed precision needs tensorflow build with oneDNN (MKL) enabled" + Fore.RESET)
+
+  # Options are read back from grappler config so option that tensorflow doesnt map to rewrite is caught too
+  tf.config.optimizer.set_experimental_options({option: True})
+  if not tf.config.optimizer.get_experimental_options().get(option, False):
+    raise Exception(Fore.RED + f"Failed to enable {mode} mixed precision rewrite" + Fore.RESET)
+
+  print(Fore.MAGENTA + f"Mixed precision {mode} enabled" + Fore.RESET)
+  return True
+
+def add_loss_scaling(optimizer:Optimizer, initial_scale:float=2 ** 15, growth_interval:int=2_000):
+  """
+  Add dynamic loss scaling to keras optimizer (needed for float16, bfloat16 has same range as float32)
+  Loss is multiplied by loss scale before computing gradients and gradients are divided by it after
+  When gradients overflow they are zeroed for that step and scale is halved, after growth_interval finite steps scale is doubled
+  """
+  assert not hasattr(optimizer, "clipnorm") and not hasattr(optimizer, "clipvalue"), Fore.RED + "Loss scaling cant be used with gradient clipping" + Fore.RESET
+
+  with K.name_scope(optimizer.__class__.__name__):
+    loss_scale = K.variable(initial_scale, dtype="float32", name="loss_scale")
+    good_steps = K.variable(0, dtype="int64", name="loss_scale_good_steps")
+
+  original_get_gradients = optimizer.get_gradients
+  original_get_updates = optimizer.get_updates
+  grads_finite = {}
+
+  def get_gradients(loss, params):
+    grads = original_get_gradients(K.cast(loss, "float32") * loss_scale, params)
+    grads = [g / K.cast(loss_scale, g.dtype) for g in grads]
+
+    finite = tf.reduce_all([tf.reduce_all(tf.math.is_finite(g)) for g in grads])
+    grads_finite["value"] = finite
+    return [tf.where(finite, g, tf.zeros_like(g)) for g in grads]
+
+  def get_updates(loss, params):
+    updates = original_get_updates(loss=loss, params=params)
+    finite = grads_finite["value"]
+
+    with tf.control_dependencies(updates):
+      new_good_steps = tf.where(finite, good_steps + 1, tf.zeros_like(good_steps))
+      grow = new_good_steps >= growth_interval
+      new_loss_scale = tf.where(finite, tf.where(grow, loss_scale * 2, loss_scale), tf.maximum(loss_scale / 2, 1.0))
+      updates = updates + [K.update(loss_scale, new_loss_scale), K.update(good_steps, tf.where(grow, tf.zeros_like(good_steps), new_good_steps))]
+    return updates
+
+  optimizer.get_gradients = get_gradients
+  optimizer.get_updates = get_updates
+  optimizer.loss_scale = loss_scale
+  return optimizer
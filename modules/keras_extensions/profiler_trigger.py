@@ -0,0 +1,96 @@
+import os
+import time
+import signal
+import tensorflow as tf
+from colorama import Fore
+from typing import Union
+
+class ProfilerTrigger:
+  """
+  Captures tf.profiler trace of next episodes of running training when requested, trace is written to tensorboard log directory (profile tab)
+  Trace is requested by start episode from settings, by creating sentinel file (its content can set number of traced episodes, file is removed when trace starts) or by SIGUSR1 signal
+  Sentinel file is checked only every check_interval seconds and signal only sets flag so untriggered trigger costs almost nothing
+  """
+
+  def __init__(self, log_dir:str, sentinel_path:str, trace_episodes:int=10, start_episode:Union[int, None]=None, check_interval:float=5.0):
+    assert trace_episodes >= 1, Fore.RED + "Invalid number of traced episodes" + Fore.RESET
+
+    self.__log_dir = log_dir
+    self.__sentinel_path = sentinel_path
+    self.__trace_episodes = trace_episodes
+    self.__start_episode = start_episode
+    self.__check_interval = check_interval
+
+    self.__requested_episodes = None
+    self.__trace_end_episode = None
+    self.__last_check_time = time.time()
+
+    # Signal handlers can be set only from main thread and SIGUSR1 is not avaible on all platforms
+    self.__previous_signal_handler = None
+    if hasattr(signal, "SIGUSR1"):
+      try:
+        self.__previous_signal_handler = signal.signal(signal.SIGUSR1, self.__signal_handler)
+      except ValueError:
+        pass
+
+  def __signal_handler(self, signum, frame):
+    self.__requested_episodes = self.__trace_episodes
+
+  def __check_sentinel(self):
+    if not os.path.exists(self.__sentinel_path): return
+
+    try:
+      with open(self.__sentinel_path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+      self.__requested_episodes = int(content) if content.isdigit() and int(content) > 0 else self.__trace_episodes
+      os.remove(self.__sentinel_path)
+    except OSError as e:
+      print(Fore.YELLOW + f"Failed to read profiler trace request\n{e}" + Fore.RESET)
+
+  # Called by training loop before each training step with current episode
+  def update(self, episode:int):
+    if self.__trace_end_episode is not None:
+      if episode >= self.__trace_end_episode: self.__stop(episode)
+      return
+
+    if self.__start_episode is not None and episode >= self.__start_episode:
+      self.__start_episode = None
+      self.__requested_episodes = self.__trace_episodes
+
+    now = time.time()
+    if now - self.__last_check_time >= self.__check_interval:
+      self.__last_check_time = now
+      self.__check_sentinel()
+
+    if self.__requested_episodes is not None:
+      self.__start(episode, self.__requested_episodes)
+      self.__requested_episodes = None
+
+  def __start(self, episode:int, num_of_episodes:int):
+    try:
+      tf.profiler.experimental.start(self.__log_dir)
+    except Exception as e:
+      print(Fore.YELLOW + f"Failed to start profiler trace\n{e}" + Fore.RESET)
+      return
+
+    self.__trace_end_episode = episode + num_of_episodes
+    print(Fore.MAGENTA + f"Capturing profiler trace of episodes {episode} - {self.__trace_end_episode}" + Fore.RESET)
+
+  def __stop(self, episode:int):
+    self.__trace_end_episode = None
+    try:
+      tf.profiler.experimental.stop()
+      print(Fore.MAGENTA + f"Profiler trace saved to {self.__log_dir} (episode {episode})" + Fore.RESET)
+    except Exception as e:
+      print(Fore.YELLOW + f"Failed to save profiler trace\n{e}" + Fore.RESET)
+
+  # Stop running trace and restore previous signal handler
+  def close(self, episode:int):
+    if self.__trace_end_episode is not None: self.__stop(episode)
+
+    if self.__previous_signal_handler is not None:
+      try:
+        signal.signal(signal.SIGUSR1, self.__previous_signal_handler)
+      except ValueError:
+        pass
+      self.__previous_signal_handler = None
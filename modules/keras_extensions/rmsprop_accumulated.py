@@ -0,0 +1,55 @@
+import keras.backend as K
+from keras.optimizers import RMSprop
+from colorama import Fore
+
+class KerasRMSpropAccumulated(RMSprop):
+  """
+  RMSprop optimizer with gradient accumulation for standalone Keras models (counterpart of KerasAdamAccumulated)
+  Gradients from accumulation_steps consecutive batches are averaged and applied as one update with same rule as keras RMSprop, iterations counts batches, not updates
+  """
+
+  def __init__(self, accumulation_steps:int=1, learning_rate:float=0.001, rho:float=0.9, **kwargs):
+    super(KerasRMSpropAccumulated, self).__init__(learning_rate=learning_rate, rho=rho, **kwargs)
+    assert accumulation_steps >= 1, Fore.RED + "Invalid number of accumulation steps" + Fore.RESET
+    self.accumulation_steps = accumulation_steps
+
+  @K.symbolic
+  def get_updates(self, loss, params):
+    grads = self.get_gradients(loss, params)
+    self.updates = [K.update_add(self.iterations, 1)]
+
+    update_cond = K.equal((self.iterations + 1) % self.accumulation_steps, 0)
+    first_sub_step = K.equal(self.iterations % self.accumulation_steps, 0)
+    local_step = self.iterations // self.accumulation_steps
+
+    lr = self.learning_rate
+    if self.initial_decay > 0:
+      lr = lr * (1. / (1. + self.decay * K.cast(local_step, K.dtype(self.decay))))
+
+    accumulators = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='accumulator_' + str(i)) for (i, p) in enumerate(params)]
+    gs = [K.zeros(K.int_shape(p), dtype=K.dtype(p), name='g_' + str(i)) for (i, p) in enumerate(params)]
+    self.weights = [self.iterations] + accumulators + gs
+
+    for p, g, a, ga in zip(params, grads, accumulators, gs):
+      # Sum gradients of sub steps, accumulator starts from zero on first sub step
+      ga_t = K.switch(first_sub_step, g, ga + g)
+      g_t = ga_t / self.accumulation_steps
+
+      a_t = K.switch(update_cond, self.rho * a + (1. - self.rho) * K.square(g_t), a)
+      p_t = p - lr * g_t / (K.sqrt(a_t) + self.epsilon)
+
+      self.updates.append(K.update(ga, ga_t))
+      self.updates.append(K.update(a, a_t))
+      new_p = K.switch(update_cond, p_t, p)
+
+      # Apply constraints
+      if getattr(p, 'constraint', None) is not None:
+        new_p = p.constraint(new_p)
+
+      self.updates.append(K.update(p, new_p))
+    return self.updates
+
+  def get_config(self):
+    config = {'accumulation_steps': self.accumulation_steps}
+    base_config = super(KerasRMSpropAccumulated, self).get_config()
+    return dict(list(base_config.items()) + list(config.items()))
@@ -54,9 +54,10 @@ class ConvSN2D(Conv2D):
 
     def power_iteration(W, u):
       # Accroding the paper, we only need to do power iteration one time.
+      # Vector-matrix products are broadcasted multiply and sum instead of MatMul, so mixed precision rewrite keeps them in float32
       _u = u
-      _v = _l2normalize(K.dot(_u, K.transpose(W)))
-      _u = _l2normalize(K.dot(_v, W))
+      _v = _l2normalize(K.transpose(K.sum(W * _u, axis=1, keepdims=True)))
+      _u = _l2normalize(K.sum(K.transpose(_v) * W, axis=0, keepdims=True))
       return _u, _v
 
     # Spectral Normalization
@@ -64,9 +65,8 @@ class ConvSN2D(Conv2D):
     # Flatten the Tensor
     W_reshaped = K.reshape(self.kernel, [-1, W_shape[-1]])
     _u, _v = power_iteration(W_reshaped, self.u)
-    # Calculate Sigma
-    sigma = K.dot(_v, W_reshaped)
-    sigma = K.dot(sigma, K.transpose(_u))
+    # Calculate Sigma (v * W * u^T in float32)
+    sigma = K.sum(K.transpose(_v) * W_reshaped * _u, keepdims=True)
     # normalize it
     W_bar = W_reshaped / sigma
     # reshape weight tensor
@@ -166,18 +166,18 @@ class ConvSN2DTranspose(Conv2DTranspose):
 
     def power_iteration(W, u):
       # Accroding the paper, we only need to do power iteration one time.
+      # Vector-matrix products are broadcasted multiply and sum instead of MatMul, so mixed precision rewrite keeps them in float32
       _u = u
-      _v = _l2normalize(K.dot(_u, K.transpose(W)))
-      _u = _l2normalize(K.dot(_v, W))
+      _v = _l2normalize(K.transpose(K.sum(W * _u, axis=1, keepdims=True)))
+      _u = _l2normalize(K.sum(K.transpose(_v) * W, axis=0, keepdims=True))
       return _u, _v
 
     W_shape = self.kernel.shape.as_list()
     # Flatten the Tensor
     W_reshaped = K.reshape(self.kernel, [-1, W_shape[-1]])
     _u, _v = power_iteration(W_reshaped, self.u)
-    # Calculate Sigma
-    sigma = K.dot(_v, W_reshaped)
-    sigma = K.dot(sigma, K.transpose(_u))
+    # Calculate Sigma (v * W * u^T in float32)
+    sigma = K.sum(K.transpose(_v) * W_reshaped * _u, keepdims=True)
     # normalize it
     W_bar = W_reshaped / sigma
     # reshape weight tensor
@@ -0,0 +1,59 @@
+import numpy as np
+import keras.backend as K
+from keras.models import Model
+from typing import Union
+
+class SharedOptimizerSlots:
+  """
+  Slot variables of keras optimizer shared between multiple train functions updating same weights
+  Keras optimizers create slots (by K.zeros) in every get_updates call, first call inside this context records them and next calls reuse them
+  """
+
+  def __init__(self):
+    self.slots = None
+    self.__original_zeros = None
+    self.__slots_iterator = None
+
+  def __zeros(self, *args, **kwargs):
+    if self.__slots_iterator is not None: return next(self.__slots_iterator)
+    slot = self.__original_zeros(*args, **kwargs)
+    self.slots.append(slot)
+    return slot
+
+  def __enter__(self):
+    if self.slots is None:
+      self.slots = []
+      self.__slots_iterator = None
+    else:
+      self.__slots_iterator = iter(self.slots)
+
+    self.__original_zeros = K.zeros
+    K.zeros = self.__zeros
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    K.zeros = self.__original_zeros
+
+class TrainStep:
+  """
+  Direct call of training function of compiled keras model
+  Skips input standardization of train_on_batch and reuses preallocated sample weights, so python overhead per step is minimal
+  Inputs must be already in final form (list of float32 arrays with batch_size samples), inputs and targets created from tensors are not fed
+  """
+
+  def __init__(self, model:Model, batch_size:int, optimizer_slots:Union[SharedOptimizerSlots, None]=None):
+    self.__model = model
+    if optimizer_slots is not None:
+      with optimizer_slots:
+        self.__model._make_train_function()
+    else:
+      self.__model._make_train_function()
+
+    self.__sample_weights = [np.ones((batch_size,), dtype=np.float32) for _ in self.__model._feed_sample_weights]
+    self.__learning_phase = [1] if self.__model._uses_dynamic_learning_phase() else []
+    self.__reset_metrics = len(self.__model._get_training_eval_metrics()) > 0
+
+  def __call__(self, x:list, y:list):
+    outputs = self.__model.train_function(x + y + self.__sample_weights + self.__learning_phase)
+    if self.__reset_metrics: self.__model.reset_metrics()
+    return outputs[0] if len(outputs) == 1 else outputs
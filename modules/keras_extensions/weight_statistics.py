@@ -0,0 +1,87 @@
+import numpy as np
+import keras.backend as K
+from queue import Queue, Full
+from threading import Thread
+from colorama import Fore
+from typing import Union
+
+from .custom_tensorboard import TensorBoardCustom
+
+class WeightStatistics(Thread):
+  """
+  Compact statistics of model weights (moments, norms and quantiles) logged to tensorboard on background thread (replacement of full weight histograms)
+  Training thread only copies weights to host memory in one batched read, statistics are computed and written by worker
+  Quantiles and histograms of large tensors are computed from fixed size random sample of their values
+  Request made while previous one is still processed is skipped so logging never blocks training
+  """
+
+  def __init__(self, tensorboard:Union[TensorBoardCustom, None], max_samples:int=2 ** 16, quantiles:tuple=(1, 25, 50, 75, 99), histograms:bool=True):
+    super(WeightStatistics, self).__init__()
+    self.daemon = True
+
+    assert max_samples >= 1, Fore.RED + "Invalid number of sampled weight values" + Fore.RESET
+
+    self.__tensorboard = tensorboard
+    self.__max_samples = max_samples
+    self.__quantiles = quantiles
+    self.__histograms = histograms
+
+    self.__random = np.random.RandomState()
+    self.__queue = Queue(maxsize=1)
+
+    self.start()
+
+  # Request logging of weights of models ({model name: model}) at step, returns False when request was skipped
+  def log(self, models:dict, step:int) -> bool:
+    if self.__queue.full(): return False
+
+    weights = [(model_name, weight) for model_name, model in models.items() for weight in model.weights]
+    values = K.batch_get_value([weight for _, weight in weights])
+
+    try:
+      self.__queue.put_nowait((step, [(f"{model_name}/{weight.name.replace(':', '_')}", value) for (model_name, weight), value in zip(weights, values)]))
+    except Full:
+      return False
+    return True
+
+  # Block until requested statistics are written
+  def flush(self):
+    self.__queue.join()
+
+  def __summarize(self, name:str, values:np.ndarray) -> tuple:
+    values = values.reshape(-1).astype(np.float32)
+    sample = values if values.size <= self.__max_samples else values[self.__random.randint(0, values.size, self.__max_samples)]
+
+    stats = {
+      f"weights/{name}/mean": float(np.mean(values)),
+      f"weights/{name}/std": float(np.std(values)),
+      f"weights/{name}/min": float(np.min(values)),
+      f"weights/{name}/max": float(np.max(values)),
+      f"weights/{name}/l2_norm": float(np.sqrt(np.sum(np.square(values, dtype=np.float64))))
+    }
+    for quantile, value in zip(self.__quantiles, np.percentile(sample, self.__quantiles)):
+      stats[f"weights/{name}/p{quantile}"] = float(value)
+    return stats, sample
+
+  def __write(self, step:int, weights:list):
+    stats = {}
+    histograms = []
+    for name, values in weights:
+      if values.size == 0: continue
+
+      weight_stats, sample = self.__summarize(name, values)
+      stats.update(weight_stats)
+      if self.__histograms: histograms.append((f"weights/{name}", sample))
+
+    if self.__tensorboard is not None:
+      if stats: self.__tensorboard._write_logs(stats, step)
+      if histograms: self.__tensorboard.write_histograms(histograms, step)
+
+  def run(self) -> None:
+    while True:
+      step, weights = self.__queue.get()
+      try:
+        self.__write(step, weights)
+      except Exception as e:
+        print(Fore.RED + f"Failed to log weight statistics of step {step}\n{e}" + Fore.RESET)
+      self.__queue.task_done()
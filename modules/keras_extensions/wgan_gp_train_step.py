@@ -0,0 +1,191 @@
+import time
+import tensorflow as tf
+import keras.backend as K
+from keras.models import Model
+from keras.optimizers import Optimizer
+from statistics import mean
+from typing import Union
+from colorama import Fore
+
+from .custom_losses import gradient_penalty_loss, r1_penalty_loss
+from .train_step import SharedOptimizerSlots
+from .graph_random import GraphRandom
+
+PENALTY_TYPES = ["wgan-gp", "r1"]
+
+class WGANGPTrainStep:
+  """
+  One compiled function for one or more WGAN-GP episodes (all critic updates followed by generator updates in every episode)
+  Latent noise and interpolation weights are sampled on device, only real image batches are fed from host
+  Updates are unrolled and chained with control dependencies so every step sees weights updated by previous one
+
+  Penalty can be computed only every penalty_interval critic steps with weight scaled by interval (lazy regularization)
+  and/or only on penalty_subsample part of batch, penalty_type selects between WGAN-GP and R1 (gradient on real images)
+  When any of these is used calibration_calls calls run with full penalty at start and then every recalibration_interval calls to measure time saved by them
+  """
+
+  def __init__(self, generator:Model, critic:Model,
+               generator_optimizer:Optimizer, critic_optimizer:Optimizer,
+               generator_params:list, critic_params:list,
+               latent_dim:int, image_shape:tuple,
+               critic_steps:int=5, generator_steps:int=1, episodes:int=1, gradient_penalty_weight:float=10,
+               penalty_type:str="wgan-gp", penalty_interval:int=1, penalty_subsample:float=1.0, calibration_calls:int=10, recalibration_interval:Union[int, None]=1_000,
+               graph_random:GraphRandom=None, generator_optimizer_slots:SharedOptimizerSlots=None, critic_optimizer_slots:SharedOptimizerSlots=None):
+    assert critic_steps >= 1 and generator_steps >= 1 and episodes >= 1, Fore.RED + "Invalid number of steps" + Fore.RESET
+    assert penalty_type in PENALTY_TYPES, Fore.RED + f"Invalid penalty type, avaible types: {PENALTY_TYPES}" + Fore.RESET
+    assert penalty_interval >= 1, Fore.RED + "Invalid penalty interval" + Fore.RESET
+    assert 0 < penalty_subsample <= 1, Fore.RED + "Invalid penalty subsample" + Fore.RESET
+    assert recalibration_interval is None or recalibration_interval >= 1, Fore.RED + "Invalid recalibration interval" + Fore.RESET
+
+    self.__generator = generator
+    self.__critic = critic
+    self.__generator_optimizer = generator_optimizer
+    self.__critic_optimizer = critic_optimizer
+    self.__generator_params = generator_params
+    self.__critic_params = critic_params
+    self.__critic_steps = critic_steps
+    self.__generator_steps = generator_steps
+    self.__gradient_penalty_weight = gradient_penalty_weight
+    self.__penalty_type = penalty_type
+    self.__penalty_interval = penalty_interval
+    self.__penalty_subsample = penalty_subsample
+    self.__graph_random = graph_random if graph_random is not None else GraphRandom()
+
+    self.__real_image_inputs = [K.placeholder(shape=(None, *image_shape), dtype="float32", name=f"wgan_gp_real_images_{idx}") for idx in range(episodes * critic_steps)]
+    self.__learning_phase = [] if isinstance(K.learning_phase(), int) else [1]
+
+    # Random streams are created once and shared by functions of all penalty patterns and numbers of episodes,
+    # so number of random generator counters (saved in checkpoint) doesnt depend on which functions were built
+    self.__critic_noise = [self.__graph_random.normal((K.shape(real_images)[0], latent_dim)) for real_images in self.__real_image_inputs]
+    self.__penalty_weights = [self.__graph_random.uniform((K.shape(real_images)[0], 1, 1, 1)) for real_images in self.__real_image_inputs] if penalty_type == "wgan-gp" else None
+    self.__generator_noise = [self.__graph_random.normal((K.shape(self.__real_image_inputs[0])[0], latent_dim)) for _ in range(episodes * generator_steps)]
+
+    # Slot variables of optimizers created by first step are reused by following steps and functions
+    self.__critic_slots = critic_optimizer_slots if critic_optimizer_slots is not None else SharedOptimizerSlots()
+    self.__generator_slots = generator_optimizer_slots if generator_optimizer_slots is not None else SharedOptimizerSlots()
+
+    # Functions are built lazily for each pattern of penalized critic steps (its length selects number of episodes)
+    self.__functions = {}
+    self.__called_functions = set()
+    self.__critic_step_counter = 0
+
+    self.__regularized = self.__penalty_interval > 1 or self.__penalty_subsample < 1
+    self.__calibration_calls = calibration_calls if self.__regularized else 0
+    self.__recalibration_calls = calibration_calls
+    self.__recalibration_interval = recalibration_interval
+    self.__calls_since_calibration = 0
+    self.__calibration_durations = []
+    self.__full_penalty_duration = None
+
+    # Seconds saved by lazy/subsampled penalty in last call compared to full penalty (None when not known or when call trained less episodes)
+    self.time_saved = None
+
+  def __critic_update(self, idx:int, penalize:bool, penalty_scale:float, penalty_subsample:float, updates:list) -> tuple:
+    real_images = self.__real_image_inputs[idx]
+    with tf.control_dependencies(updates):
+      batch_size = K.shape(real_images)[0]
+      fake_images = self.__generator(self.__critic_noise[idx])
+      valid_out = self.__critic(real_images)
+      # Critic is called on multiple inputs in step, updates of its layers (batch normalization statistics) are collected for all of them
+      critic_inputs = [real_images, fake_images]
+
+      # Real images are labeled -1 and fake 1 (same as wasserstein_loss with labels of trainer)
+      loss = K.mean(self.__critic(fake_images)) - K.mean(valid_out)
+
+      if penalize:
+        # With lazy regularization penalty is applied only every penalty_interval steps so its weight is scaled by it
+        penalty_weight = self.__gradient_penalty_weight * penalty_scale
+        penalty_size = batch_size if penalty_subsample == 1 else K.maximum(K.cast(K.cast(batch_size, "float32") * penalty_subsample, "int32"), 1)
+
+        if self.__penalty_type == "wgan-gp":
+          # Random weighted average between real and generated images
+          weights = self.__penalty_weights[idx][:penalty_size]
+          averaged_samples = (weights * real_images[:penalty_size]) + ((1 - weights) * fake_images[:penalty_size])
+          loss += penalty_weight * gradient_penalty_loss(None, self.__critic(averaged_samples), averaged_samples)
+          critic_inputs.append(averaged_samples)
+        else:
+          if penalty_subsample == 1:
+            loss += penalty_weight * r1_penalty_loss(None, valid_out, real_images)
+          else:
+            real_samples = real_images[:penalty_size]
+            loss += penalty_weight * r1_penalty_loss(None, self.__critic(real_samples), real_samples)
+            critic_inputs.append(real_samples)
+
+      for reg_loss in self.__critic.get_losses_for(None): loss += reg_loss
+
+      with self.__critic_slots:
+        step_updates = self.__critic_optimizer.get_updates(loss=loss, params=self.__critic_params)
+      return loss, step_updates + [update for critic_input in critic_inputs for update in self.__critic.get_updates_for(critic_input)]
+
+  def __build_function(self, penalty_mask:tuple, penalty_scale:float, penalty_subsample:float):
+    updates = []
+    critic_losses = []
+    generator_losses = []
+    for episode in range(len(penalty_mask) // self.__critic_steps):
+      for idx in range(episode * self.__critic_steps, (episode + 1) * self.__critic_steps):
+        loss, updates = self.__critic_update(idx, penalty_mask[idx], penalty_scale, penalty_subsample, updates)
+        critic_losses.append(loss)
+
+      for noise in self.__generator_noise[episode * self.__generator_steps:(episode + 1) * self.__generator_steps]:
+        with tf.control_dependencies(updates):
+          loss = -K.mean(self.__critic(self.__generator(noise)))
+          for reg_loss in self.__generator.get_losses_for(None): loss += reg_loss
+
+          with self.__generator_slots:
+            step_updates = self.__generator_optimizer.get_updates(loss=loss, params=self.__generator_params)
+          updates = step_updates + self.__generator.get_updates_for(noise)
+          generator_losses.append(loss)
+
+    inputs = self.__real_image_inputs[:len(penalty_mask)]
+    if self.__learning_phase: inputs.append(K.learning_phase())
+
+    return K.function(inputs, [K.mean(K.stack(critic_losses)), K.mean(K.stack(generator_losses))], updates=updates)
+
+  # Key of function used by next call (penalty mask, penalty scale, penalty subsample)
+  def __next_key(self, critic_steps:int) -> tuple:
+    if self.__calibration_calls > 0: return (True,) * critic_steps, 1, 1.0
+    return tuple((self.__critic_step_counter + idx) % self.__penalty_interval == 0 for idx in range(critic_steps)), self.__penalty_interval, self.__penalty_subsample
+
+  # Build function for full number of episodes used by next call ahead of training (creates optimizer slots so their state can be restored before first call)
+  def build(self):
+    key = self.__next_key(len(self.__real_image_inputs))
+    if key not in self.__functions: self.__functions[key] = self.__build_function(*key)
+
+  # Train on critic_steps image batches for every trained episode (up to episodes), returns (critic loss, generator loss) averaged over steps
+  def __call__(self, real_image_batches:list) -> tuple:
+    assert len(real_image_batches) % self.__critic_steps == 0 and 0 < len(real_image_batches) <= len(self.__real_image_inputs), Fore.RED + "Invalid number of image batches" + Fore.RESET
+    full_call = len(real_image_batches) == len(self.__real_image_inputs)
+
+    # Cost of full penalty changes during training so it is measured again after recalibration_interval calls
+    if self.__regularized and self.__recalibration_interval is not None and self.__calls_since_calibration >= self.__recalibration_interval:
+      self.__calibration_calls = self.__recalibration_calls
+      self.__calibration_durations = []
+      self.__full_penalty_duration = None
+      self.__calls_since_calibration = 0
+
+    calibrating = self.__calibration_calls > 0
+    if not calibrating: self.__calls_since_calibration += 1
+    key = self.__next_key(len(real_image_batches))
+    if calibrating: self.__calibration_calls -= 1
+    self.__critic_step_counter += len(real_image_batches)
+    self.time_saved = None
+
+    if key not in self.__functions: self.__functions[key] = self.__build_function(*key)
+    first_call = key not in self.__called_functions
+    self.__called_functions.add(key)
+
+    start_time = time.time()
+    critic_loss, generator_loss = self.__functions[key](real_image_batches + self.__learning_phase)
+    duration = time.time() - start_time
+
+    # First call of each function includes its graph setup so its not counted, durations are compared only for calls of all episodes
+    if not first_call and full_call:
+      if calibrating:
+        self.__calibration_durations.append(duration)
+      elif self.__regularized:
+        if self.__full_penalty_duration is None and self.__calibration_durations:
+          self.__full_penalty_duration = mean(self.__calibration_durations)
+        if self.__full_penalty_duration is not None:
+          self.time_saved = self.__full_penalty_duration - duration
+
+    return float(critic_loss), float(generator_loss)
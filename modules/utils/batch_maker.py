@@ -31,12 +31,14 @@ class BatchMaker(Thread):
     assert 0 <= missing_threshold_perc <= 1, Fore.RED + "Invalid missing threshold" + Fore.RESET
     self.__missing_threshold_number = int(self.__batches_in_buffer_number * missing_threshold_perc)
     self.__batches = deque(maxlen=self.__batches_in_buffer_number)
-    self.__resized_batches = deque(maxlen=self.__batches_in_buffer_number)
 
     self.__train_data = train_data
     self.__data_length = len(self.__train_data)
     assert self.__data_length > 0, Fore.RED + "Dataset is empty" + Fore.RESET
 
+    # Indexes of images in train data, shuffled instead of train data so index of each image stays stable
+    self.__data_indexes = np.arange(self.__data_length)
+
     self.__batch_size = batch_size
 
     self.__index = 0
@@ -61,19 +63,18 @@ class BatchMaker(Thread):
 
     self.__index = 0
     self.__batches.clear()
-    self.__resized_batches.clear()
     self.__lock = False
 
     while self.__lock_confirm:
       time.sleep(0.001)
 
-  def __make_batch(self, data):
-    if data is not None:
+  def __make_batch(self, data_indexes):
+    if data_indexes is not None:
       batch = []
       resized_batch = []
 
-      for im_p in data:
-        original_image = cv.imread(im_p)
+      for data_index in data_indexes:
+        original_image = cv.imread(self.__train_data[data_index])
 
         if self.__augmentation_settings:
           if random.random() >= self.__augmentation_settings.blur_chance:
@@ -91,23 +92,23 @@ class BatchMaker(Thread):
         if self.__secondary_size:
           resized_batch.append(cv.cvtColor(cv.resize(original_image, dsize=(self.__secondary_size[0], self.__secondary_size[1]), interpolation=(cv.INTER_AREA if (original_image.shape[0] > self.__secondary_size[1] and original_image.shape[1] > self.__secondary_size[0]) else cv.INTER_CUBIC)), cv.COLOR_BGR2RGB) / 127.5 - 1.0)
 
-      if batch: self.__batches.append(np.array(batch).astype(np.float32))
-      if resized_batch: self.__resized_batches.append(np.array(resized_batch).astype(np.float32))
+      # Batch, its resized version and indexes of used images are stored together so they cant get mixed between workers
+      if batch: self.__batches.append((np.array(batch).astype(np.float32), np.array(resized_batch).astype(np.float32) if resized_batch else None, data_indexes))
 
   def __make_data(self, data_ammount:int):
     data_array = []
     for _ in range(data_ammount):
-      data_array.append(np.array(self.__train_data)[range(self.__index * self.__batch_size, (self.__index + 1) * self.__batch_size)])
+      data_array.append(self.__data_indexes[self.__index * self.__batch_size:(self.__index + 1) * self.__batch_size])
 
       self.__index += 1
       if self.__index >= self.__max_index:
-        np.random.shuffle(self.__train_data)
+        np.random.shuffle(self.__data_indexes)
         self.__index = 0
 
     return data_array
 
   def run(self):
-    np.random.shuffle(self.__train_data)
+    np.random.shuffle(self.__data_indexes)
 
     while not self.__terminate:
       while self.__lock:
@@ -128,7 +129,15 @@ class BatchMaker(Thread):
 
   def get_batch(self) -> Union[np.ndarray, tuple]:
     while not self.__batches: time.sleep(0.01)
+    batch, resized_batch, _ = self.__batches.popleft()
+    if self.__secondary_size:
+      return batch, resized_batch
+    return batch
+
+  # Same as get_batch but indexes of images (position in train data) are returned as last item
+  def get_batch_with_indexes(self) -> tuple:
+    while not self.__batches: time.sleep(0.01)
+    batch, resized_batch, data_indexes = self.__batches.popleft()
     if self.__secondary_size:
-      while not self.__resized_batches: time.sleep(0.01)
-      return self.__batches.popleft(), self.__resized_batches.popleft()
-    return self.__batches.popleft()
\ No newline at end of file
+      return batch, resized_batch, data_indexes
+    return batch, data_indexes
\ No newline at end of file
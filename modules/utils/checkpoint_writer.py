@@ -0,0 +1,208 @@
+import os
+import json
+import copy
+import atexit
+import h5py
+import numpy as np
+import keras
+import keras.backend as K
+from keras.models import Model
+from keras.optimizers import Optimizer
+from keras.engine.saving import save_attributes_to_hdf5_group
+from threading import Thread, Condition
+from colorama import Fore
+from typing import Union
+
+# Variables holding state of optimizer (iterations, slots and loss scale), slots exist only after train function using optimizer is built
+def optimizer_state_variables(optimizer:Optimizer) -> list:
+  return list(optimizer.weights) + ([optimizer.loss_scale] if hasattr(optimizer, "loss_scale") else [])
+
+class CheckpointWriter(Thread):
+  """
+  Writes checkpoint files on background thread so training loop is not blocked by disk
+  Data are snapshotted to host memory when save is requested, every file is written to temp file, synced and atomically renamed over old one
+  Requests made while previous checkpoint is still being written are coalesced (newest data for each file wins), json files are written last
+  Training state (optimizer slots, label noise, random generator counters) is saved as named groups of variables in one h5 file
+  Other writes (tasks with already snapshotted data) can be submitted to run on same thread after pending files
+  Pending checkpoint is always flushed before interpreter exits
+  """
+
+  def __init__(self):
+    super(CheckpointWriter, self).__init__()
+    self.daemon = True
+
+    # Path -> (type of file, snapshotted data)
+    self.__pending = {}
+    self.__pending_tasks = []
+    self.__writing = False
+    self.__condition = Condition()
+
+    self.start()
+    atexit.register(self.flush)
+
+  # Copy of weights of model in host memory in same structure as saved by keras save_weights (one batched read from device)
+  @staticmethod
+  def snapshot_weights(model:Model) -> list:
+    weights = [layer.weights for layer in model.layers]
+    values = K.batch_get_value([w for layer_weights in weights for w in layer_weights])
+
+    snapshot = []
+    value_index = 0
+    for layer, layer_weights in zip(model.layers, weights):
+      weight_names = [str(w.name) if getattr(w, "name", None) else f"param_{idx}" for idx, w in enumerate(layer_weights)]
+      snapshot.append((layer.name, weight_names, values[value_index:value_index + len(layer_weights)]))
+      value_index += len(layer_weights)
+    return snapshot
+
+  # Copy of values of named groups of variables in host memory (one batched read from device), empty groups are skipped
+  @staticmethod
+  def snapshot_variables(variables:dict) -> dict:
+    variables = {name: list(group_variables) for name, group_variables in variables.items() if group_variables}
+    values = K.batch_get_value([v for group_variables in variables.values() for v in group_variables])
+
+    snapshot = {}
+    value_index = 0
+    for name, group_variables in variables.items():
+      snapshot[name] = values[value_index:value_index + len(group_variables)]
+      value_index += len(group_variables)
+    return snapshot
+
+  # Load values of named groups of variables from training state file and assign them to given variables
+  # Groups missing in file or with different number or shapes of variables are skipped, returns names of restored groups
+  @staticmethod
+  def restore_variables(path:str, variables:dict) -> list:
+    if not os.path.exists(path): return []
+
+    restored = []
+    assignments = []
+    with h5py.File(path, "r") as f:
+      for name, group_variables in variables.items():
+        if not group_variables: continue
+        if name not in f:
+          print(Fore.YELLOW + f"Training state {name} not found in checkpoint" + Fore.RESET)
+          continue
+
+        group = f[name]
+        values = [group[f"value_{idx}"][()] for idx in range(int(group.attrs["num_of_values"]))]
+        if len(values) != len(group_variables) or any(tuple(K.int_shape(v)) != value.shape for v, value in zip(group_variables, values)):
+          print(Fore.YELLOW + f"Training state {name} in checkpoint doesnt match current training setup, starting it from scratch" + Fore.RESET)
+          continue
+
+        assignments.extend(zip(group_variables, values))
+        restored.append(name)
+
+    K.batch_set_value(assignments)
+    return restored
+
+  # Request write of checkpoint files (models are saved as keras h5 weights, arrays as npy, variables as h5 training state and json data as json), returns immediately
+  def save(self, models:Union[dict, None]=None, arrays:Union[dict, None]=None, variables:Union[dict, None]=None, json_data:Union[dict, None]=None):
+    entries = {}
+    if models:
+      for path, model in models.items(): entries[path] = ("weights", self.snapshot_weights(model))
+    if variables:
+      for path, path_variables in variables.items(): entries[path] = ("variables", self.snapshot_variables(path_variables))
+    if arrays:
+      for path, array in arrays.items(): entries[path] = ("array", np.array(array, copy=True))
+    if json_data:
+      for path, data in json_data.items(): entries[path] = ("json", copy.deepcopy(data))
+
+    with self.__condition:
+      self.__pending.update(entries)
+      self.__condition.notify_all()
+
+  # Run function on writer thread (function must work only with data already copied to host memory)
+  def submit(self, task):
+    with self.__condition:
+      self.__pending_tasks.append(task)
+      self.__condition.notify_all()
+
+  # Block until all requested files are written
+  def flush(self):
+    with self.__condition:
+      while self.__pending or self.__pending_tasks or self.__writing:
+        self.__condition.wait(0.1)
+
+  # Write weights snapshot to h5 file in keras save_weights format (loadable by model.load_weights)
+  @staticmethod
+  def write_weights(file, snapshot:list):
+    with h5py.File(file, "w") as f:
+      save_attributes_to_hdf5_group(f, "layer_names", [layer_name.encode("utf8") for layer_name, _, _ in snapshot])
+      f.attrs["backend"] = K.backend().encode("utf8")
+      f.attrs["keras_version"] = str(keras.__version__).encode("utf8")
+
+      for layer_name, weight_names, weight_values in snapshot:
+        group = f.create_group(layer_name)
+        save_attributes_to_hdf5_group(group, "weight_names", [name.encode("utf8") for name in weight_names])
+        for name, value in zip(weight_names, weight_values):
+          dataset = group.create_dataset(name, value.shape, dtype=value.dtype)
+          if not value.shape: dataset[()] = value
+          else: dataset[:] = value
+
+  @staticmethod
+  def __write_variables(file, snapshot:dict):
+    with h5py.File(file, "w") as f:
+      for name, values in snapshot.items():
+        group = f.create_group(name)
+        group.attrs["num_of_values"] = len(values)
+        for idx, value in enumerate(values):
+          group.create_dataset(f"value_{idx}", data=value)
+
+  def __write_file(self, path:str, file_type:str, data):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory): os.makedirs(directory)
+    temp_path = path + ".tmp"
+
+    try:
+      if file_type == "weights":
+        self.write_weights(temp_path, data)
+      elif file_type == "variables":
+        self.__write_variables(temp_path, data)
+      elif file_type == "array":
+        with open(temp_path, "wb") as f:
+          np.save(f, data)
+      else:
+        with open(temp_path, "w", encoding="utf-8") as f:
+          json.dump(data, f)
+
+      # Data must be on disk before rename so renamed file is never partially written
+      with open(temp_path, "rb+") as f:
+        os.fsync(f.fileno())
+      os.replace(temp_path, path)
+
+      # Persist rename itself (not supported on all platforms)
+      try:
+        fd = os.open(directory if directory else ".", os.O_RDONLY)
+        try:
+          os.fsync(fd)
+        finally:
+          os.close(fd)
+      except OSError:
+        pass
+    except Exception as e:
+      print(Fore.RED + f"Failed to write checkpoint file {path}\n{e}" + Fore.RESET)
+      if os.path.exists(temp_path): os.remove(temp_path)
+
+  def run(self) -> None:
+    while True:
+      with self.__condition:
+        while not self.__pending and not self.__pending_tasks:
+          self.__condition.wait()
+        entries = self.__pending
+        tasks = self.__pending_tasks
+        self.__pending = {}
+        self.__pending_tasks = []
+        self.__writing = True
+
+      # Json files reference other files so they are written after them
+      for path, (file_type, data) in sorted(entries.items(), key=lambda entry: entry[1][0] == "json"):
+        self.__write_file(path, file_type, data)
+
+      for task in tasks:
+        try:
+          task()
+        except Exception as e:
+          print(Fore.RED + f"Failed to run checkpoint writer task\n{e}" + Fore.RESET)
+
+      with self.__condition:
+        self.__writing = False
+        self.__condition.notify_all()
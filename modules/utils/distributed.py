@@ -0,0 +1,149 @@
+import numpy as np
+import keras.backend as K
+from multiprocessing.connection import Listener, Client
+from colorama import Fore
+from typing import Union
+import time
+
+class WorkerGroup:
+  """
+  Group of training processes for data parallel training over plain TCP
+  Each worker trains on its own shard of dataset and weights (with optimizer states) are averaged every sync_interval episodes
+  Worker 0 is chief, collects weights from other workers, averages them and sends them back, only chief should write logs and checkpoints
+  When any worker dont respond in sync_timeout seconds or its connection is lost group is closed and exception is raised on all remaining workers
+  """
+
+  def __init__(self, num_of_workers:int, worker_index:int, chief_address:str="localhost:12355", sync_interval:int=10, authkey:bytes=b"gan_playground", connection_timeout:float=300, sync_timeout:float=600):
+    assert num_of_workers >= 1, Fore.RED + "Invalid number of workers" + Fore.RESET
+    assert 0 <= worker_index < num_of_workers, Fore.RED + "Invalid worker index" + Fore.RESET
+    assert sync_interval >= 1, Fore.RED + "Invalid sync interval" + Fore.RESET
+    assert sync_timeout > 0, Fore.RED + "Invalid sync timeout" + Fore.RESET
+
+    self.num_of_workers = num_of_workers
+    self.worker_index = worker_index
+    self.sync_interval = sync_interval
+    self.__sync_timeout = sync_timeout
+
+    host, port = chief_address.rsplit(":", 1)
+    address = (host, int(port))
+
+    self.__listener = None
+    self.__worker_connections = []
+    self.__chief_connection = None
+
+    if self.num_of_workers == 1: return
+
+    if self.is_chief:
+      self.__listener = Listener(address, authkey=authkey)
+      print(Fore.BLUE + f"Waiting for {self.num_of_workers - 1} workers on {chief_address}" + Fore.RESET)
+
+      connections = {}
+      while len(connections) < self.num_of_workers - 1:
+        connection = self.__listener.accept()
+        connections[self.__recv(connection)] = connection
+      self.__worker_connections = [connections[idx] for idx in sorted(connections.keys())]
+    else:
+      start_time = time.time()
+      while self.__chief_connection is None:
+        try:
+          self.__chief_connection = Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+          if time.time() - start_time > connection_timeout: raise Exception(Fore.RED + f"Failed to connect to chief on {chief_address}" + Fore.RESET)
+          time.sleep(1)
+      self.__chief_connection.send(self.worker_index)
+
+    print(Fore.BLUE + f"Worker {self.worker_index}/{self.num_of_workers} connected" + Fore.RESET)
+
+  @property
+  def is_chief(self):
+    return self.worker_index == 0
+
+  @property
+  def is_distributed(self):
+    return self.num_of_workers > 1
+
+  # Receive with timeout so crashed or stopped worker aborts whole group instead of blocking others forever
+  def __recv(self, connection):
+    try:
+      if not connection.poll(self.__sync_timeout): raise TimeoutError(f"No data received in {self.__sync_timeout} seconds")
+      return connection.recv()
+    except (EOFError, OSError) as e:
+      # Closing connections unblocks other workers waiting for this one
+      self.close()
+      raise Exception(Fore.RED + f"Worker group aborted on worker {self.worker_index}, other worker is not responding\n{e}" + Fore.RESET)
+
+  def __send(self, connection, obj):
+    try:
+      connection.send(obj)
+    except OSError as e:
+      self.close()
+      raise Exception(Fore.RED + f"Worker group aborted on worker {self.worker_index}, other worker is not responding\n{e}" + Fore.RESET)
+
+  # Select part of dataset for this worker (data are sorted first so all workers split same list)
+  def shard(self, data:list) -> list:
+    if not self.is_distributed: return data
+    return sorted(data)[self.worker_index::self.num_of_workers]
+
+  # Send object from chief to all workers
+  def broadcast(self, obj=None):
+    if not self.is_distributed: return obj
+
+    if self.is_chief:
+      for connection in self.__worker_connections:
+        self.__send(connection, obj)
+      return obj
+    return self.__recv(self.__chief_connection)
+
+  def average(self, arrays:list) -> list:
+    if not self.is_distributed: return arrays
+
+    if self.is_chief:
+      summed_arrays = [np.array(x, dtype=np.float64) for x in arrays]
+      for connection in self.__worker_connections:
+        for idx, array in enumerate(self.__recv(connection)):
+          summed_arrays[idx] += array
+
+      averaged_arrays = [(x / self.num_of_workers).astype(arrays[idx].dtype) for idx, x in enumerate(summed_arrays)]
+      for connection in self.__worker_connections:
+        self.__send(connection, averaged_arrays)
+      return averaged_arrays
+
+    self.__send(self.__chief_connection, arrays)
+    return self.__recv(self.__chief_connection)
+
+  # Average weights of models, states of their optimizers and other variables (optimizer slots of one train function when optimizer is shared by more models) between all workers
+  # Every sync sends all these values to chief and back so syncing every episode is expensive for large models
+  def average_models(self, models:list, optimizers:Union[list, None]=None, variables:Union[list, None]=None):
+    if not self.is_distributed: return
+
+    if optimizers is None: optimizers = []
+    if variables is None: variables = []
+
+    # Optimizer weights are created on first update
+    weights = [model.get_weights() for model in models] + [optimizer.get_weights() for optimizer in optimizers] + [K.batch_get_value(variables)]
+    averaged_weights = self.average([w for ws in weights for w in ws])
+
+    index = 0
+    for item, ws in zip(models + optimizers, weights):
+      if ws: item.set_weights(averaged_weights[index:index + len(ws)])
+      index += len(ws)
+    if variables: K.batch_set_value(list(zip(variables, averaged_weights[index:])))
+
+  # Copy weights of models from chief to all workers
+  def broadcast_models(self, models:list):
+    if not self.is_distributed: return
+
+    weights = self.broadcast([model.get_weights() for model in models] if self.is_chief else None)
+    if not self.is_chief:
+      for model, ws in zip(models, weights):
+        model.set_weights(ws)
+
+  def close(self):
+    for connection in self.__worker_connections:
+      connection.close()
+    if self.__chief_connection: self.__chief_connection.close()
+    if self.__listener: self.__listener.close()
+
+    self.__worker_connections = []
+    self.__chief_connection = None
+    self.__listener = None
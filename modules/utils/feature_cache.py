@@ -0,0 +1,84 @@
+import os
+import json
+import numpy as np
+from cv2 import cv2 as cv
+from colorama import Fore
+from typing import Union
+
+from ..keras_extensions.feature_extractor import preprocess_vgg
+
+# Name of cache folder for given feature extractor layers and storage type
+def feature_cache_key(feature_extractor_layers:list, float16:bool=False):
+  return "vgg_features__" + "_".join([str(x) for x in feature_extractor_layers]) + ("__float16" if float16 else "__float32")
+
+class FeatureCache:
+  """Memory mapped cache of VGG target features of training images indexed by position of image in train data"""
+
+  def __init__(self, cache_path:str, feature_extractor_layers:list, float16:bool=False):
+    self.__cache_path = os.path.join(cache_path, feature_cache_key(feature_extractor_layers, float16))
+    assert os.path.exists(os.path.join(self.__cache_path, "metadata.json")), Fore.RED + f"Feature cache {self.__cache_path} not found, precompute it first" + Fore.RESET
+
+    with open(os.path.join(self.__cache_path, "metadata.json"), "r", encoding="utf-8") as f:
+      metadata = json.load(f)
+
+    assert metadata["layers"] == [str(x) for x in feature_extractor_layers], Fore.RED + "Feature cache was created for different feature extractor layers" + Fore.RESET
+
+    self.image_paths = metadata["image_paths"]
+    self.__features = [np.load(os.path.join(self.__cache_path, f"features_{idx}.npy"), mmap_mode="r") for idx in range(len(feature_extractor_layers))]
+
+  def __len__(self):
+    return len(self.image_paths)
+
+  # Check if cache contains exactly given images
+  def matches_dataset(self, image_paths:list):
+    return set(self.image_paths) == set(image_paths)
+
+  # Get indexes of images in cache
+  def get_indexes(self, image_paths:list) -> np.ndarray:
+    cache_indexes = {image_path: idx for idx, image_path in enumerate(self.image_paths)}
+    return np.array([cache_indexes[image_path] for image_path in image_paths])
+
+  def get_features(self, data_indexes:np.ndarray) -> list:
+    return [features[data_indexes].astype(np.float32) for features in self.__features]
+
+  @staticmethod
+  def create(cache_path:str, image_paths:list, feature_extractor, feature_extractor_layers:list, float16:bool=False, batch_size:int=16, image_shape:Union[tuple, None]=None):
+    cache_path = os.path.join(cache_path, feature_cache_key(feature_extractor_layers, float16))
+    if not os.path.exists(cache_path): os.makedirs(cache_path)
+
+    # Metadata are removed first so interrupted precompute leaves unusable cache
+    if os.path.exists(os.path.join(cache_path, "metadata.json")): os.remove(os.path.join(cache_path, "metadata.json"))
+
+    image_paths = sorted(image_paths)
+    dtype = np.float16 if float16 else np.float32
+
+    features = None
+    for start_index in range(0, len(image_paths), batch_size):
+      batch = []
+      for image_path in image_paths[start_index:start_index + batch_size]:
+        image = cv.imread(image_path)
+        if image_shape is not None and image.shape != image_shape: raise Exception(f"Inconsistent image shape of {image_path}")
+        batch.append(cv.cvtColor(image, cv.COLOR_BGR2RGB) / 127.5 - 1.0)
+
+      predicted_features = feature_extractor.predict(preprocess_vgg(np.array(batch).astype(np.float32)))
+      if not isinstance(predicted_features, list): predicted_features = [predicted_features]
+
+      if features is None:
+        features = [np.lib.format.open_memmap(os.path.join(cache_path, f"features_{idx}.npy"), mode="w+", dtype=dtype, shape=(len(image_paths), *pf.shape[1:])) for idx, pf in enumerate(predicted_features)]
+
+      for feature_array, pf in zip(features, predicted_features):
+        feature_array[start_index:start_index + pf.shape[0]] = pf.astype(dtype)
+
+      print(Fore.BLUE + f"{min(start_index + batch_size, len(image_paths))}/{len(image_paths)} images processed" + Fore.RESET)
+
+    for feature_array in features:
+      feature_array.flush()
+
+    data = {
+      "layers": [str(x) for x in feature_extractor_layers],
+      "float16": float16,
+      "image_paths": image_paths
+    }
+
+    with open(os.path.join(cache_path, "metadata.json"), "w", encoding="utf-8") as f:
+      json.dump(data, f)
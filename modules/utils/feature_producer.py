@@ -0,0 +1,73 @@
+from multiprocessing import get_context
+from queue import Empty, Full
+from typing import Union
+from colorama import Fore
+
+from .batch_maker import AugmentationSettings
+
+# Spawned process doesnt inherit tensorflow state of training process
+_mp_context = get_context("spawn")
+
+class FeatureProducer(_mp_context.Process):
+  """
+  Process that loads batches and computes VGG target features for them ahead of trainer
+  Returns (large_images, small_images, features) so perceptual targets are ready before generator update
+  """
+
+  def __init__(self, train_data:list, batch_size:int, target_image_shape:tuple, feature_extractor_layers:list, secondary_size:tuple=None,
+               buffered_batches:int=5, num_of_loading_workers:int=4, augmentation_settings:Union[AugmentationSettings, None]=None, num_of_threads:Union[int, None]=None):
+    super().__init__()
+    self.daemon = True
+
+    self.__train_data = list(train_data)
+    self.__batch_size = batch_size
+    self.__target_image_shape = target_image_shape
+    self.__feature_extractor_layers = feature_extractor_layers
+    self.__secondary_size = secondary_size
+    self.__buffered_batches = buffered_batches
+    self.__num_of_loading_workers = num_of_loading_workers
+    self.__augmentation_settings = augmentation_settings
+    self.__num_of_threads = num_of_threads
+
+    self.__queue = _mp_context.Queue(maxsize=buffered_batches)
+    self.__terminate_event = _mp_context.Event()
+
+    self.start()
+
+  def terminate(self):
+    self.__terminate_event.set()
+
+  def run(self) -> None:
+    import tensorflow as tf
+    if self.__num_of_threads:
+      tf.config.threading.set_intra_op_parallelism_threads(self.__num_of_threads)
+      tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from .batch_maker import BatchMaker
+    from ..keras_extensions.feature_extractor import create_feature_extractor, preprocess_vgg
+
+    vgg = create_feature_extractor(self.__target_image_shape, self.__feature_extractor_layers)
+    batch_maker = BatchMaker(self.__train_data, self.__batch_size, buffered_batches=self.__buffered_batches, secondary_size=self.__secondary_size, num_of_loading_workers=self.__num_of_loading_workers, augmentation_settings=self.__augmentation_settings)
+
+    while not self.__terminate_event.is_set():
+      large_images, small_images = batch_maker.get_batch()
+      features = vgg.predict(preprocess_vgg(large_images))
+      if not isinstance(features, list): features = [features]
+
+      while not self.__terminate_event.is_set():
+        try:
+          self.__queue.put((large_images, small_images, features), timeout=0.1)
+          break
+        except Full:
+          pass
+
+    batch_maker.terminate()
+    batch_maker.join()
+    self.__queue.cancel_join_thread()
+
+  def get_batch(self) -> tuple:
+    while True:
+      try:
+        return self.__queue.get(timeout=1)
+      except Empty:
+        if not self.is_alive(): raise Exception(Fore.RED + "Feature producer process died" + Fore.RESET)
@@ -37,6 +37,10 @@ def time_to_format(timestamp):
 
   return string
 
+# Check if any multiple of interval was reached between two episode counts (for loops that advance by more than one episode at once)
+def interval_crossed(previous_episode:int, current_episode:int, interval:int):
+  return (current_episode // interval) != (previous_episode // interval)
+
 # Calculate start image size based on final image size and number of upscales
 def count_upscaling_start_size(target_image_shape: tuple, num_of_upscales: int):
   upsc = (target_image_shape[0] // (2 ** num_of_upscales), target_image_shape[1] // (2 ** num_of_upscales), target_image_shape[2])
@@ -0,0 +1,63 @@
+import os
+import numpy as np
+from colorama import Fore
+
+class ImagePool:
+  """
+  Fixed capacity pool of previously generated images preallocated as one numpy array
+  New images overwrite oldest ones (ring buffer), sampling and replacement of images are vectorized
+  """
+
+  def __init__(self, capacity:int, image_shape:tuple, dtype=np.float32):
+    assert capacity > 0, Fore.RED + "Invalid image pool capacity" + Fore.RESET
+
+    self.capacity = capacity
+    self.__images = np.empty((capacity, *image_shape), dtype=dtype)
+    self.__size = 0
+    self.__position = 0
+
+  def __len__(self):
+    return self.__size
+
+  def add(self, images:np.ndarray):
+    images = images[-self.capacity:]
+    indexes = (self.__position + np.arange(images.shape[0])) % self.capacity
+    self.__images[indexes] = images
+
+    self.__position = (self.__position + images.shape[0]) % self.capacity
+    self.__size = min(self.__size + images.shape[0], self.capacity)
+
+  def sample(self, num_of_images:int) -> np.ndarray:
+    return self.__images[np.random.randint(0, self.__size, num_of_images)]
+
+  # Replace each image with given probability by random image from pool and add original images to pool
+  def replace_random(self, images:np.ndarray, replace_probability:float) -> np.ndarray:
+    result = images
+    if self.__size > 0:
+      mask = np.random.random(images.shape[0]) < replace_probability
+      if mask.any():
+        result = images.copy()
+        result[mask] = self.sample(int(np.count_nonzero(mask)))
+
+    self.add(images)
+    return result
+
+  # Copy of stored images ordered from oldest to newest
+  def get_images(self) -> np.ndarray:
+    if self.__size < self.capacity: return self.__images[:self.__size].copy()
+    return np.roll(self.__images, -self.__position, axis=0)
+
+  def save(self, path:str):
+    np.save(path, self.get_images())
+
+  def load(self, path:str):
+    if not os.path.exists(path): return
+
+    images = np.load(path)
+    if images.shape[1:] != self.__images.shape[1:]:
+      print(Fore.YELLOW + "Saved image pool has different image shape, starting with empty pool" + Fore.RESET)
+      return
+
+    self.__size = 0
+    self.__position = 0
+    self.add(images.astype(self.__images.dtype))
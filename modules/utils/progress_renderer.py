@@ -0,0 +1,72 @@
+import os
+import atexit
+from cv2 import cv2 as cv
+import numpy as np
+from queue import Queue
+from threading import Thread
+from colorama import Fore
+from typing import Callable
+
+from ..keras_extensions.custom_tensorboard import TensorBoardCustom
+
+# Place batch of images to grid of (columns, rows) by rows, missing images are left black
+def make_image_grid(images:np.ndarray, grid_dim:tuple) -> np.ndarray:
+  columns, rows = grid_dim
+  images = images[:columns * rows]
+  if images.shape[0] < columns * rows:
+    images = np.concatenate([images, np.zeros((columns * rows - images.shape[0], *images.shape[1:]), dtype=images.dtype)])
+
+  height, width, channels = images.shape[1:]
+  return images.reshape((rows, columns, height, width, channels)).transpose((0, 2, 1, 3, 4)).reshape((rows * height, columns * width, channels))
+
+class ProgressImageRenderer(Thread):
+  """
+  Renders progress images on background thread so training thread only generates images and copies them to host memory
+  Composing of final image, png encoding and writing to tensorboard are done by worker, tensorboard copy can be downscaled
+  Number of images waiting for rendering is limited so training waits for renderer only when it falls behind
+  """
+
+  def __init__(self, tensorboard:TensorBoardCustom, save_path:str, tensorboard_scale:float=1.0, max_pending:int=4):
+    super(ProgressImageRenderer, self).__init__()
+    self.daemon = True
+
+    assert 0 < tensorboard_scale <= 1, Fore.RED + "Invalid tensorboard progress image scale" + Fore.RESET
+
+    self.__tensorboard = tensorboard
+    self.__save_path = save_path
+    self.tensorboard_scale = tensorboard_scale
+    self.__queue = Queue(maxsize=max_pending)
+
+    self.start()
+    atexit.register(self.flush)
+
+  # Request rendering of progress image of episode, compose function must work only with data already copied to host memory and return RGB image in range 0-255
+  def render(self, episode:int, compose:Callable[[], np.ndarray], save_raw:bool=True, description:str="progress"):
+    self.__queue.put((episode, compose, save_raw, description, self.tensorboard_scale))
+
+  # Block until all requested images are rendered
+  def flush(self):
+    self.__queue.join()
+
+  def __render(self, episode:int, compose:Callable[[], np.ndarray], save_raw:bool, description:str, tensorboard_scale:float):
+    image = np.clip(compose(), 0, 255).astype(np.float32)
+    if image.ndim == 2: image = image[:, :, np.newaxis]
+
+    if save_raw:
+      if not os.path.exists(self.__save_path): os.makedirs(self.__save_path)
+      cv.imwrite(f"{self.__save_path}/{episode}.png", cv.cvtColor(image, cv.COLOR_RGB2BGR) if image.shape[2] == 3 else image)
+
+    if self.__tensorboard is not None:
+      if tensorboard_scale < 1:
+        size = (max(int(image.shape[1] * tensorboard_scale), 1), max(int(image.shape[0] * tensorboard_scale), 1))
+        image = cv.resize(image, dsize=size, interpolation=cv.INTER_AREA).reshape((size[1], size[0], image.shape[2]))
+      self.__tensorboard.write_image(np.expand_dims(image / 255, axis=0).astype(np.float32), description=description, step=episode)
+
+  def run(self) -> None:
+    while True:
+      task = self.__queue.get()
+      try:
+        self.__render(*task)
+      except Exception as e:
+        print(Fore.RED + f"Failed to render progress image of episode {task[0]}\n{e}" + Fore.RESET)
+      self.__queue.task_done()
@@ -0,0 +1,104 @@
+import os
+from cv2 import cv2 as cv
+import numpy as np
+from PIL import Image, GifImagePlugin
+from colorama import Fore
+
+PROGRESS_VIDEO_FORMATS = ["gif", "mp4"]
+
+# Paths of progress images (named by episode) ordered by episode, files with other names are ignored
+def get_progress_frame_paths(progress_images_path:str) -> list:
+  if not os.path.exists(progress_images_path): return []
+
+  frames = []
+  for file_name in os.listdir(progress_images_path):
+    episode = os.path.splitext(file_name)[0]
+    if episode.isdigit() and os.path.isfile(os.path.join(progress_images_path, file_name)):
+      frames.append((int(episode), os.path.join(progress_images_path, file_name)))
+  return [path for _, path in sorted(frames)]
+
+class ProgressVideoEncoder:
+  """
+  Encodes frames to gif or mp4 (OpenCV VideoWriter) one by one as they are added, only current frame is held in memory
+  Size of video is set by first frame (optionally downscaled), following frames with different size are resized to it
+  Gif frames are quantized to their own palette and written with Pillow gif utilities
+  """
+
+  def __init__(self, path:str, frame_duration:int=16, scale:float=1.0):
+    video_format = os.path.splitext(path)[1][1:].lower()
+    assert video_format in PROGRESS_VIDEO_FORMATS, Fore.RED + f"Invalid progress video format, avaible formats: {PROGRESS_VIDEO_FORMATS}" + Fore.RESET
+    assert frame_duration > 0, Fore.RED + "Invalid frame duration" + Fore.RESET
+    assert 0 < scale <= 1, Fore.RED + "Invalid progress video scale" + Fore.RESET
+
+    self.__path = path
+    self.__format = video_format
+    self.__frame_duration = frame_duration
+    self.__scale = scale
+
+    self.__size = None
+    self.__writer = None
+    self.__file = None
+    self.num_of_frames = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+  # Add BGR frame (same format as loaded by OpenCV)
+  def add_frame(self, frame:np.ndarray):
+    if frame.ndim == 2: frame = cv.cvtColor(frame, cv.COLOR_GRAY2BGR)
+
+    if self.__size is None:
+      self.__size = (max(int(frame.shape[1] * self.__scale), 1), max(int(frame.shape[0] * self.__scale), 1))
+    if (frame.shape[1], frame.shape[0]) != self.__size:
+      frame = cv.resize(frame, dsize=self.__size, interpolation=cv.INTER_AREA)
+
+    if self.__format == "mp4":
+      if self.__writer is None:
+        self.__writer = cv.VideoWriter(self.__path, cv.VideoWriter_fourcc(*"mp4v"), 1000 / self.__frame_duration, self.__size)
+      self.__writer.write(frame)
+    else:
+      image = Image.fromarray(cv.cvtColor(frame, cv.COLOR_BGR2RGB)).convert("P", palette=Image.ADAPTIVE)
+      if self.__file is None:
+        self.__file = open(self.__path, "wb")
+        header, _ = GifImagePlugin.getheader(image)
+        for block in header: self.__file.write(block)
+        # Loop extension is written only with first frame
+        blocks = GifImagePlugin.getdata(image, duration=self.__frame_duration, loop=0, include_color_table=True)
+      else:
+        blocks = GifImagePlugin.getdata(image, duration=self.__frame_duration, include_color_table=True)
+      for block in blocks: self.__file.write(block)
+
+    self.num_of_frames += 1
+
+  def close(self):
+    if self.__writer is not None:
+      self.__writer.release()
+      self.__writer = None
+
+    if self.__file is not None:
+      self.__file.write(b";")
+      self.__file.close()
+      self.__file = None
+
+# Encode progress images to video ordered by episode, every frame_stride-th frame is used (last frame is always included)
+def make_progress_video(progress_images_path:str, path:str, frame_duration:int=16, frame_stride:int=1, scale:float=1.0) -> int:
+  assert frame_stride >= 1, Fore.RED + "Invalid frame stride" + Fore.RESET
+
+  frame_paths = get_progress_frame_paths(progress_images_path)
+  if len(frame_paths) > 1 and (len(frame_paths) - 1) % frame_stride != 0:
+    frame_paths = frame_paths[::frame_stride] + frame_paths[-1:]
+  else:
+    frame_paths = frame_paths[::frame_stride]
+  if len(frame_paths) < 2: return 0
+
+  with ProgressVideoEncoder(path, frame_duration, scale) as encoder:
+    for frame_path in frame_paths:
+      frame = cv.imread(frame_path)
+      if frame is None:
+        print(Fore.YELLOW + f"Failed to load progress image {frame_path}, skipping it" + Fore.RESET)
+        continue
+      encoder.add_frame(frame)
+  return encoder.num_of_frames
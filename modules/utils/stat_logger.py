@@ -1,45 +1,57 @@
-from threading import Thread
-from ..keras_extensions.custom_tensorboard import TensorBoardCustom
-from collections import deque
-import time
-
-class StatLogger(Thread):
-  def __init__(self, tensorboard:TensorBoardCustom, write_threshold:int=50):
-    super(StatLogger, self).__init__()
-    self.daemon = True
+import numpy as np
+from colorama import Fore
+from typing import Union
 
-    self.__tensorboard = tensorboard
-    self.__write_threshold = write_threshold
-    self.__stats = deque()
+from ..keras_extensions.custom_tensorboard import TensorBoardCustom
 
-    self.__terminated = False
+class StatLogger:
+  """
+  Logs stats of training steps to tensorboard, writing is done by writer thread of tensorboard so appending never waits for disk
+  With aggregate window stats are collected on host and only summary of each window is logged (mean as stat itself and min, max and percentiles as stat/min, ...)
+  First full_resolution_episodes episodes are logged with every value (start of training changes fastest)
+  """
 
-    self.start()
+  def __init__(self, tensorboard:TensorBoardCustom, aggregate_window:Union[int, None]=None, full_resolution_episodes:int=0, percentiles:tuple=(50, 90)):
+    assert aggregate_window is None or aggregate_window >= 1, Fore.RED + "Invalid stats aggregate window" + Fore.RESET
 
-  def __del__(self):
-    len_of_stats = len(self.__stats)
-    if len_of_stats > 0:
-      for _ in range(len_of_stats):
-        stat_pair = self.__stats.popleft()
-        self.__tensorboard._write_logs(stat_pair[1], stat_pair[0])
+    self.__tensorboard = tensorboard
+    self.__aggregate_window = aggregate_window
+    self.__full_resolution_episodes = full_resolution_episodes
+    self.__percentiles = percentiles
 
-  def terminate(self):
-    self.__terminated = True
+    # Name of stat -> values in current window
+    self.__window_values = {}
+    self.__window_last_step = None
 
   def append_stats(self, step, **stats):
-    self.__stats.append([step, stats])
-
-  def run(self) -> None:
-    while not self.__terminated:
-      len_of_stats = len(self.__stats)
-      if len_of_stats > self.__write_threshold:
-        for _ in range(len_of_stats):
-          stat_pair = self.__stats.popleft()
-          self.__tensorboard._write_logs(stat_pair[1], stat_pair[0])
-      time.sleep(0.05)
-
-    len_of_stats = len(self.__stats)
-    if len_of_stats > 0:
-      for _ in range(len_of_stats):
-        stat_pair = self.__stats.popleft()
-        self.__tensorboard._write_logs(stat_pair[1], stat_pair[0])
\ No newline at end of file
+    if self.__aggregate_window is None or step <= self.__full_resolution_episodes:
+      self.__tensorboard._write_logs(stats, step)
+      return
+
+    # Window ends when step crosses multiple of window size (steps can advance by more than one episode)
+    if self.__window_last_step is not None and (step - 1) // self.__aggregate_window != (self.__window_last_step - 1) // self.__aggregate_window:
+      self.__write_window()
+
+    for name, value in stats.items():
+      self.__window_values.setdefault(name, []).append(float(value))
+    self.__window_last_step = step
+
+  def __write_window(self):
+    if not self.__window_values: return
+
+    summaries = {}
+    for name, values in self.__window_values.items():
+      values = np.array(values, dtype=np.float64)
+      summaries[name] = float(np.mean(values))
+      summaries[f"{name}/min"] = float(np.min(values))
+      summaries[f"{name}/max"] = float(np.max(values))
+      for percentile, value in zip(self.__percentiles, np.percentile(values, self.__percentiles)):
+        summaries[f"{name}/p{percentile}"] = float(value)
+
+    self.__tensorboard._write_logs(summaries, self.__window_last_step)
+    self.__window_values = {}
+
+  # Write summary of unfinished window and wait until all appended stats are written
+  def flush(self):
+    self.__write_window()
+    self.__tensorboard.flush()
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import numpy as np
+from collections import deque
+from colorama import Fore
+from typing import Union
+
+from ..keras_extensions.custom_tensorboard import TensorBoardCustom
+
+class StepProfiler:
+  """
+  Lightweight timing of phases of training steps (data wait, discriminator and generator updates, logging, ...)
+  Time from start of step or previous lap is assigned to phase of each lap (phases repeated in one step are summed), rest of step is assigned to "other"
+  Rolling percentiles over last window steps are logged to tensorboard and totals of whole run are saved as json summary
+  """
+
+  def __init__(self, window:int=1_000, percentiles:tuple=(50, 90, 99)):
+    assert window >= 1, Fore.RED + "Invalid profiler window" + Fore.RESET
+
+    self.__window = window
+    self.__percentiles = percentiles
+
+    # Name of phase -> durations of last window steps (seconds)
+    self.__durations = {}
+    self.__totals = {}
+    self.__num_of_steps = 0
+    # First step includes building and tracing of train functions so it is kept apart for steady state throughput
+    self.__first_step_duration = None
+
+    self.__step_durations = {}
+    self.__step_start_time = None
+    self.__lap_time = None
+
+  def start_step(self):
+    self.__step_durations = {}
+    self.__step_start_time = self.__lap_time = time.perf_counter()
+
+  # Assign time since previous lap to phase
+  def lap(self, phase:str):
+    if self.__step_start_time is None: return
+    now = time.perf_counter()
+    self.__step_durations[phase] = self.__step_durations.get(phase, 0) + (now - self.__lap_time)
+    self.__lap_time = now
+
+  def end_step(self):
+    if self.__step_start_time is None: return
+    self.lap("other")
+
+    step_durations = dict(self.__step_durations)
+    step_durations["step"] = self.__lap_time - self.__step_start_time
+    if self.__first_step_duration is None: self.__first_step_duration = step_durations["step"]
+    for phase in set(self.__durations.keys()) | set(step_durations.keys()):
+      duration = step_durations.get(phase, 0)
+      if phase not in self.__durations:
+        # Phases that appear later are counted as zero in previous steps of window
+        self.__durations[phase] = deque([0] * min(self.__num_of_steps, self.__window), maxlen=self.__window)
+      self.__durations[phase].append(duration)
+      self.__totals[phase] = self.__totals.get(phase, 0) + duration
+
+    self.__num_of_steps += 1
+    self.__step_start_time = None
+
+  # Rolling statistics of phases in milliseconds ({phase: {mean, p50, ...}})
+  def summary(self) -> dict:
+    summary = {}
+    for phase, durations in self.__durations.items():
+      values = np.array(durations, dtype=np.float64) * 1000
+      phase_summary = {"mean": float(np.mean(values))}
+      for percentile, value in zip(self.__percentiles, np.percentile(values, self.__percentiles)):
+        phase_summary[f"p{percentile}"] = float(value)
+      summary[phase] = phase_summary
+    return summary
+
+  def log(self, tensorboard:Union[TensorBoardCustom, None], step:int):
+    if tensorboard is None or not self.__num_of_steps: return
+    tensorboard._write_logs({f"step_timing/{phase}/{name}_ms": value for phase, phase_summary in self.summary().items() for name, value in phase_summary.items()}, step)
+
+  # Save json summary of run (totals and share of whole run, rolling statistics of last window)
+  def save(self, path:str):
+    if not self.__num_of_steps: return
+
+    total_time = self.__totals.get("step", 0)
+    data = {
+      "steps": self.__num_of_steps,
+      "window": self.__window,
+      "total_seconds": total_time,
+      "first_step_seconds": self.__first_step_duration,
+      "phases": {phase: {"total_seconds": total, "share": total / total_time if total_time > 0 else 0, "mean_ms": total / self.__num_of_steps * 1000}
+                 for phase, total in self.__totals.items() if phase != "step"},
+      "window_ms": self.summary()
+    }
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory): os.makedirs(directory)
+    with open(path, "w", encoding="utf-8") as f:
+      json.dump(data, f, indent=2)
@@ -0,0 +1,261 @@
+import os
+import json
+import zlib
+import hashlib
+from collections import Counter
+import numpy as np
+import keras.backend as K
+from keras.models import Model
+from colorama import Fore
+from typing import Union
+
+from .checkpoint_writer import CheckpointWriter
+
+class WeightSnapshotStore:
+  """
+  Store of weight snapshots of models saved during training (replacement of full h5 files in weights/<episode>/)
+  Weight tensors are split to chunks that are compressed and saved under hash of their content, so chunks that didnt change are stored only once
+  Weights can be stored as float16 and delta encoded - bits are xored with last keyframe snapshot, so unchanged and barely moving weights compress well
+  index.json maps episodes to chunks of each weight and is the only file read until snapshot is loaded
+  Retention policy keeps last N snapshots and snapshots of every Mth episode, chunks not used by any remaining snapshot are removed
+  Chunks are reference counted so only chunks released by write are checked, objects folder is scanned once per store to collect chunks left by interrupted writes
+  """
+
+  def __init__(self, path:str, float16:bool=False, keyframe_interval:Union[int, None]=None, compression_level:int=1, chunk_size:int=4 * 2 ** 20,
+               keep_last:Union[int, None]=None, keep_every_episodes:Union[int, None]=None):
+    assert keyframe_interval is None or keyframe_interval >= 1, Fore.RED + "Invalid keyframe interval" + Fore.RESET
+    assert keep_last is None or keep_last >= 1, Fore.RED + "Invalid number of kept weight snapshots" + Fore.RESET
+    assert keep_every_episodes is None or keep_every_episodes >= 1, Fore.RED + "Invalid interval of kept weight snapshots" + Fore.RESET
+
+    self.__path = path
+    self.__objects_path = os.path.join(path, "objects")
+    self.__index_path = os.path.join(path, "index.json")
+
+    self.__float16 = float16
+    self.__keyframe_interval = keyframe_interval
+    self.__compression_level = compression_level
+    self.__chunk_size = chunk_size
+    self.__keep_last = keep_last
+    self.__keep_every_episodes = keep_every_episodes
+
+    self.__index = None
+    # Number of uses of each chunk by stored snapshots (built from index on first write)
+    self.__chunk_references = None
+    self.__orphans_collected = False
+    # Decoded stored values of last keyframe (episode, {model name: {layer name: [values]}}) used as base for delta encoding
+    self.__keyframe_cache = (None, None)
+
+  def __load_index(self) -> dict:
+    if self.__index is None:
+      if os.path.exists(self.__index_path):
+        with open(self.__index_path, "r", encoding="utf-8") as f:
+          self.__index = json.load(f)
+      else:
+        self.__index = {"snapshots": {}}
+    return self.__index
+
+  @staticmethod
+  def __snapshot_chunks(snapshot_entry:dict) -> list:
+    return [key for layers in snapshot_entry["models"].values() for _, weights in layers for weight in weights for key in weight["chunks"]]
+
+  def __load_chunk_references(self) -> Counter:
+    if self.__chunk_references is None:
+      self.__chunk_references = Counter()
+      for snapshot_entry in self.__load_index()["snapshots"].values():
+        self.__chunk_references.update(self.__snapshot_chunks(snapshot_entry))
+    return self.__chunk_references
+
+  @staticmethod
+  def __write_atomic(path:str, data:bytes):
+    with open(path + ".tmp", "wb") as f:
+      f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+  def __object_path(self, key:str):
+    return os.path.join(self.__objects_path, key[:2], key)
+
+  def __write_chunks(self, data:bytes) -> list:
+    keys = []
+    for start in range(0, max(len(data), 1), self.__chunk_size):
+      chunk = data[start:start + self.__chunk_size]
+      key = hashlib.sha256(chunk).hexdigest()
+      object_path = self.__object_path(key)
+      if not os.path.exists(object_path):
+        if not os.path.exists(os.path.dirname(object_path)): os.makedirs(os.path.dirname(object_path))
+        self.__write_atomic(object_path, zlib.compress(chunk, self.__compression_level))
+      keys.append(key)
+    return keys
+
+  def __read_chunks(self, keys:list) -> bytes:
+    data = []
+    for key in keys:
+      with open(self.__object_path(key), "rb") as f:
+        data.append(zlib.decompress(f.read()))
+    return b"".join(data)
+
+  # Stored (not delta decoded) values of weight
+  def __read_stored_values(self, weight_entry:dict) -> np.ndarray:
+    return np.frombuffer(self.__read_chunks(weight_entry["chunks"]), dtype=weight_entry["stored_dtype"]).reshape(weight_entry["shape"])
+
+  # Stored values of all weights of model in snapshot of episode, delta encoded weights are decoded
+  def __read_model_stored_values(self, episode:int, model_name:str, layer_names:Union[set, None]=None) -> dict:
+    snapshot_entry = self.__load_index()["snapshots"][str(episode)]
+    base_values = None
+    if snapshot_entry["base"] is not None and any(weight["delta"] for _, weights in snapshot_entry["models"][model_name] for weight in weights):
+      base_values = self.__read_model_stored_values(snapshot_entry["base"], model_name, layer_names)
+
+    values = {}
+    for layer_name, weights in snapshot_entry["models"][model_name]:
+      if layer_names is not None and layer_name not in layer_names: continue
+
+      layer_values = []
+      for idx, weight in enumerate(weights):
+        stored = self.__read_stored_values(weight)
+        if weight["delta"]:
+          base = base_values[layer_name][idx]
+          stored = np.bitwise_xor(stored.reshape(-1).view(np.uint8), base.reshape(-1).view(np.uint8)).view(stored.dtype).reshape(stored.shape)
+        layer_values.append(stored)
+      values[layer_name] = layer_values
+    return values
+
+  @property
+  def episodes(self) -> list:
+    return sorted(int(episode) for episode in self.__load_index()["snapshots"].keys())
+
+  def contains(self, episode:int, model_name:str) -> bool:
+    snapshot_entry = self.__load_index()["snapshots"].get(str(episode))
+    return snapshot_entry is not None and model_name in snapshot_entry["models"]
+
+  # Save snapshot of weights of models ({model name: model}), with checkpoint writer weights are only copied to host memory and written on its thread
+  def save(self, episode:int, models:dict, checkpoint_writer:Union[CheckpointWriter, None]=None):
+    snapshots = {model_name: CheckpointWriter.snapshot_weights(model) for model_name, model in models.items()}
+    if checkpoint_writer is not None: checkpoint_writer.submit(lambda: self.write(episode, snapshots))
+    else: self.write(episode, snapshots)
+
+  # Write snapshots of weights ({model name: snapshot from CheckpointWriter.snapshot_weights}) and apply retention policy
+  def write(self, episode:int, snapshots:dict):
+    index = self.__load_index()
+    references = self.__load_chunk_references()
+    episodes = sorted(int(e) for e in index["snapshots"].keys() if int(e) < episode)
+
+    # Snapshot is keyframe when delta encoding is disabled or enough snapshots were stored since last keyframe
+    base = None
+    if self.__keyframe_interval is not None and self.__keyframe_interval > 1:
+      keyframes = [e for e in episodes if index["snapshots"][str(e)]["base"] is None]
+      if keyframes and len([e for e in episodes if e > keyframes[-1]]) < self.__keyframe_interval - 1:
+        base = keyframes[-1]
+
+    base_values = {}
+    if base is not None:
+      if self.__keyframe_cache[0] != base:
+        self.__keyframe_cache = (base, {model_name: self.__read_model_stored_values(base, model_name) for model_name in snapshots.keys() if self.contains(base, model_name)})
+      base_values = self.__keyframe_cache[1]
+
+    models_entry = {}
+    stored_values = {}
+    for model_name, snapshot in snapshots.items():
+      model_base_values = base_values.get(model_name, {})
+      layers_entry = []
+      stored_values[model_name] = {}
+      for layer_name, weight_names, weight_values in snapshot:
+        weights_entry = []
+        layer_stored_values = []
+        for idx, (weight_name, value) in enumerate(zip(weight_names, weight_values)):
+          value = np.asarray(value)
+          stored = value.astype(np.float16) if self.__float16 and value.dtype == np.float32 else value
+          stored = np.ascontiguousarray(stored)
+          layer_stored_values.append(stored)
+
+          # Delta is xor of bits with keyframe, weights that didnt change become zeros
+          layer_base_values = model_base_values.get(layer_name)
+          delta = layer_base_values is not None and idx < len(layer_base_values) and layer_base_values[idx].shape == stored.shape and layer_base_values[idx].dtype == stored.dtype
+          payload = np.bitwise_xor(stored.reshape(-1).view(np.uint8), layer_base_values[idx].reshape(-1).view(np.uint8)) if delta else stored
+
+          weights_entry.append({
+            "name": weight_name,
+            "shape": list(stored.shape),
+            "dtype": str(value.dtype),
+            "stored_dtype": str(stored.dtype),
+            "delta": bool(delta),
+            "chunks": self.__write_chunks(payload.tobytes())
+          })
+        layers_entry.append([layer_name, weights_entry])
+        stored_values[model_name][layer_name] = layer_stored_values
+      models_entry[model_name] = layers_entry
+
+    # Chunks of rewritten snapshot are released, the ones used by new snapshot keep their references
+    released = self.__snapshot_chunks(index["snapshots"][str(episode)]) if str(episode) in index["snapshots"] else []
+    index["snapshots"][str(episode)] = {"base": base, "models": models_entry}
+    references.update(self.__snapshot_chunks(index["snapshots"][str(episode)]))
+    if base is None: self.__keyframe_cache = (episode, stored_values)
+
+    released.extend(self.__prune(index))
+    references.subtract(released)
+
+    # Index is replaced before chunks are removed so it never points to missing chunks (interrupted removal only leaves orphans)
+    if not os.path.exists(self.__path): os.makedirs(self.__path)
+    self.__write_atomic(self.__index_path, json.dumps(index).encode("utf-8"))
+    self.__collect_chunks(released)
+
+  # Remove chunks that are no longer used by any snapshot, first call also removes chunks not referenced by index at all
+  def __collect_chunks(self, keys:list):
+    references = self.__chunk_references
+    for key in set(keys):
+      if references[key] > 0: continue
+      del references[key]
+      if os.path.exists(self.__object_path(key)): os.remove(self.__object_path(key))
+
+    if self.__orphans_collected: return
+    self.__orphans_collected = True
+    if not os.path.exists(self.__objects_path): return
+    for directory in os.listdir(self.__objects_path):
+      for key in os.listdir(os.path.join(self.__objects_path, directory)):
+        if references[key] <= 0: os.remove(os.path.join(self.__objects_path, directory, key))
+
+  # Remove snapshots not kept by retention policy from index (keyframes needed by kept snapshots stay), returns chunks of removed snapshots
+  def __prune(self, index:dict) -> list:
+    if self.__keep_last is None and self.__keep_every_episodes is None: return []
+
+    episodes = sorted(int(e) for e in index["snapshots"].keys())
+    kept = set(episodes[-self.__keep_last:]) if self.__keep_last is not None else set()
+    if self.__keep_every_episodes is not None: kept.update(e for e in episodes if e % self.__keep_every_episodes == 0)
+    kept.update([index["snapshots"][str(e)]["base"] for e in kept if index["snapshots"][str(e)]["base"] is not None])
+
+    released = []
+    for e in episodes:
+      if e in kept: continue
+      released.extend(self.__snapshot_chunks(index["snapshots"][str(e)]))
+      del index["snapshots"][str(e)]
+    return released
+
+  # Load weights of model from snapshot of episode (only chunks of layers present in model are read), returns False when snapshot is not stored
+  def load(self, episode:int, model_name:str, model:Model) -> bool:
+    if not self.contains(episode, model_name): return False
+
+    layers = {layer.name: layer for layer in model.layers}
+    snapshot_entry = self.__load_index()["snapshots"][str(episode)]
+    values = self.__read_model_stored_values(episode, model_name, set(layers.keys()))
+
+    assignments = []
+    for layer_name, weights in snapshot_entry["models"][model_name]:
+      if layer_name not in values: continue
+      layer_weights = layers[layer_name].weights
+      if len(layer_weights) != len(weights):
+        print(Fore.YELLOW + f"Layer {layer_name} has different number of weights than its snapshot, skipping it" + Fore.RESET)
+        continue
+
+      for variable, weight, value in zip(layer_weights, weights, values[layer_name]):
+        assignments.append((variable, value.astype(weight["dtype"])))
+    K.batch_set_value(assignments)
+    return True
+
+  # Export snapshot of model to h5 file loadable by keras load_weights
+  def export_h5(self, episode:int, model_name:str, path:str):
+    assert self.contains(episode, model_name), Fore.RED + f"Snapshot of {model_name} from episode {episode} not found" + Fore.RESET
+
+    snapshot_entry = self.__load_index()["snapshots"][str(episode)]
+    values = self.__read_model_stored_values(episode, model_name)
+    CheckpointWriter.write_weights(path, [(layer_name, [weight["name"] for weight in weights], [value.astype(weight["dtype"]) for weight, value in zip(weights, values[layer_name])])
+                                          for layer_name, weights in snapshot_entry["models"][model_name]])
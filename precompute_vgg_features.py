@@ -0,0 +1,39 @@
+import os
+import sys
+from cv2 import cv2 as cv
+from colorama import Fore
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+stdin = sys.stdin
+sys.stdin = open(os.devnull, 'w')
+stderr = sys.stderr
+sys.stderr = open(os.devnull, 'w')
+sys.stdin = stdin
+sys.stderr = stderr
+
+import tensorflow as tf
+tf.get_logger().setLevel('ERROR')
+gpus = tf.config.experimental.list_physical_devices('GPU')
+if gpus:
+  try:
+    tf.config.experimental.set_memory_growth(gpus[0], True)
+  except:
+    pass
+
+from modules.keras_extensions.feature_extractor import create_feature_extractor
+from modules.utils.feature_cache import FeatureCache
+from modules.utils.helpers import get_paths_of_files_from_path
+from settings.srgan_settings import *
+
+if __name__ == '__main__':
+  assert FEATURE_CACHE_PATH, Fore.RED + "Feature cache path is not set in settings" + Fore.RESET
+  assert FEATURE_EXTRACTOR_LAYERS, Fore.RED + "No feature extractor layers set in settings" + Fore.RESET
+
+  train_data = get_paths_of_files_from_path(DATASET_PATH, only_files=True)
+  assert train_data, Fore.RED + "Training dataset is not loaded" + Fore.RESET
+
+  image_shape = cv.imread(train_data[0]).shape
+  vgg = create_feature_extractor(image_shape, FEATURE_EXTRACTOR_LAYERS)
+
+  FeatureCache.create(FEATURE_CACHE_PATH, train_data, vgg, FEATURE_EXTRACTOR_LAYERS, float16=FEATURE_CACHE_FLOAT16, batch_size=BATCH_SIZE, image_shape=image_shape)
+  print(Fore.GREEN + f"Feature cache created in {FEATURE_CACHE_PATH}" + Fore.RESET)
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import traceback
+import colorama
+from colorama import Fore
+
+colorama.init()
+
+from settings.profile_models_settings import *
+
+# Must be set before tensorflow is imported
+if CPU_ONLY: os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+stdin = sys.stdin
+sys.stdin = open(os.devnull, 'w')
+stderr = sys.stderr
+sys.stderr = open(os.devnull, 'w')
+sys.stdin = stdin
+sys.stderr = stderr
+
+import tensorflow as tf
+tf.get_logger().setLevel('ERROR')
+
+import keras.backend as K
+
+from modules.benchmark import build_spreadsheet_model, format_cost_table, profile_model, get_spreadsheet_model_names, SPREADSHEETS
+
+# Cost profile of models from spreadsheets (params, FLOPs, activation memory for inference and training, CPU latency of model and its layers)
+# Models of each spreadsheet and input shape are ranked in table, all profiles with per layer costs are saved to json
+# Usage: python profile_models.py
+
+if __name__ == '__main__':
+  selected_models = {"generator": GENERATOR_MODELS, "upscaling_generator": UPSCALING_GENERATOR_MODELS, "discriminator": DISCRIMINATOR_MODELS}
+  image_shapes = {"generator": [GENERATOR_IMAGE_SHAPE], "upscaling_generator": [UPSCALING_START_IMAGE_SHAPE], "discriminator": DISCRIMINATOR_IMAGE_SHAPES}
+
+  profiles = []
+  for spreadsheet in PROFILED_SPREADSHEETS:
+    assert spreadsheet in SPREADSHEETS, Fore.RED + f"Unknown model spreadsheet {spreadsheet}" + Fore.RESET
+
+    for image_shape in image_shapes[spreadsheet]:
+      group_profiles = []
+      for model_name in selected_models[spreadsheet] or get_spreadsheet_model_names(SPREADSHEETS[spreadsheet]):
+        print(Fore.BLUE + f"Profiling {spreadsheet} {model_name} {image_shape}" + Fore.RESET)
+        # Every model is built in clean graph so profiled models dont share memory
+        K.clear_session()
+
+        try:
+          model = build_spreadsheet_model(spreadsheet, model_name, image_shape, latent_dim=LATENT_DIM, num_of_upscales=NUM_OF_UPSCALES)
+          profile = profile_model(model, batch_size=BATCH_SIZE, bytes_per_value=BYTES_PER_VALUE, measure_latency=MEASURE_LATENCY, latency_repeats=LATENCY_REPEATS, latency_warmup=LATENCY_WARMUP)
+        except Exception as e:
+          print(Fore.RED + f"Failed to profile {spreadsheet} {model_name}\n{e}" + Fore.RESET)
+          traceback.print_exc()
+          continue
+
+        profile.update({"spreadsheet": spreadsheet, "model": model_name, "image_shape": image_shape})
+        group_profiles.append(profile)
+
+      if not group_profiles: continue
+      profiles.extend(group_profiles)
+
+      print(Fore.GREEN + f"\n{spreadsheet} models for image shape {image_shape} (batch size {BATCH_SIZE}) ranked by {RANK_BY}" + Fore.RESET)
+      for line in format_cost_table(group_profiles, RANK_BY):
+        print(line)
+
+      if MEASURE_LATENCY and NUM_OF_SHOWN_LAYERS:
+        for profile in group_profiles:
+          slowest_layers = sorted([layer for layer in profile["layers"] if layer["latency_ms"] is not None], key=lambda layer: layer["latency_ms"], reverse=True)[:NUM_OF_SHOWN_LAYERS]
+          print(f"{profile['model']} slowest layers: " + ", ".join(f"{layer['name']} ({layer['type']}) {layer['latency_ms']:.2f} ms" for layer in slowest_layers))
+      print()
+
+  if OUTPUT_PATH:
+    directory = os.path.dirname(OUTPUT_PATH)
+    if directory and not os.path.exists(directory): os.makedirs(directory)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+      json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "tensorflow_version": tf.__version__, "batch_size": BATCH_SIZE, "bytes_per_value": BYTES_PER_VALUE, "profiles": profiles}, f, indent=2)
+    print(Fore.GREEN + f"Model profiles saved to {OUTPUT_PATH}" + Fore.RESET)
@@ -0,0 +1,59 @@
+### Data settings ###
+# Synthetic datasets are created here (and reused while their settings dont change)
+SYNTHETIC_DATASETS_PATH = "datasets/synthetic"
+NUM_OF_SYNTHETIC_IMAGES = 2_000
+# "png" or "jpg"
+SYNTHETIC_IMAGE_FORMAT = "png"
+# Y, X, CH (for SRGAN its shape of high resolution images)
+DCGAN_IMAGE_SHAPE = (64, 64, 3)
+WGAN_IMAGE_SHAPE = (64, 64, 3)
+SRGAN_IMAGE_SHAPE = (128, 128, 3)
+
+# Training folders of runs and results are saved here
+BENCHMARK_OUTPUT_PATH = "training_data/benchmark"
+# Results of previous benchmark to compare with (None to skip comparison)
+BASELINE_RESULTS_PATH = None
+
+### Benchmark settings ###
+# Benchmarked gans ("dcgan", "wgan", "srgan")
+BENCHMARKED_GANS = ["dcgan", "wgan", "srgan"]
+NUM_OF_EPISODES = 50
+# Run that takes longer is stopped and reported as failed (None for no limit)
+RUN_TIMEOUT = 1_800
+
+# Models from spreadsheets (None for all models of spreadsheet), DCGAN and WGAN use same models
+GEN_MODELS = None
+DISC_MODELS = None
+SRGAN_GEN_MODELS = None
+SRGAN_DISC_MODELS = None
+# Models paired with every benchmarked model of other network
+REFERENCE_GEN_MODEL = "mod_testing"
+REFERENCE_DISC_MODEL = "mod_testing8"
+REFERENCE_SRGAN_GEN_MODEL = "mod_srgan_exp_v2"
+REFERENCE_SRGAN_DISC_MODEL = "mod_base_9layers"
+# Benchmark every generator with every discriminator instead of pairing with reference models (many runs)
+ALL_MODEL_COMBINATIONS = False
+
+### Training settings ###
+# Benchmark is meant for CPU only machines, hide GPUs to get comparable results everywhere
+CPU_ONLY = True
+# Number of threads used by tensorflow (None for default)
+NUM_OF_THREADS = None
+# Mixed precision mode (None for float32, "float16" for GPUs with tensor cores, "bfloat16" for CPUs with bf16 support)
+# With pinned tensorflow 2.2 only float16 on GPU works, bfloat16 needs tensorflow >= 2.3 built with oneDNN and raises error otherwise
+MIXED_PRECISION = None
+RANDOM_SEED = 0
+
+DCGAN_BATCH_SIZE = 32
+SRGAN_BATCH_SIZE = 4
+NUM_OF_LOADING_WORKERS = 8
+BUFFERED_BATCHES = 20
+LATENT_DIM = 128
+CRITIC_TRAIN_MULTIP = 5
+NUM_OF_UPSCALES = 2
+DISCRIMINATOR_TRAINING_MULTIPLIER = 1
+# Concatenated real/fake discriminator update of DCGAN and SRGAN (compare results of runs with and without it to see its effect on throughput)
+DISCRIMINATOR_CONCAT_REAL_FAKE = False
+# Layers of VGG used for feature loss of SRGAN (None to disable, VGG19 imagenet weights are downloaded on first use)
+FEATURE_EXTRACTOR_LAYERS = None
+STATS_AGGREGATE_WINDOW = 100
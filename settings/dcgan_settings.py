@@ -7,10 +7,57 @@ NUM_OF_TRAINING_EPISODES = 300_000
 
 # Num of episodes after whitch progress image/s will be created to "track" progress of training
 PROGRESS_IMAGE_SAVE_INTERVAL = 500
+# Scale of progress images written to tensorboard (smaller images keep logs small, raw images are saved in full size)
+PROGRESS_TENSORBOARD_SCALE = 1.0
+# Stats are logged as mean, min, max and percentiles of windows of this many episodes (None logs every value), first episodes are logged with every value
+STATS_AGGREGATE_WINDOW = 100
+STATS_FULL_RESOLUTION_EPISODES = 1_000
+# Interval of logging statistics of weights (moments, norms, quantiles and sampled histograms, None to disable)
+WEIGHT_STATS_INTERVAL = 1_000
+# Interval of logging percentiles of timings of training step phases (summary of whole run is saved to step_timing.json, None disables logging)
+STEP_TIMING_LOG_INTERVAL = 1_000
+# Number of episodes captured by profiler trace (trace is started by creating file profile_trace in training folder, by SIGUSR1 signal or on start episode, None disables it)
+PROFILE_TRACE_EPISODES = 10
+PROFILE_TRACE_START_EPISODE = None
 # Num of episodes after whitch weights will be saved (Its not the same as checkpoint!)
 WEIGHTS_SAVE_INTERVAL = 2_500
+# Weight snapshots are stored deduplicated and compressed, float16 halves their size and every KEYFRAME_INTERVAL-th snapshot is stored whole (others as delta to it)
+WEIGHTS_STORE_FLOAT16 = False
+WEIGHTS_STORE_KEYFRAME_INTERVAL = 10
+# Retention of weight snapshots - last N snapshots and snapshots of every Mth episode are kept (None keeps all)
+WEIGHTS_KEEP_LAST = None
+WEIGHTS_KEEP_EVERY_EPISODES = None
 
 BATCH_SIZE = 32
+# Number of batches whose gradients are accumulated to one update (effective batch size is BATCH_SIZE * GRADIENT_ACCUMULATION_STEPS)
+# Needs DISCRIMINATOR_CONCAT_REAL_FAKE when > 1
+# Each episode then trains on GRADIENT_ACCUMULATION_STEPS batches, optimizers are replaced with accumulating version of same optimizer with same learning rate when > 1 (KerasAdamAccumulated, KerasRMSpropAccumulated)
+GRADIENT_ACCUMULATION_STEPS = 1
+# Seed of random generator of latent noise and labels generated in graph (None for random seed)
+RANDOM_SEED = None
+# Mixed precision mode (None for float32, "float16" for GPUs with tensor cores, "bfloat16" for CPUs with bf16 support)
+# With pinned tensorflow 2.2 only float16 on GPU works, bfloat16 needs tensorflow >= 2.3 built with oneDNN and raises error otherwise
+MIXED_PRECISION = None
+# Train discriminator on real and fake images concatenated to one batch (one update per step instead of two)
+# Batch normalization layers in discriminator will then compute statistics over mixed real/fake batch
+DISCRIMINATOR_CONCAT_REAL_FAKE = False
+# Number of episodes trained by one compiled function call (noise and labels are sampled on device, stats, saving and checks are done after each call)
+# Needs FEED_PREV_GEN_BATCH disabled when > 1
+EPISODES_PER_CALL = 1
+# Previously generated images settings (part of fake images for discriminator is replaced by older generated images)
+FEED_PREV_GEN_BATCH = True
+FEED_OLD_PERC_AMOUNT = 0.15
+# Number of stored generated images (None for 3 * BATCH_SIZE)
+FAKE_IMAGE_POOL_CAPACITY = None
+# Save stored generated images with checkpoint
+PERSIST_FAKE_IMAGE_POOL = False
+# Gradient norm monitoring (global and per layer norms are computed inside training steps and logged to tensorboard)
+# Num of episodes after whitch gradient norms are read and checked (None to disable monitoring)
+GRADIENT_MONITOR_INTERVAL = 100
+# Allowed range of global gradient norm (None for no limit on that side)
+GRADIENT_NORM_LIMITS = (0.2, 100)
+# Action when gradient norm leaves its limits ("log", "checkpoint" or "halt")
+GRADIENT_NORM_ACTION = "log"
 # Num of batches preloaded in buffer
 BUFFERED_BATCHES = 100
 
@@ -29,8 +76,12 @@ CHECK_DATASET = False
 
 # Save progress images to folder too (if false then they will be saved only to tensorboard)
 SAVE_RAW_IMAGES = True
-# Duration of one frame if gif is created from progress images after training
+# Duration of one frame if video (gif or mp4) is created from progress images after training
 GIF_FRAME_DURATION = 300
+# Format of progress video, only every Nth progress image is used and frames can be downscaled to keep video small
+PROGRESS_VIDEO_FORMAT = "gif"
+PROGRESS_VIDEO_FRAME_STRIDE = 1
+PROGRESS_VIDEO_SCALE = 1.0
 
 # Num of worker used to preload data for training/testing
 NUM_OF_LOADING_WORKERS = 8
\ No newline at end of file
@@ -0,0 +1,34 @@
+# Profiled spreadsheets ("generator", "upscaling_generator", "discriminator")
+PROFILED_SPREADSHEETS = ["generator", "upscaling_generator", "discriminator"]
+# Models of spreadsheets (None for all models of spreadsheet)
+GENERATOR_MODELS = None
+UPSCALING_GENERATOR_MODELS = None
+DISCRIMINATOR_MODELS = None
+
+# Y, X, CH
+# Shape of images generated by generators
+GENERATOR_IMAGE_SHAPE = (64, 64, 3)
+LATENT_DIM = 128
+# Shape of small input images of upscaling generators
+UPSCALING_START_IMAGE_SHAPE = (64, 64, 3)
+NUM_OF_UPSCALES = 2
+# Discriminators are profiled for each shape (DCGAN/WGAN and SRGAN images)
+DISCRIMINATOR_IMAGE_SHAPES = [(64, 64, 3), (256, 256, 3)]
+
+# Memory and FLOPs are reported for this batch size and latencies are measured with it
+BATCH_SIZE = 1
+# Bytes of one activation value (4 for float32, 2 for mixed precision)
+BYTES_PER_VALUE = 4
+# Measuring latency of every layer takes time, disable it for quick overview
+MEASURE_LATENCY = True
+LATENCY_REPEATS = 20
+LATENCY_WARMUP = 3
+# Hide GPUs so latencies are measured on CPU
+CPU_ONLY = True
+
+# Models are ranked from cheapest by one of "params", "flops", "inference_activation_bytes", "training_activation_bytes", "latency_ms"
+RANK_BY = "flops"
+# Number of slowest layers shown for each model (full per layer profile is in json)
+NUM_OF_SHOWN_LAYERS = 3
+# Json with all profiles (None to not save)
+OUTPUT_PATH = "training_data/model_costs.json"
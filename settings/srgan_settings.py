@@ -4,8 +4,12 @@ DATASET_PATH = "datasets/all_normalized__256x256"
 
 # If none will be provided then script will select some random one
 CUSTOM_HR_TEST_IMAGES = ["datasets/testing_image1.png", "datasets/testing_image2.png", "datasets/testing_image3.jpg"]
+# Number of random training images used for progress images when custom test images are not set (test images are cached so larger panels are cheap)
+NUM_OF_RANDOM_TEST_IMAGES = 1
 
 # Augmentation settings
+# Augmentation must be disabled to use feature cache
+USE_AUGMENTATION = True
 FLIP_CHANCE = 0.30
 ROTATION_CHANCE = 0.30
 ROTATION_AMOUNT = 20
@@ -27,11 +31,38 @@ GENERATOR_PRETRAIN_EPISODES = 50_000
 TRAINING_EPISODES = 400_000
 
 BATCH_SIZE = 8
+# Number of batches whose gradients are accumulated to one update (effective batch size is BATCH_SIZE * GRADIENT_ACCUMULATION_STEPS)
+# Needs DISCRIMINATOR_CONCAT_REAL_FAKE when > 1
+# Each episode then trains on GRADIENT_ACCUMULATION_STEPS batches, optimizers are replaced with accumulating version of same optimizer with same learning rate when > 1 (KerasAdamAccumulated, KerasRMSpropAccumulated)
+GRADIENT_ACCUMULATION_STEPS = 1
+# Seed of random generator of latent noise and labels generated in graph (None for random seed)
+RANDOM_SEED = None
+# Mixed precision mode (None for float32, "float16" for GPUs with tensor cores, "bfloat16" for CPUs with bf16 support)
+# With pinned tensorflow 2.2 only float16 on GPU works, bfloat16 needs tensorflow >= 2.3 built with oneDNN and raises error otherwise
+MIXED_PRECISION = None
 
 # Num of episodes after whitch progress image/s will be created to "track" progress of training
 PROGRESS_IMAGE_SAVE_INTERVAL = 100
+# Scale of progress images written to tensorboard (smaller images keep logs small, raw images are saved in full size)
+PROGRESS_TENSORBOARD_SCALE = 1.0
+# Stats are logged as mean, min, max and percentiles of windows of this many episodes (None logs every value), first episodes are logged with every value
+STATS_AGGREGATE_WINDOW = 100
+STATS_FULL_RESOLUTION_EPISODES = 1_000
+# Interval of logging statistics of weights (moments, norms, quantiles and sampled histograms, None to disable)
+WEIGHT_STATS_INTERVAL = 1_000
+# Interval of logging percentiles of timings of training step phases (summary of whole run is saved to step_timing.json, None disables logging)
+STEP_TIMING_LOG_INTERVAL = 1_000
+# Number of episodes captured by profiler trace (trace is started by creating file profile_trace in training folder, by SIGUSR1 signal or on start episode, None disables it)
+PROFILE_TRACE_EPISODES = 10
+PROFILE_TRACE_START_EPISODE = None
 # Num of episodes after whitch weights will be saved (Its not the same as checkpoint!)
 WEIGHTS_SAVE_INTERVAL = 1_000
+# Weight snapshots are stored deduplicated and compressed, float16 halves their size and every KEYFRAME_INTERVAL-th snapshot is stored whole (others as delta to it)
+WEIGHTS_STORE_FLOAT16 = False
+WEIGHTS_STORE_KEYFRAME_INTERVAL = 10
+# Retention of weight snapshots - last N snapshots and snapshots of every Mth episode are kept (None keeps all)
+WEIGHTS_KEEP_LAST = None
+WEIGHTS_KEEP_EVERY_EPISODES = None
 
 # Base LRs
 GEN_LR = 1e-4
@@ -60,6 +91,24 @@ DISCRIMINATOR_TARGET_NOISE = 0.005
 
 # Discriminator training settings
 DISCRIMINATOR_TRAINING_MULTIPLIER = 1
+# Train discriminator on real and fake images concatenated to one batch (one update per step instead of two)
+# Batch normalization layers in discriminator will then compute statistics over mixed real/fake batch
+DISCRIMINATOR_CONCAT_REAL_FAKE = False
+
+# Previously generated images settings (part of fake images for discriminator is replaced by older generated images)
+FEED_PREV_GEN_BATCH = False
+FEED_OLD_PERC_AMOUNT = 0.15
+# Number of stored generated images (None for 3 * BATCH_SIZE)
+FAKE_IMAGE_POOL_CAPACITY = None
+# Save stored generated images with checkpoint
+PERSIST_FAKE_IMAGE_POOL = False
+# Gradient norm monitoring (global and per layer norms are computed inside training steps and logged to tensorboard)
+# Num of episodes after whitch gradient norms are read and checked (None to disable monitoring)
+GRADIENT_MONITOR_INTERVAL = 100
+# Allowed range of global gradient norm (None for no limit on that side)
+GRADIENT_NORM_LIMITS = (None, 100)
+# Action when gradient norm leaves its limits ("log", "checkpoint" or "halt")
+GRADIENT_NORM_ACTION = "log"
 
 ### Model settings ###
 # Number of doubling resolution
@@ -75,6 +124,17 @@ FEATURE_LOSS = "mae"
 
 FEATURE_EXTRACTOR_LAYERS = [2, 5, 8] # [2, 5, 8], [5, 9]
 
+# Path to folder with precomputed VGG features of training images (create it with precompute_vgg_features.py)
+# Leave as None for computing features on the fly
+FEATURE_CACHE_PATH = None # "datasets/feature_cache"
+# Store cached features as float16 (half disk space, small precision loss)
+FEATURE_CACHE_FLOAT16 = True
+
+# Compute VGG features for GAN training in separate process ahead of training (used only when feature cache is not used)
+USE_FEATURE_PRODUCER = False
+# Number of CPU threads for feature producer process (None for tensorflow default)
+FEATURE_PRODUCER_THREADS = None
+
 GEN_LOSS_WEIGHT = 1.0 # 0.8
 DISC_LOSS_WEIGHT = 0.01 # 0.01, 0.003
 FEATURE_PER_LAYER_LOSS_WEIGHTS = [0.025, 0.025, 0.025] # 0.0833
@@ -85,5 +145,22 @@ LOAD_FROM_CHECKPOINTS = True
 
 # Save progress images to folder too (if false then they will be saved only to tensorboard)
 SAVE_RAW_IMAGES = True
-# Duration of one frame if gif is created from progress images after training
-GIF_FRAME_DURATION = 300
\ No newline at end of file
+# Duration of one frame if video (gif or mp4) is created from progress images after training
+GIF_FRAME_DURATION = 300
+# Format of progress video, only every Nth progress image is used and frames can be downscaled to keep video small
+PROGRESS_VIDEO_FORMAT = "gif"
+PROGRESS_VIDEO_FRAME_STRIDE = 1
+PROGRESS_VIDEO_SCALE = 1.0
+
+# Distributed training settings (data parallel training in multiple processes or on multiple machines)
+# Worker 0 is chief and its the only one writing logs, progress images and checkpoints
+# Number of workers and worker index can be overriden by GAN_NUM_OF_WORKERS and GAN_WORKER_INDEX environment variables (launch_workers.py use them)
+NUM_OF_WORKERS = 1
+WORKER_INDEX = 0
+# Address of chief worker (host:port), all workers must be able to reach it
+CHIEF_ADDRESS = "localhost:12355"
+# Num of episodes after whitch weights are averaged between workers
+# Every sync sends weights and optimizer slots of both models to chief and back (several times size of models per worker), so syncing every episode costs more than small steps itself
+WORKERS_SYNC_INTERVAL = 10
+# Seconds worker waits for others during sync before training is aborted on all workers (must be longer than sync interval takes, including checkpoint saving on chief)
+WORKERS_SYNC_TIMEOUT = 600
\ No newline at end of file
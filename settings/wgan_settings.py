@@ -7,10 +7,62 @@ NUM_OF_TRAINING_EPISODES = 300_000
 
 # Num of episodes after whitch progress image/s will be created to "track" progress of training
 PROGRESS_IMAGE_SAVE_INTERVAL = 500
+# Scale of progress images written to tensorboard (smaller images keep logs small, raw images are saved in full size)
+PROGRESS_TENSORBOARD_SCALE = 1.0
+# Stats are logged as mean, min, max and percentiles of windows of this many episodes (None logs every value), first episodes are logged with every value
+STATS_AGGREGATE_WINDOW = 100
+STATS_FULL_RESOLUTION_EPISODES = 1_000
+# Interval of logging statistics of weights (moments, norms, quantiles and sampled histograms, None to disable)
+WEIGHT_STATS_INTERVAL = 1_000
+# Interval of logging percentiles of timings of training step phases (summary of whole run is saved to step_timing.json, None disables logging)
+STEP_TIMING_LOG_INTERVAL = 1_000
+# Number of episodes captured by profiler trace (trace is started by creating file profile_trace in training folder, by SIGUSR1 signal or on start episode, None disables it)
+PROFILE_TRACE_EPISODES = 10
+PROFILE_TRACE_START_EPISODE = None
 # Num of episodes after whitch weights will be saved (Its not the same as checkpoint!)
 WEIGHTS_SAVE_INTERVAL = 2_500
+# Weight snapshots are stored deduplicated and compressed, float16 halves their size and every KEYFRAME_INTERVAL-th snapshot is stored whole (others as delta to it)
+WEIGHTS_STORE_FLOAT16 = False
+WEIGHTS_STORE_KEYFRAME_INTERVAL = 10
+# Retention of weight snapshots - last N snapshots and snapshots of every Mth episode are kept (None keeps all)
+WEIGHTS_KEEP_LAST = None
+WEIGHTS_KEEP_EVERY_EPISODES = None
 
 BATCH_SIZE = 32
+# Number of batches whose gradients are accumulated to one update (effective batch size is BATCH_SIZE * GRADIENT_ACCUMULATION_STEPS)
+# Each episode then trains on GRADIENT_ACCUMULATION_STEPS batches, optimizers are replaced with accumulating version of same optimizer with same learning rate when > 1 (KerasAdamAccumulated, KerasRMSpropAccumulated)
+GRADIENT_ACCUMULATION_STEPS = 1
+# Seed of random generator of latent noise and labels generated in graph (None for random seed)
+RANDOM_SEED = None
+# Mixed precision mode (None for float32, "float16" for GPUs with tensor cores, "bfloat16" for CPUs with bf16 support)
+# With pinned tensorflow 2.2 only float16 on GPU works, bfloat16 needs tensorflow >= 2.3 built with oneDNN and raises error otherwise
+MIXED_PRECISION = None
+# Run all critic and generator updates of episode as one compiled function (noise is sampled on device)
+USE_COMPILED_TRAIN_STEP = False
+# Number of episodes trained by one call of compiled function (stats, saving and checks are done after each call)
+# Needs USE_COMPILED_TRAIN_STEP when > 1
+EPISODES_PER_CALL = 1
+# Critic penalty settings (changes need compiled train step)
+# Type of penalty ("wgan-gp" on interpolated images or "r1" on real images)
+PENALTY_TYPE = "wgan-gp"
+# Penalty is computed only every PENALTY_INTERVAL critic steps with weight multiplied by interval (lazy regularization)
+PENALTY_INTERVAL = 1
+# Part of batch used for computing penalty
+PENALTY_SUBSAMPLE = 1.0
+# Previously generated images settings (part of fake images for critic is replaced by older generated images)
+FEED_PREV_GEN_BATCH = False
+FEED_OLD_PERC_AMOUNT = 0.15
+# Number of stored generated images (None for 3 * BATCH_SIZE)
+FAKE_IMAGE_POOL_CAPACITY = None
+# Save stored generated images with checkpoint
+PERSIST_FAKE_IMAGE_POOL = False
+# Gradient norm monitoring (global and per layer norms are computed inside training steps and logged to tensorboard)
+# Num of episodes after whitch gradient norms are read and checked (None to disable monitoring)
+GRADIENT_MONITOR_INTERVAL = 100
+# Allowed range of global gradient norm (None for no limit on that side)
+GRADIENT_NORM_LIMITS = (None, 100)
+# Action when gradient norm leaves its limits ("log", "checkpoint" or "halt")
+GRADIENT_NORM_ACTION = "log"
 # Num of batches preloaded in buffer
 BUFFERED_BATCHES = 100
 
@@ -29,8 +81,25 @@ CHECK_DATASET = False
 
 # Save progress images to folder too (if false then they will be saved only to tensorboard)
 SAVE_RAW_IMAGES = True
-# Duration of one frame if gif is created from progress images after training
+# Duration of one frame if video (gif or mp4) is created from progress images after training
 GIF_FRAME_DURATION = 300
+# Format of progress video, only every Nth progress image is used and frames can be downscaled to keep video small
+PROGRESS_VIDEO_FORMAT = "gif"
+PROGRESS_VIDEO_FRAME_STRIDE = 1
+PROGRESS_VIDEO_SCALE = 1.0
 
 # Num of worker used to preload data for training/testing
-NUM_OF_LOADING_WORKERS = 8
\ No newline at end of file
+NUM_OF_LOADING_WORKERS = 8
+
+# Distributed training settings (data parallel training in multiple processes or on multiple machines)
+# Worker 0 is chief and its the only one writing logs, progress images and checkpoints
+# Number of workers and worker index can be overriden by GAN_NUM_OF_WORKERS and GAN_WORKER_INDEX environment variables (launch_workers.py use them)
+NUM_OF_WORKERS = 1
+WORKER_INDEX = 0
+# Address of chief worker (host:port), all workers must be able to reach it
+CHIEF_ADDRESS = "localhost:12355"
+# Num of episodes after whitch weights are averaged between workers
+# Every sync sends weights and optimizer slots of both models to chief and back (several times size of models per worker), so syncing every episode costs more than small steps itself
+WORKERS_SYNC_INTERVAL = 10
+# Seconds worker waits for others during sync before training is aborted on all workers (must be longer than sync interval takes, including checkpoint saving on chief)
+WORKERS_SYNC_TIMEOUT = 600
\ No newline at end of file
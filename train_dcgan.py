@@ -26,6 +26,8 @@ if gpus:
 
 from keras import optimizers
 
+from modules.keras_extensions.adam_accumulated import KerasAdamAccumulated
+
 from modules.gans import DCGAN
 from modules.utils.helpers import start_tensorboard
 from settings.dcgan_settings import *
@@ -39,12 +41,14 @@ if __name__ == '__main__':
     training_object = DCGAN(DATASET_PATH, training_progress_save_path="training_data/dcgan",
                             batch_size=BATCH_SIZE, buffered_batches=BUFFERED_BATCHES,
                             latent_dim=LATENT_DIM, gen_mod_name=GEN_MODEL, disc_mod_name=DISC_MODEL,
-                            generator_optimizer=optimizers.Adam(0.0001, 0.5), discriminator_optimizer=optimizers.Adam(0.0001, 0.5),
+                            generator_optimizer=optimizers.Adam(0.0001, 0.5) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasAdamAccumulated(GRADIENT_ACCUMULATION_STEPS, 0.0001, 0.5),
+                            discriminator_optimizer=optimizers.Adam(0.0001, 0.5) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasAdamAccumulated(GRADIENT_ACCUMULATION_STEPS, 0.0001, 0.5), mixed_precision=MIXED_PRECISION,
                             discriminator_label_noise=0.2, discriminator_label_noise_decay=0.997, discriminator_label_noise_min=0.03,
                             generator_weights=GEN_WEIGHTS, discriminator_weights=DICS_WEIGHTS,
                             start_episode=START_EPISODE,
                             load_from_checkpoint=LOAD_FROM_CHECKPOINTS,
-                            check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS)
+                            check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS,
+                            gradient_accumulation_steps=GRADIENT_ACCUMULATION_STEPS, random_seed=RANDOM_SEED)
 
     training_object.save_models_structure_images()
 
@@ -52,7 +56,16 @@ if __name__ == '__main__':
                           weights_save_interval=WEIGHTS_SAVE_INTERVAL,
                           discriminator_smooth_real_labels=True, discriminator_smooth_fake_labels=False,
                           generator_smooth_labels=False,
-                          feed_prev_gen_batch=True, feed_old_perc_amount=0.15)
+                          feed_prev_gen_batch=FEED_PREV_GEN_BATCH, feed_old_perc_amount=FEED_OLD_PERC_AMOUNT,
+                          discriminator_concat_real_fake=DISCRIMINATOR_CONCAT_REAL_FAKE, episodes_per_call=EPISODES_PER_CALL,
+                          fake_image_pool_capacity=FAKE_IMAGE_POOL_CAPACITY, persist_fake_image_pool=PERSIST_FAKE_IMAGE_POOL,
+                          gradient_monitor_interval=GRADIENT_MONITOR_INTERVAL, gradient_norm_limits=GRADIENT_NORM_LIMITS, gradient_norm_action=GRADIENT_NORM_ACTION,
+                          weights_store_float16=WEIGHTS_STORE_FLOAT16, weights_store_keyframe_interval=WEIGHTS_STORE_KEYFRAME_INTERVAL,
+                          weights_keep_last=WEIGHTS_KEEP_LAST, weights_keep_every_episodes=WEIGHTS_KEEP_EVERY_EPISODES,
+                          progress_tensorboard_scale=PROGRESS_TENSORBOARD_SCALE,
+                          stats_aggregate_window=STATS_AGGREGATE_WINDOW, stats_full_resolution_episodes=STATS_FULL_RESOLUTION_EPISODES,
+                          weight_stats_interval=WEIGHT_STATS_INTERVAL, step_timing_log_interval=STEP_TIMING_LOG_INTERVAL,
+                          profile_trace_episodes=PROFILE_TRACE_EPISODES, profile_trace_start_episode=PROFILE_TRACE_START_EPISODE)
   except KeyboardInterrupt:
     if training_object:
       print(Fore.BLUE + f"Quiting on epoch: {training_object.episode_counter} - This could take little time, get some coffe and rest :)" + Fore.RESET)
@@ -65,9 +78,11 @@ if __name__ == '__main__':
   finally:
     if training_object:
       training_object.save_checkpoint()
+      # Checkpoint is written on background thread so wait for it
+      training_object.flush_checkpoint()
 
   if training_object:
-    if input("Create gif of progress? ") == "y": training_object.make_progress_gif(frame_duration=GIF_FRAME_DURATION)
+    if input("Create video of progress? ") == "y": training_object.make_progress_video(frame_duration=GIF_FRAME_DURATION, video_format=PROGRESS_VIDEO_FORMAT, frame_stride=PROGRESS_VIDEO_FRAME_STRIDE, scale=PROGRESS_VIDEO_SCALE)
 
   try:
     tbmanager.send_signal(subprocess.signal.CTRL_C_EVENT)
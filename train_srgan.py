@@ -26,41 +26,56 @@ if gpus:
 
 from keras.optimizers import Adam
 
+from modules.keras_extensions.adam_accumulated import KerasAdamAccumulated
+
 from modules.gans import SRGAN
+from modules.utils.distributed import WorkerGroup
 from modules.utils.batch_maker import AugmentationSettings
 from modules.utils.helpers import start_tensorboard
 from settings.srgan_settings import *
 
 if __name__ == '__main__':
   training_object = None
+  worker_group = WorkerGroup(int(os.environ.get("GAN_NUM_OF_WORKERS", NUM_OF_WORKERS)), int(os.environ.get("GAN_WORKER_INDEX", WORKER_INDEX)), chief_address=CHIEF_ADDRESS, sync_interval=WORKERS_SYNC_INTERVAL, sync_timeout=WORKERS_SYNC_TIMEOUT)
   if not os.path.exists("training_data/srgan"): os.makedirs("training_data/srgan")
-  tbmanager = start_tensorboard("training_data/srgan")
+  tbmanager = start_tensorboard("training_data/srgan") if worker_group.is_chief else None
 
   try:
     training_object = SRGAN(DATASET_PATH, num_of_upscales=NUM_OF_UPSCALES, training_progress_save_path="training_data/srgan",
-                            dataset_augmentation_settings=AugmentationSettings(flip_chance=FLIP_CHANCE, rotation_chance=ROTATION_CHANCE, rotation_ammount=ROTATION_AMOUNT, blur_chance=BLUR_CHANCE, blur_amount=BLUR_AMOUNT),
+                            dataset_augmentation_settings=AugmentationSettings(flip_chance=FLIP_CHANCE, rotation_chance=ROTATION_CHANCE, rotation_ammount=ROTATION_AMOUNT, blur_chance=BLUR_CHANCE, blur_amount=BLUR_AMOUNT) if USE_AUGMENTATION else None,
                             batch_size=BATCH_SIZE, buffered_batches=BUFFERED_BATCHES,
                             gen_mod_name=GEN_MODEL, disc_mod_name=DISC_MODEL,
-                            generator_optimizer=Adam(GEN_LR, 0.9), discriminator_optimizer=Adam(DISC_LR, 0.9),
+                            generator_optimizer=Adam(GEN_LR, 0.9) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasAdamAccumulated(GRADIENT_ACCUMULATION_STEPS, GEN_LR, 0.9),
+                            discriminator_optimizer=Adam(DISC_LR, 0.9) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasAdamAccumulated(GRADIENT_ACCUMULATION_STEPS, DISC_LR, 0.9), mixed_precision=MIXED_PRECISION,
                             gen_loss=GEN_LOSS, disc_loss=DISC_LOSS, feature_loss=FEATURE_LOSS,
                             gen_loss_weight=GEN_LOSS_WEIGHT, disc_loss_weight=DISC_LOSS_WEIGHT, feature_loss_weights=FEATURE_PER_LAYER_LOSS_WEIGHTS,
-                            feature_extractor_layers=FEATURE_EXTRACTOR_LAYERS,
+                            feature_extractor_layers=FEATURE_EXTRACTOR_LAYERS, feature_cache_path=FEATURE_CACHE_PATH, feature_cache_float16=FEATURE_CACHE_FLOAT16,
+                            use_feature_producer=USE_FEATURE_PRODUCER, feature_producer_threads=FEATURE_PRODUCER_THREADS,
                             generator_lr_decay_interval=GEN_LR_DECAY_INTERVAL, discriminator_lr_decay_interval=DISC_LR_DECAY_INTERVAL,
                             generator_lr_decay_factor=GEN_LR_DECAY_FACTOR, discriminator_lr_decay_factor=DISC_LR_DECAY_FACTOR,
                             generator_min_lr=GEN_MIN_LR, discriminator_min_lr=DISC_MIN_LR,
                             discriminator_label_noise=DISCRIMINATOR_START_NOISE, discriminator_label_noise_decay=DISCRIMINATOR_NOISE_DECAY, discriminator_label_noise_min=DISCRIMINATOR_TARGET_NOISE,
                             generator_weights=GEN_WEIGHTS, discriminator_weights=DICS_WEIGHTS,
                             load_from_checkpoint=LOAD_FROM_CHECKPOINTS,
-                            custom_hr_test_images_paths=CUSTOM_HR_TEST_IMAGES, check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS)
+                            custom_hr_test_images_paths=CUSTOM_HR_TEST_IMAGES, num_of_random_test_images=NUM_OF_RANDOM_TEST_IMAGES, check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS,
+                            worker_group=worker_group, gradient_accumulation_steps=GRADIENT_ACCUMULATION_STEPS, random_seed=RANDOM_SEED)
 
-    training_object.save_models_structure_images()
+    if worker_group.is_chief: training_object.save_models_structure_images()
 
     training_object.train(TRAINING_EPISODES, pretrain_episodes=GENERATOR_PRETRAIN_EPISODES,
                           discriminator_training_multiplier=DISCRIMINATOR_TRAINING_MULTIPLIER,
                           progress_images_save_interval=PROGRESS_IMAGE_SAVE_INTERVAL, save_raw_progress_images=SAVE_RAW_IMAGES,
                           weights_save_interval=WEIGHTS_SAVE_INTERVAL,
                           discriminator_smooth_real_labels=DISC_REAL_LABEL_SMOOTHING, discriminator_smooth_fake_labels=DISC_FAKE_LABEL_SMOOTHING,
-                          generator_smooth_labels=GENERATOR_LABEL_SMOOTHING)
+                          generator_smooth_labels=GENERATOR_LABEL_SMOOTHING, discriminator_concat_real_fake=DISCRIMINATOR_CONCAT_REAL_FAKE,
+                          feed_prev_gen_batch=FEED_PREV_GEN_BATCH, feed_old_perc_amount=FEED_OLD_PERC_AMOUNT, fake_image_pool_capacity=FAKE_IMAGE_POOL_CAPACITY, persist_fake_image_pool=PERSIST_FAKE_IMAGE_POOL,
+                          gradient_monitor_interval=GRADIENT_MONITOR_INTERVAL, gradient_norm_limits=GRADIENT_NORM_LIMITS, gradient_norm_action=GRADIENT_NORM_ACTION,
+                          weights_store_float16=WEIGHTS_STORE_FLOAT16, weights_store_keyframe_interval=WEIGHTS_STORE_KEYFRAME_INTERVAL,
+                          weights_keep_last=WEIGHTS_KEEP_LAST, weights_keep_every_episodes=WEIGHTS_KEEP_EVERY_EPISODES,
+                          progress_tensorboard_scale=PROGRESS_TENSORBOARD_SCALE,
+                          stats_aggregate_window=STATS_AGGREGATE_WINDOW, stats_full_resolution_episodes=STATS_FULL_RESOLUTION_EPISODES,
+                          weight_stats_interval=WEIGHT_STATS_INTERVAL, step_timing_log_interval=STEP_TIMING_LOG_INTERVAL,
+                          profile_trace_episodes=PROFILE_TRACE_EPISODES, profile_trace_start_episode=PROFILE_TRACE_START_EPISODE)
   except KeyboardInterrupt:
     if training_object:
       print(Fore.BLUE + f"Quiting on epoch: {training_object.episode_counter} - This could take little time, get some coffe and rest :)" + Fore.RESET)
@@ -73,9 +88,11 @@ if __name__ == '__main__':
   finally:
     if training_object:
       training_object.save_checkpoint()
+      # Checkpoint is written on background thread so wait for it
+      training_object.flush_checkpoint()
 
-  if training_object:
-    if input("Create gif of progress? ") == "y": training_object.make_progress_gif(frame_duration=GIF_FRAME_DURATION)
+  if training_object and worker_group.is_chief:
+    if input("Create video of progress? ") == "y": training_object.make_progress_video(frame_duration=GIF_FRAME_DURATION, video_format=PROGRESS_VIDEO_FORMAT, frame_stride=PROGRESS_VIDEO_FRAME_STRIDE, scale=PROGRESS_VIDEO_SCALE)
 
   try:
     tbmanager.send_signal(subprocess.signal.CTRL_C_EVENT)
@@ -26,31 +26,48 @@ if gpus:
 
 from keras import optimizers
 
+from modules.keras_extensions.rmsprop_accumulated import KerasRMSpropAccumulated
+
 from modules.gans import WGANGC
+from modules.utils.distributed import WorkerGroup
 from modules.utils.helpers import start_tensorboard
 from settings.wgan_settings import *
 
 if __name__ == '__main__':
   training_object = None
+  worker_group = WorkerGroup(int(os.environ.get("GAN_NUM_OF_WORKERS", NUM_OF_WORKERS)), int(os.environ.get("GAN_WORKER_INDEX", WORKER_INDEX)), chief_address=CHIEF_ADDRESS, sync_interval=WORKERS_SYNC_INTERVAL, sync_timeout=WORKERS_SYNC_TIMEOUT)
   if not os.path.exists("training_data/wgan"): os.makedirs("training_data/wgan")
-  bmanager = start_tensorboard("training_data/wgan")
+  bmanager = start_tensorboard("training_data/wgan") if worker_group.is_chief else None
 
   try:
     training_object = WGANGC(DATASET_PATH, training_progress_save_path="training_data/wgan",
                              batch_size=BATCH_SIZE, buffered_batches=BUFFERED_BATCHES,
                              latent_dim=LATENT_DIM, gen_mod_name=GEN_MODEL, critic_mod_name=DISC_MODEL,
-                             generator_optimizer=optimizers.RMSprop(0.00005), critic_optimizer=optimizers.RMSprop(0.00005),  # Adam(0.0001, beta_1=0.5, beta_2=0.9), RMSprop(0.00005)
+                             generator_optimizer=optimizers.RMSprop(0.00005) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasRMSpropAccumulated(GRADIENT_ACCUMULATION_STEPS, 0.00005),  # Adam(0.0001, beta_1=0.5, beta_2=0.9), RMSprop(0.00005)
+                             critic_optimizer=optimizers.RMSprop(0.00005) if GRADIENT_ACCUMULATION_STEPS == 1 else KerasRMSpropAccumulated(GRADIENT_ACCUMULATION_STEPS, 0.00005),
+                             mixed_precision=MIXED_PRECISION,
                              generator_weights=GEN_WEIGHTS, critic_weights=DICS_WEIGHTS,
                              critic_gradient_penalty_weight=10,
                              start_episode=START_EPISODE,
                              load_from_checkpoint=LOAD_FROM_CHECKPOINTS,
-                             check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS)
+                             check_dataset=CHECK_DATASET, num_of_loading_workers=NUM_OF_LOADING_WORKERS,
+                             worker_group=worker_group, gradient_accumulation_steps=GRADIENT_ACCUMULATION_STEPS, random_seed=RANDOM_SEED)
 
-    training_object.save_models_structure_images()
+    if worker_group.is_chief: training_object.save_models_structure_images()
 
     training_object.train(NUM_OF_TRAINING_EPISODES, progress_images_save_interval=PROGRESS_IMAGE_SAVE_INTERVAL, save_raw_progress_images=SAVE_RAW_IMAGES,
                           weights_save_interval=WEIGHTS_SAVE_INTERVAL,
-                          critic_train_multip=5)
+                          critic_train_multip=5,
+                          use_compiled_train_step=USE_COMPILED_TRAIN_STEP, episodes_per_call=EPISODES_PER_CALL,
+                          penalty_type=PENALTY_TYPE, penalty_interval=PENALTY_INTERVAL, penalty_subsample=PENALTY_SUBSAMPLE,
+                          feed_prev_gen_batch=FEED_PREV_GEN_BATCH, feed_old_perc_amount=FEED_OLD_PERC_AMOUNT, fake_image_pool_capacity=FAKE_IMAGE_POOL_CAPACITY, persist_fake_image_pool=PERSIST_FAKE_IMAGE_POOL,
+                          gradient_monitor_interval=GRADIENT_MONITOR_INTERVAL, gradient_norm_limits=GRADIENT_NORM_LIMITS, gradient_norm_action=GRADIENT_NORM_ACTION,
+                          weights_store_float16=WEIGHTS_STORE_FLOAT16, weights_store_keyframe_interval=WEIGHTS_STORE_KEYFRAME_INTERVAL,
+                          weights_keep_last=WEIGHTS_KEEP_LAST, weights_keep_every_episodes=WEIGHTS_KEEP_EVERY_EPISODES,
+                          progress_tensorboard_scale=PROGRESS_TENSORBOARD_SCALE,
+                          stats_aggregate_window=STATS_AGGREGATE_WINDOW, stats_full_resolution_episodes=STATS_FULL_RESOLUTION_EPISODES,
+                          weight_stats_interval=WEIGHT_STATS_INTERVAL, step_timing_log_interval=STEP_TIMING_LOG_INTERVAL,
+                          profile_trace_episodes=PROFILE_TRACE_EPISODES, profile_trace_start_episode=PROFILE_TRACE_START_EPISODE)
   except KeyboardInterrupt:
     if training_object:
       print(Fore.BLUE + f"Quiting on epoch: {training_object.episode_counter} - This could take little time, get some coffe and rest :)" + Fore.RESET)
@@ -63,9 +80,11 @@ if __name__ == '__main__':
   finally:
     if training_object:
       training_object.save_checkpoint()
+      # Checkpoint is written on background thread so wait for it
+      training_object.flush_checkpoint()
 
-  if training_object:
-    if input("Create gif of progress? ") == "y": training_object.make_progress_gif(frame_duration=GIF_FRAME_DURATION)
+  if training_object and worker_group.is_chief:
+    if input("Create video of progress? ") == "y": training_object.make_progress_video(frame_duration=GIF_FRAME_DURATION, video_format=PROGRESS_VIDEO_FORMAT, frame_stride=PROGRESS_VIDEO_FRAME_STRIDE, scale=PROGRESS_VIDEO_SCALE)
 
   try:
     tbmanager.send_signal(subprocess.signal.CTRL_C_EVENT)